@@ -5,7 +5,6 @@ import numpy as np
 import torch
 from corai import Estim_history
 # inspired from corai https://github.com/Code-Cornelius/corai
-from tqdm import tqdm
 
 
 def history_create(nb_epochs_total, metrics):
@@ -55,7 +54,7 @@ def _update_history_for_metric(metric, net, epoch, total_number_data, history, d
     history[type][metric.name][epoch] /= total_number_data[0] if type == 'training' else total_number_data[1]
 
 
-def translate_history_to_dataframe(history, fold_number, validation, nb_epochs):
+def translate_history_to_dataframe(history, fold_number, validation, nb_epochs=None):
     """
         Translate from history structure to a flat structure that will be used to add the history to the dataframe
     Args:
@@ -63,16 +62,26 @@ def translate_history_to_dataframe(history, fold_number, validation, nb_epochs):
         fold_number (int): the fold number the history corresponds to.
         validation (bool): flag to specify weather validation is used.
         validation (bool): is there a validation metric computed.
+        nb_epochs (int): ignored, kept for compatibility. The epochs reached are read from the history.
 
     Returns:
         The translated history
+
+    Note:
+        Same slicing as corai.src.train.history.translate_history_to_dataframe, whose history has a training loss.
+        The epochs not reached (after the last training value) are sliced out.
+        The nan of the epochs reached but not evaluated are kept, such that all the columns have the same length.
     """
     translated_history = {}
 
+    # the epochs after the last training value were not reached.
+    reached_epochs = [np.flatnonzero(~np.isnan(value)) for value in history['training'].values()]
+    nb_reached_epochs = max((int(epochs[-1]) + 1 for epochs in reached_epochs if len(epochs)), default=0)
+
     # collect training information
     for key, value in history['training'].items():
         new_key = Estim_history.generate_column_name(key)
-        new_value = value[~np.isnan(value)]  # we slice out the value that are nan.
+        new_value = value[:nb_reached_epochs]  # we slice out the epochs that were not reached.
         translated_history[new_key] = new_value.tolist()
 
     assert ('validation' in history) == validation, "Validation required / not required and " \
@@ -81,25 +90,29 @@ def translate_history_to_dataframe(history, fold_number, validation, nb_epochs):
     if 'validation' in history:
         for key, value in history['validation'].items():
             new_key = Estim_history.generate_column_name(key, validation=True)
-            new_value = value[~np.isnan(value)]
+            new_value = value[:nb_reached_epochs]
             translated_history[new_key] = new_value.tolist()
 
     # add the epoch number to the translated history
-    translated_history['epoch'] = [*range(nb_epochs)]
+    translated_history['epoch'] = [*range(nb_reached_epochs)]
 
     # add the fold number to the history
-    translated_history['fold'] = [fold_number] * nb_epochs
+    translated_history['fold'] = [fold_number] * nb_reached_epochs
 
     return translated_history
 
 
 def generate_estims_history(hyper_params, input_train, output_train, input_test, output_test,
                             config_architecture, linker_estims, linker_models,
-                            metrics, silent):
-    estims = []
+                            metrics, silent, nb_workers=1, nb_threads_per_worker=None):
+    """
+        Trains the configurations with run_sweep: nb_workers configurations are trained concurrently,
+        and the configurations already saved in linker_estims / linker_models are not trained again.
+    """
     nb_epochs = 1
     nb_prediction = 1, 1  # train , val
-    for i, params in enumerate(tqdm(hyper_params)):
+
+    def train_config(params):
         current_model = config_architecture(params, input_train.shape[2], output_train.shape[2])
 
         corai.set_seeds(params["seed"])  # set seed for pytorch.
@@ -127,9 +140,9 @@ def generate_estims_history(hyper_params, input_train, output_train, input_test,
                                                     validation=estimator_history.validation, nb_epochs=nb_epochs)
         estimator_history.append(history=df_history, fold_best_epoch=0, fold_time=end_train_fold_time)
         estimator_history.best_fold = 0
+        return estimator_history, current_model
 
-        estims.append(estimator_history)  # add to the list of estimators
-        ########################################################### saving
-        estimator_history.to_json(path=linker_estims([f"estim_{i}.json"]), compress=False)
-        current_model.save_net(path=linker_models([f"model_{i}.pth"]))
-    return estims
+    ########################################################### saving, estim_i.json and model_i.pth
+    return corai.run_sweep(hyper_params, train_config, linker_estims, linker_models,
+                           nb_workers=nb_workers, nb_threads_per_worker=nb_threads_per_worker,
+                           compress=False, silent=silent)
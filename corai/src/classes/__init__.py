@@ -1,7 +1,10 @@
 from .metric import *
 from .optim_wrapper import Optim_wrapper
 from .windowcreator import WindowCreator
+from .windowedtensor import WindowedTensor
 from .fasttensordataloader import FastTensorDataLoader
+from .memmaptensor import MemmapTensor
+from .checkpointer import Checkpointer
 
 from . import training_stopper
 from . import architecture
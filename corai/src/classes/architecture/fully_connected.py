@@ -104,6 +104,34 @@ class Fully_connected_NN(Savable_net, metaclass=ABCMeta):
         # the biases added
         return size
 
+    @staticmethod
+    def compute_nb_of_params_padded(input_sizes, hidden_sizes, output_sizes, biases):
+        """
+        Semantics:
+            Vectorised compute_nb_of_params, for many architectures at once.
+            The lists of hidden sizes are padded with zeros on the right, which cancels the terms of missing layers.
+
+        Args:
+            input_sizes (np.ndarray): shape (N,).
+            hidden_sizes (np.ndarray of int): shape (N, max nb of hidden layers), padded with zeros.
+                Each architecture has at least one hidden layer.
+            output_sizes (np.ndarray): shape (N,).
+            biases (np.ndarray of bool): shape (N, max nb of hidden layers + 1), padded with False.
+                The bias of the output layer is given by the column after the last hidden layer of each architecture.
+
+        Returns:
+            np.ndarray of int, shape (N,).
+        """
+        nb_layers = np.count_nonzero(hidden_sizes, axis=1)
+        last_hidden_sizes = hidden_sizes[np.arange(len(hidden_sizes)), nb_layers - 1]
+        size = input_sizes * hidden_sizes[:, 0]
+        size += np.sum(hidden_sizes[:, :-1] * hidden_sizes[:, 1:], axis=1)  # : zero after the last layer.
+        size += last_hidden_sizes * output_sizes
+        # the biases added
+        size += np.sum(hidden_sizes * biases[:, :-1], axis=1)
+        size += output_sizes * biases[np.arange(len(biases)), nb_layers]
+        return size
+
     # section ######################################################################
     #  #############################################################################
     # rest of methods
@@ -63,6 +63,86 @@ class RNN(Savable_net, metaclass=ABCMeta):
             out = out[:, -self.nb_output_consider:, :self.hidden_size]
         return out  # shape is (batch size, nb_output_consider, hidden_size)
 
+    def forward_incremental(self, new_time_series, state, lookback_window=None):
+        """
+        Semantics:
+            Streaming inference. Instead of running the whole sequence from h0 at every new observation,
+            the hidden state (h, or (h, c) for LSTM) and the last outputs are carried from one call to the next,
+            and only the new timesteps go through the rnn.
+
+            Without lookback_window, the hidden state is carried over the whole stream: feeding a sequence in several
+            calls returns the same output as forward over the whole sequence, from h0 at its first timestep.
+            This is not the output of window-based inference (forward over the last lookback_window timesteps,
+            from h0, as in WindowCreator.prediction_recurrent) for a model trained on windows.
+            The cost of a call is proportional to the number of new timesteps.
+
+            With lookback_window, the output is the one of window-based inference: forward over the last
+            lookback_window timesteps seen, from h0. A hidden state is carried for each of the lookback_window
+            windows containing the next timesteps, the windows started at different timesteps, and a new timestep
+            goes through all of them in one call of length 1, instead of lookback_window sequential steps.
+            While less than lookback_window timesteps were seen, the window is the whole sequence seen so far.
+            For inference, call it under torch.no_grad().
+
+        Args:
+            new_time_series (tensor): shape (N, nb new timesteps, input_dim).
+            state (tuple): returned by the previous call.
+                For the first call, (h0, None), with h0 (or (h0, c0) for LSTM) with the shapes expected by forward.
+                The same lookback_window is given to all the calls of a stream.
+            lookback_window (int): length of the windows of the window-based inference. None means no window.
+
+        Returns:
+            out, state. out has the shape of the output of forward: (N, nb_output_consider, hidden_size),
+            less outputs if less than nb_output_consider timesteps were seen.
+
+        Examples:
+            state = (hidden_module.get_hidden_states((1, N, 1)), None)
+            for new_observation in feed:  # shape (N, 1, input_dim)
+                with torch.no_grad():
+                    out, state = rnn.forward_incremental(new_observation, state, lookback_window)
+        """
+        assert not self.bidirectional, "The backward direction requires the whole sequence, no incremental inference."
+        if lookback_window is not None:
+            return self._forward_incremental_windowed(new_time_series, state, lookback_window)
+        hidden, last_outputs = state
+        out, hidden = self.stacked_rnn(new_time_series, hidden)
+        if last_outputs is not None:
+            out = torch.cat((last_outputs, out), 1)
+        out = out[:, -self.nb_output_consider:, :self.hidden_size]  # : only the outputs still considered are kept.
+        return out, (hidden, out)
+
+    def _forward_incremental_windowed(self, new_time_series, state, lookback_window):
+        # state is (h0, windows), windows is None or (hidden, outputs) of the windows started and not complete,
+        # the oldest first, stacked along the batch dimension: the rows [k * N, (k + 1) * N[ are the k-th window.
+        # outputs are the last nb_output_consider outputs of each window, the missing ones are zeros.
+        h0, windows = state
+        N = new_time_series.shape[0]
+        for t in range(new_time_series.shape[1]):
+            if windows is None:
+                hidden = h0
+                outputs = new_time_series.new_zeros(N, self.nb_output_consider, self.hidden_size)
+            else:  # : a new window starts at this timestep.
+                hidden = RNN._map_hidden(lambda h, h_0: torch.cat((h, h_0), 1), windows[0], h0)
+                outputs = torch.cat((windows[1],
+                                     new_time_series.new_zeros(N, self.nb_output_consider, self.hidden_size)), 0)
+            nb_windows = outputs.shape[0] // N
+            out, hidden = self.stacked_rnn(new_time_series[:, t:t + 1].repeat(nb_windows, 1, 1), hidden)
+            outputs = torch.cat((outputs, out[:, :, :self.hidden_size]), 1)[:, 1:]
+
+            # the oldest window has seen nb_windows timesteps.
+            out = outputs[:N, -min(nb_windows, self.nb_output_consider):]
+            if nb_windows == lookback_window:  # : the oldest window is complete, it is not continued.
+                hidden = RNN._map_hidden(lambda h: h[:, N:], hidden)
+                outputs = outputs[N:]
+            windows = (hidden, outputs) if len(outputs) else None
+        return out, (h0, windows)
+
+    @staticmethod
+    def _map_hidden(fct, *hiddens):
+        # applies fct to the hidden states, which are tensors, or tuples (h, c) for LSTM.
+        if isinstance(hiddens[0], tuple):
+            return tuple(fct(*states) for states in zip(*hiddens))
+        return fct(*hiddens)
+
     # section ######################################################################
     #  #############################################################################
     # SETTERS GETTERS
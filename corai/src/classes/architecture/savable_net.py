@@ -1,7 +1,6 @@
 # global libraries
 import os
 import sys
-from copy import deepcopy
 
 import torch
 import torch.nn as nn
@@ -19,6 +18,7 @@ class Savable_net(nn.Module):
     Args:
         best_weights:
         best_epoch:
+        best_weights_on_host: if True, the best weights are kept on the host, freeing the memory of the device.
     Class Args:
         _predict_fct
     """
@@ -39,6 +39,7 @@ class Savable_net(nn.Module):
         # best parameters, keeps track in case of early stopping.
         self.best_weights = None  # init the field best weights.
         self.best_epoch = 0
+        self.best_weights_on_host = False
 
     @property
     def device(self):
@@ -94,9 +95,28 @@ class Savable_net(nn.Module):
     def update_best_weights(self, epoch):
         # : We decide to keep a copy instead of saving the model in a file
         # because we might not want to save this model (E.G. if we do a K-FOLD)
-        self.best_weights = deepcopy(self.state_dict())  # used in early stoppers.
+        # The buffers are allocated at the first call, the next calls copy the weights in place.
+        # Hence, best_weights is overwritten at each update: keep a copy of it if an old snapshot is needed.
+        state_dict = self.state_dict()
+        if not self._are_best_weights_buffers_of(state_dict):
+            self.best_weights = {name: torch.empty_like(tensor, device=self._device_best_weights(tensor))
+                                 for name, tensor in state_dict.items()}
+        with torch.no_grad():
+            for name, tensor in state_dict.items():
+                self.best_weights[name].copy_(tensor)  # used in early stoppers.
         self.best_epoch = epoch
 
+    def _are_best_weights_buffers_of(self, state_dict):
+        # whether the current best_weights can receive the state_dict without allocation.
+        if self.best_weights is None or self.best_weights.keys() != state_dict.keys():
+            return False
+        return all(self.best_weights[name].shape == tensor.shape and self.best_weights[name].dtype == tensor.dtype
+                   and self.best_weights[name].device == self._device_best_weights(tensor)
+                   for name, tensor in state_dict.items())
+
+    def _device_best_weights(self, tensor):
+        return torch.device('cpu') if self.best_weights_on_host else tensor.device
+
     # section ######################################################################
     #  #############################################################################
     # prediction
@@ -150,3 +170,14 @@ class Savable_net(nn.Module):
     @best_weights.setter
     def best_weights(self, new_best_weights):
         self._best_weights = new_best_weights
+
+    @property
+    def best_weights_on_host(self):
+        return self._best_weights_on_host
+
+    @best_weights_on_host.setter
+    def best_weights_on_host(self, new_best_weights_on_host):
+        if isinstance(new_best_weights_on_host, bool):
+            self._best_weights_on_host = new_best_weights_on_host
+        else:
+            raise Error_type_setter(f"Argument is not an {str(bool)}.")
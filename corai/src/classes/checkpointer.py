@@ -0,0 +1,131 @@
+import inspect
+import os
+
+import numpy as np
+import torch
+
+# the checkpoints contain numpy arrays and random states, not only weights. weights_only exists from torch 1.13,
+# and its default is True from torch 2.6.
+_LOAD_KWARGS = {'weights_only': False} if 'weights_only' in inspect.signature(torch.load).parameters else {}
+
+
+class Checkpointer(object):
+    """
+    Semantics:
+        Saves the state of a k-fold training in one file, such that a training that was stopped (crash, kill...)
+        can be resumed by giving the same path to nn_kfold_train.
+
+        The file contains:
+            the indices of the folds, such that they are not recomputed,
+            the history of the completed folds and the best net among them, such that they are not retrained,
+            every `period` epochs, the state of the fold being trained: weights, best weights, optimiser and scheduler,
+            early stoppers, partial history and random states. The fold is resumed after the last saved epoch.
+
+        The resumed training is identical to an uninterrupted one if the training loader draws each epoch from the
+        original order (train_loader_parameters = {'index_shuffle': True}). With the in-place shuffle, the order of
+        the data depends on all the previous epochs and the resumed shuffles differ.
+
+        The file is written atomically: the new checkpoint is written in a temporary file which replaces the old one.
+        A process killed while writing leaves the previous checkpoint intact.
+
+    Examples:
+        checkpointer = Checkpointer("checkpoints/kfold.pth", period=10)
+        net, estimator_history = nn_kfold_train(data_X, data_Y, Model_NN, param_train, nb_split=5,
+                                                checkpointer=checkpointer)
+    """
+
+    def __init__(self, path, period=1):
+        """
+        Args:
+            path (str): path of the checkpoint file. If it exists, the training is resumed from it.
+            period (int): number of epochs between two checkpoints of the fold being trained.
+        """
+        self.path = path
+        self.period = period
+        self._state = None
+        if os.path.exists(path):
+            self._state = torch.load(path, **_LOAD_KWARGS)
+
+    def has_checkpoint(self):
+        return self._state is not None
+
+    @property
+    def indices(self):
+        return self._state['indices']
+
+    @property
+    def compute_validation(self):
+        return self._state['compute_validation']
+
+    @property
+    def completed_folds(self):
+        """ List of tuples (history, best_epoch, fold_time) of the folds completed, in order."""
+        return self._state['folds']
+
+    def start(self, indices, compute_validation):
+        """ New training, the indices of the folds are saved."""
+        self._state = {'indices': indices, 'compute_validation': compute_validation,
+                       'folds': [], 'best_net': None, 'current': None}
+        self._write()
+
+    def complete_fold(self, history, best_epoch, fold_time, best_net, is_best):
+        """ Saves the results of the fold, and the net if it is the best one so far."""
+        self._state['folds'].append((history, best_epoch, fold_time))
+        if is_best:
+            self._state['best_net'] = best_net.state_dict()
+        self._state['current'] = None
+        self._write()
+
+    def load_best_net(self, Model_NN, device):
+        """ Returns the best net among the completed folds, None if no fold was completed."""
+        if self._state['best_net'] is None:
+            return None
+        net = Model_NN().to(device)
+        net.load_state_dict(self._state['best_net'])
+        return net
+
+    def save_epoch(self, epoch, net, optim_wrapper, early_stoppers, history):
+        """ Saves the state of the fold being trained, every period epochs."""
+        if (epoch + 1) % self.period:
+            return
+        self._state['current'] = {'fold': len(self.completed_folds), 'epoch': epoch,
+                                  'net': net.state_dict(), 'best_weights': net.best_weights,
+                                  'best_epoch': net.best_epoch, 'optim_wrapper': optim_wrapper.state_dict(),
+                                  'early_stoppers': [dict(vars(early_stopper)) for early_stopper in early_stoppers],
+                                  'history': history, 'rng_torch': torch.get_rng_state(),
+                                  'rng_numpy': np.random.get_state()}
+        self._write()
+
+    def resume_epoch(self, net, optim_wrapper, early_stoppers, history):
+        """
+            Restores the state of the fold being trained, if it was saved.
+
+        Returns:
+            The first epoch to train.
+        """
+        current = self._state['current'] if self._state is not None else None
+        if current is None or current['fold'] != len(self.completed_folds):
+            return 0
+        net.load_state_dict(current['net'])
+        net.best_weights = current['best_weights']
+        net.best_epoch = current['best_epoch']
+        optim_wrapper.load_state_dict(current['optim_wrapper'])
+        for early_stopper, state_early_stopper in zip(early_stoppers, current['early_stoppers']):
+            vars(early_stopper).update(state_early_stopper)
+        for tipee in history:
+            for metric_name in history[tipee]:
+                # the training can be resumed with more epochs than when it was saved.
+                saved_values = current['history'][tipee][metric_name]
+                history[tipee][metric_name][:len(saved_values)] = saved_values
+        torch.set_rng_state(current['rng_torch'])
+        np.random.set_state(current['rng_numpy'])
+        return current['epoch'] + 1
+
+    def _write(self):
+        directory_where_to_save = os.path.dirname(self.path)
+        if not os.path.exists(directory_where_to_save):
+            if directory_where_to_save != '':
+                os.makedirs(directory_where_to_save)
+        path_tmp = self.path + '.tmp'
+        torch.save(self._state, path_tmp)
+        os.replace(path_tmp, self.path)  # : atomic.
@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+
+
+class Columnar_store(object):
+    """
+    Semantics:
+        Append-optimised table, backing store of Estim_history.
+        Each column is a numpy buffer whose capacity is doubled when full, such that appending k rows costs
+        amortised O(k), independently of the number of rows already stored. The columns are read as views of
+        the buffers, and the DataFrame is only built when requested with to_frame.
+
+        Like for DataFrame.append, a column absent from an append is filled with nan,
+        and a new column has nan for the rows appended before it.
+    """
+
+    def __init__(self, column_names=()):
+        self.column_names = list(column_names)
+        self._buffers = {}  # : created at the first append, with the dtype of the data.
+        self._nb_rows = 0
+
+    @classmethod
+    def from_frame(cls, df):
+        """ Store over the columns of df. The columns are not copied, the first append reallocates them."""
+        store = cls(df.columns)
+        if len(df):  # : the columns of an empty dataframe have no meaningful dtype.
+            store._buffers = {name: df[name].to_numpy() for name in df.columns}
+        store._nb_rows = len(df)
+        return store
+
+    def __len__(self):
+        return self._nb_rows
+
+    def append(self, columns):
+        """
+        Args:
+            columns (dict): name of the column -> values (list or array). All the values have the same length.
+
+        Returns:
+            Void
+        """
+        columns = {name: Columnar_store._as_array(values) for name, values in columns.items()}
+        nb_new_rows = len(next(iter(columns.values()))) if columns else 0
+        self.column_names += [name for name in columns if name not in self.column_names]
+
+        end = self._nb_rows + nb_new_rows
+        for name in self.column_names:
+            values = columns.get(name)
+            if values is None:
+                values = np.full(nb_new_rows, np.nan)
+            self._reserve(name, end, values.dtype)
+            self._buffers[name][self._nb_rows:end] = values
+        self._nb_rows = end
+
+    def column(self, name):
+        """ View of the values of the column. Raises KeyError if the column does not exist."""
+        if name not in self.column_names:
+            raise KeyError(name)
+        if name not in self._buffers:  # : nothing appended yet.
+            return np.empty(0)
+        return self._buffers[name][:self._nb_rows]
+
+    def take(self, index):
+        """ New store with the rows given by index (boolean mask or integers)."""
+        store = Columnar_store(self.column_names)
+        store._buffers = {name: self.column(name)[index] for name in self._buffers}
+        store._nb_rows = len(np.arange(self._nb_rows)[index])
+        return store
+
+    def to_frame(self):
+        if not self._nb_rows:
+            return pd.DataFrame(columns=self.column_names)
+        return pd.DataFrame({name: self.column(name) for name in self.column_names}, columns=self.column_names)
+
+    def _reserve(self, name, nb_rows, dtype):
+        # the buffer of the column can hold nb_rows rows of dtype after the call. The filled rows are kept.
+        buffer = self._buffers.get(name)
+        if buffer is None:  # : new column, the rows already stored have no value.
+            buffer = np.full(self._nb_rows, np.nan) if self._nb_rows else np.empty(0, dtype=dtype)
+        dtype = Columnar_store._common_dtype(buffer.dtype, dtype)
+
+        if len(buffer) < nb_rows or buffer.dtype != dtype:
+            capacity = max(nb_rows, 2 * len(buffer)) if len(buffer) < nb_rows else len(buffer)
+            new_buffer = np.empty(capacity, dtype=dtype)
+            new_buffer[:self._nb_rows] = buffer[:self._nb_rows]
+            buffer = new_buffer
+        self._buffers[name] = buffer
+
+    @staticmethod
+    def _as_array(values):
+        values = np.asarray(values)
+        # strings of numpy have a fixed length, longer strings appended later would be truncated.
+        return values.astype(object) if values.dtype.kind in 'US' else values
+
+    @staticmethod
+    def _common_dtype(dtype_1, dtype_2):
+        if dtype_1.kind in 'biuf' and dtype_2.kind in 'biuf':
+            return np.result_type(dtype_1, dtype_2)
+        return dtype_1 if dtype_1 == dtype_2 else np.dtype(object)
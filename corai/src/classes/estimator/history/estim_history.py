@@ -1,6 +1,8 @@
+import numpy as np
 import pandas as pd
 import torch
 
+from corai.src.classes.estimator.history.columnar_store import Columnar_store
 from corai_error import Error_type_setter
 from corai_estimator import Estimator
 from corai_util.tools.src.decorator import decorator_delayed_keyboard_interrupt
@@ -9,6 +11,19 @@ from corai_util.tools.src.function_json import is_jsonable
 
 
 class Estim_history(Estimator):
+    """
+    Semantics:
+        The rows are stored in a Columnar_store, such that appending the folds one after the other is amortised
+        linear in the number of rows, and the getters read the columns without building the dataframe.
+        The dataframe `df` is built when read, and is the reference until the next append: the store then reads the
+        columns of `df` without copying them, such that the values modified in place (df.loc[...] = ...) are seen by
+        the getters. The store is rebuilt from the dataframe when `df` is assigned, or when a column of `df` does
+        not share its memory with the store anymore (new column, column replaced, change of dtype...).
+
+        The rows of each fold and of each couple (fold, epoch) are indexed, such that the getters do not scan the
+        whole table. The index follows the appends, and is rebuilt when the store is (new dataframe, slicing...).
+        The rows of the epochs of a fold are indexed at the first lookup in the fold.
+    """
     CORE_COL = {'fold', 'epoch'}
 
     def __init__(self, metric_names, validation, df=None, hyper_params={}.copy()):
@@ -25,6 +40,12 @@ class Estim_history(Estimator):
         self.hyper_params = hyper_params  # dict with serializable objects to be saved into a json.
         self.best_fold = -1  # negative strictly number means no best_fold found yet. Will be set in
         # train_kfold_a_fold_after_split
+        self._frame = None  # : dataframe, None when it has to be built from the store.
+        self._store = None  # : Columnar_store, None when it has to be built from the dataframe.
+        self._indexed_store = None  # : the store indexed by _rows_of_fold, up to _nb_rows_indexed.
+        self._rows_of_fold = {}  # : fold -> rows, in increasing order.
+        self._row_of_fold_epoch = {}  # : fold -> {epoch -> row}, built at the first lookup in the fold.
+        self._nb_rows_indexed = 0
 
         if df is not None:
             super().__init__(df=df)
@@ -48,43 +69,70 @@ class Estim_history(Estimator):
             Void
         """
         # use delayed keyboard interrupt to assure the file saving is not interrupted
-        attrs = {'metric_names': self.metric_names,
-                 'validation': self.validation,
-                 'best_epoch': self.list_best_epoch,
-                 'time': self.list_train_times,
-                 'hyper_params': self.hyper_params,
-                 'best_fold': self.best_fold,
-                 }
         ######## debugging advice:
         # if not serializable, check hyper_params that might contain wrong type objects.
-        super().to_json(path, compress, attrs)
+        super().to_json(path, compress, self._attrs())
 
     @classmethod
-    @decorator_delayed_keyboard_interrupt
     def from_json(cls, path, compressed=True):
         """
-            Create estimator from previously stored json file
+            Create estimator from previously stored json file. The file is read once and not modified.
         Args:
-            compressed: whether or not compression is applied
+            compressed: kept for compatibility, the compression is detected from the content of the file.
             path: The source path for the json, with extension.
 
         Returns:
-            Void
+            The estimator.
+        """
+        dataframe, attrs = Estimator.read_json(path)
+        estimator = cls(df=dataframe, validation=attrs['validation'], metric_names=attrs['metric_names'])
+        estimator._set_attrs(attrs)
+        return estimator
+
+    @decorator_delayed_keyboard_interrupt
+    def to_binary(self, path, **kwargs):
         """
+            Save an estimator to a binary columnar file (Parquet, Feather or npz, given by the extension),
+            the attributes are stored in the metadata of the file.
+        Args:
+            path: The path where to store the estimator, with extension.
 
-        attrs = super().from_json_attributes(path, compressed)
-        estimator = super().from_json(path,
-                                      validation=attrs['validation'],
-                                      metric_names=attrs['metric_names'])
+        Returns:
+            Void
+        """
+        super().to_binary(path, self._attrs())
 
-        estimator.list_best_epoch = attrs['best_epoch']
-        estimator.hyper_params = attrs['hyper_params']
-        estimator.best_fold = attrs['best_fold']
-        estimator.list_train_times = attrs['time']
+    @classmethod
+    def from_binary(cls, path):
+        """
+            Create estimator from a file written by to_binary. The file is not modified.
+        Args:
+            path: The source path of the file, with extension.
 
-        estimator.to_json(path=path, compress=compressed)
+        Returns:
+            The estimator.
+        """
+        attrs = super().from_binary_attributes(path)
+        estimator = super().from_binary(path, validation=attrs['validation'], metric_names=attrs['metric_names'])
+        estimator._set_attrs(attrs)
         return estimator
 
+    def _attrs(self):
+        # the attributes saved along the dataframe.
+        return {'metric_names': self.metric_names,
+                'validation': self.validation,
+                'best_epoch': self.list_best_epoch,
+                'time': self.list_train_times,
+                'hyper_params': self.hyper_params,
+                'best_fold': self.best_fold,
+                }
+
+    def _set_attrs(self, attrs):
+        self.list_best_epoch = attrs['best_epoch']
+        self.hyper_params = attrs['hyper_params']
+        self.best_fold = attrs['best_fold']
+        self.list_train_times = attrs['time']
+
     @classmethod
     @decorator_delayed_keyboard_interrupt
     def from_pl_logs(cls, log_path, checkpoint_path):
@@ -262,38 +310,84 @@ class Estim_history(Estimator):
         """
         self.list_best_epoch.append(fold_best_epoch)  # append to the best_epochs, the current folds' best epoch.
         self.list_train_times.append(fold_time)  # append the time to run current epoch
-        history = pd.DataFrame(history)
 
-        # Remove every split index from dataframe before appending
+        # Remove every split index from the history before appending
         if period_kept_data:
-            # save best row
-            row = history.loc[fold_best_epoch]
-            n = history.loc[:, 'epoch'].max() + 1
-
-            index_to_remove = [j for i in range(0, n, period_kept_data) for j in
-                               range(i + 1, min(i + period_kept_data, n))]
+            n = len(history['epoch'])
+            # the best row is kept, and put at the end.
+            index_kept = [i for i in range(0, n, period_kept_data) if i != fold_best_epoch] + [fold_best_epoch]
+            history = {key: np.asarray(value)[index_kept] for key, value in history.items()}
 
-            index_to_remove.append(fold_best_epoch)
-
-            history = history.drop(index_to_remove)
-            history = history.append(row)
-
-        super().append(history, *args, **kwargs)
+        self._columns().append(history)
+        self._frame = None  # : built again when read.
         return
 
-    def _index_mask(self, fold, epoch):
-        return (self.df.loc[:, 'fold'] == fold) & (self.df.loc[:, 'epoch'] == epoch)
+    def _columns(self):
+        # the store, rebuilt from the dataframe if the dataframe was assigned or changed in place since.
+        if self._store is None or (self._frame is not None and not self._is_store_view_of_frame()):
+            self._store = Columnar_store.from_frame(self._frame)
+        return self._store
+
+    def _is_store_view_of_frame(self):
+        # the columns of the store are the memory of the columns of the frame: the values are the same,
+        # including the ones modified in place. The values are not compared, it would cost a copy.
+        if len(self._frame) != len(self._store) or list(self._frame.columns) != self._store.column_names:
+            return False
+        if not len(self._frame):
+            return True
+        return all(Estim_history._is_same_memory(self._frame[name].to_numpy(), self._store.column(name))
+                   for name in self._store.column_names)
 
-    def _fold_mask(self, fold):
-        return self.df.loc[:, 'fold'] == fold
+    @staticmethod
+    def _is_same_memory(array_1, array_2):
+        return (array_1.dtype == array_2.dtype and array_1.shape == array_2.shape
+                and array_1.__array_interface__['data'][0] == array_2.__array_interface__['data'][0]
+                and array_1.strides == array_2.strides)
+
+    def _update_index(self):
+        # indexes the rows appended since the last call, or all the rows if the store changed.
+        store = self._columns()
+        if store is not self._indexed_store:
+            self._indexed_store = store
+            self._rows_of_fold = {}
+            self._row_of_fold_epoch = {}
+            self._nb_rows_indexed = 0
+        start = self._nb_rows_indexed
+        if start == len(store):
+            return
+        folds = store.column('fold')[start:]
+        order = np.argsort(folds, kind='stable')
+        new_folds, starts = np.unique(folds[order], return_index=True)
+        for fold, rows in zip(new_folds.tolist(), np.split(order + start, starts[1:])):
+            previous_rows = self._rows_of_fold.get(fold)
+            self._rows_of_fold[fold] = rows if previous_rows is None else np.concatenate((previous_rows, rows))
+            self._row_of_fold_epoch.pop(fold, None)  # : new rows in the fold, its epochs are indexed again.
+        self._nb_rows_indexed = len(store)
+
+    def _row_index(self, fold, epoch):
+        # the first row of the couple (fold, epoch), like a mask would give. None if there is none.
+        rows = self._fold_rows(fold)
+        row_of_epoch = self._row_of_fold_epoch.get(fold)
+        if row_of_epoch is None:
+            # reversed, such that the first row of each epoch is the one kept.
+            epochs = self._columns().column('epoch')[rows]
+            row_of_epoch = dict(zip(epochs[::-1].tolist(), rows[::-1].tolist()))
+            self._row_of_fold_epoch[fold] = row_of_epoch
+        return row_of_epoch.get(epoch)
+
+    def _fold_rows(self, fold):
+        self._update_index()
+        return self._rows_of_fold.get(fold, np.empty(0, dtype=int))
 
     @property
     def nb_folds(self):
-        return self.df.loc[:, 'fold'].max() + 1
+        folds = self._columns().column('fold')
+        return folds.max() + 1 if len(folds) else np.nan  # : nan for an empty history, like pandas.
 
     @property
     def nb_epochs(self):
-        return self.df.loc[:, 'epoch'].max() + 1
+        epochs = self._columns().column('epoch')
+        return epochs.max() + 1 if len(epochs) else np.nan  # : nan for an empty history, like pandas.
 
     def slice_best_fold(self):
         """
@@ -307,26 +401,25 @@ class Estim_history(Estimator):
         #  and that the best_fold for example do not correspond to the index of the two lists.
         # self.list_train_times = [self.list_best_epoch[self.best_fold]]
         # self.list_best_epoch = [self.list_best_epoch[self.best_fold]]
-        self.df = self.df.loc[self._fold_mask(self.best_fold)]
+        # the labels of the rows are kept, like a mask upon the dataframe.
+        self.df = self.df.iloc[self._fold_rows(self.best_fold)]
 
     # section ######################################################################
     #  #############################################################################
     # SETTERS GETTERS
 
     def get_values_fold_epoch_col(self, fold, epoch, column):
-        index = self._index_mask(fold, epoch)
-        try:
-            res = self.df.loc[:, column][index].values[0]
-        except IndexError:
+        values = self._columns().column(column)
+        row = self._row_index(fold, epoch)
+        if row is None:
             raise IndexError("Possible issue: the data given does not have the requested epoch or loss type inside.")
-        return res
+        return values[row]
 
     def get_values_fold_col(self, fold, column):
-        index = self._fold_mask(fold)
-        return self.df.loc[:, column][index].values
+        return self._columns().column(column)[self._fold_rows(fold)]
 
     def get_values_col(self, column):
-        return self.df.loc[:, column].values
+        return self._columns().column(column)
 
     def get_best_value_for(self, column):
         try:
@@ -339,6 +432,20 @@ class Estim_history(Estimator):
     def get_time_best_fold(self):
         return self.list_train_times[self.best_fold]
 
+    @property
+    def _df(self):
+        # the storage of the dataframe of Estimator, built from the store when read.
+        # The store is then replaced by a view of the columns of the frame, such that the getters see its changes.
+        if self._frame is None:
+            self._frame = self._store.to_frame()
+            self._store = Columnar_store.from_frame(self._frame)
+        return self._frame
+
+    @_df.setter
+    def _df(self, new_df):
+        self._frame = new_df
+        self._store = None
+
     @property
     def best_fold(self):
         return self._best_fold
@@ -13,7 +13,7 @@ class Estim_hyper_param(Estimator):
         super().__init__(df)
 
     @classmethod
-    def from_folder(cls, path, metric_names, flg_time=False, compressed=True):
+    def from_folder(cls, path, metric_names, flg_time=False, compressed=True, binary=False, nb_workers=1, silent=True):
         """
         Semantics:
             Initialise an estim_hyper_param from a folder of estim_history.
@@ -21,11 +21,18 @@ class Estim_hyper_param(Estimator):
             path(str): The path to the folder.
             metric_names(list of str): The metric used for comparison.
             flg_time(bool): Flag to specify if the training time should be saved to the dataframe.
-            compressed(bool): Flag to specify if compression is used.
+            compressed(bool): Flag to specify if compression is used. Only for json.
+            binary(bool): Flag to specify if the estim_history were saved with to_binary instead of to_json.
+            nb_workers(int): number of processes reading the files.
+            silent(bool): if False, a progress bar is shown.
         Returns:
             An Estim_hyper_param.
         """
-        list_estimators = Estim_history.folder_json2list_estim(path, compress=compressed)
+        # the estim_history are read one after the other, only their best values are kept.
+        if binary:
+            list_estimators = Estim_history.folder_binary2iter_estim(path, nb_workers, silent)
+        else:
+            list_estimators = Estim_history.folder_json2iter_estim(path, compressed, nb_workers, silent)
         return Estim_hyper_param.from_list(list_estimators, metric_names, flg_time)
 
     @classmethod
@@ -34,7 +41,7 @@ class Estim_hyper_param(Estimator):
         Semantics:
             Initialise an estim_hyper_param from a list of estim_history.
         Args:
-            list_estimator(list of Estim_history): The estimators to be used.
+            list_estimator(iterable of Estim_history): The estimators to be used.
             metric_names(list of str): The metrics used for comparison.
             flg_time(bool): Flag to specify if the training time should be saved to the dataframe.
 
@@ -43,11 +50,22 @@ class Estim_hyper_param(Estimator):
         """
         # collect the data from the estimators
         assert not isinstance(metric_names, str), "metric_names shall be a list of str."
-        dataframe_information = \
-            [Estim_hyper_param._get_dict_from_estimator(estimator, metric_names, flg_time) for estimator in list_estimator]
+        # the dataframe is assembled by columns: one list per column, and a value appended per estimator.
+        # Columns missing for some estimators are filled with nan, like the construction from a list of dicts.
+        columns = {}
+        nb_estimators = 0
+        for estimator in list_estimator:
+            for key, value in Estim_hyper_param._get_dict_from_estimator(estimator, metric_names, flg_time).items():
+                if key not in columns:  # : a new column, nan for the previous estimators.
+                    columns[key] = [np.nan] * nb_estimators
+                columns[key].append(value)
+            nb_estimators += 1
+            for values in columns.values():
+                if len(values) < nb_estimators:
+                    values.append(np.nan)
 
         # initialise the dataframe
-        dataframe = pd.DataFrame(dataframe_information)
+        dataframe = pd.DataFrame(columns)
         return cls(dataframe)
 
     @staticmethod
@@ -64,10 +82,13 @@ class Estim_hyper_param(Estimator):
         """
         Semantics:
             Computes the number of parameters for each entry and adds it to a new column.
+            The computation is vectorised: each distinct list of hidden sizes is parsed once,
+            and the counts are computed with numpy over the padded lists, see Fully_connected_NN.compute_nb_of_params_padded.
         Requirements:
             Works for a fully connected NN, the estimator must contain the list of hidden sizes and the architecture.
             When the architecture for a row is not 'fcnn', the result will be NaN.
             If input size or output size are not present, they are assumed to be 1.
+            If the biases (list_biases) are not present, all the layers are assumed to have biases.
         Returns:
             Void.
         """
@@ -83,15 +104,41 @@ class Estim_hyper_param(Estimator):
             print("No output size provided. Assume output size is 1.")
             self.df['output_size'] = [1] * self.df.shape[0]
 
-        # using apply to convert a list of strings into a list of lists. ast.literal_eval does the trick.
+        # the lists of strings are converted into lists of lists. ast.literal_eval does the trick.
         # Reference: https://docs.python.org/3/library/ast.html
-        self.df['list_hidden_sizes'] = self.df['list_hidden_sizes'].apply(ast.literal_eval)
+        self.df['list_hidden_sizes'], hidden_sizes = Estim_hyper_param._parse_padded_lists(self.df['list_hidden_sizes'])
+        nb_layers = np.count_nonzero(hidden_sizes, axis=1)
+        if 'list_biases' in self.df.columns:
+            self.df['list_biases'], biases = Estim_hyper_param._parse_padded_lists(self.df['list_biases'],
+                                                                                   hidden_sizes.shape[1] + 1)
+            biases = biases.astype(bool)
+        else:
+            biases = np.ones((len(hidden_sizes), hidden_sizes.shape[1] + 1), dtype=bool)
+
+        nb_of_params = Fully_connected_NN.compute_nb_of_params_padded(self.df['input_size'].to_numpy(dtype=np.int64),
+                                                                      hidden_sizes,
+                                                                      self.df['output_size'].to_numpy(dtype=np.int64),
+                                                                      biases)
+        is_fcnn = (self.df['architecture'] == 'fcnn').to_numpy() & (nb_layers > 0)
+        self.df['nb_of_params'] = np.where(is_fcnn, nb_of_params, np.nan)
 
-        def compute_row(row):
-            if row.architecture != 'fcnn':
-                return np.nan
-            return Fully_connected_NN.compute_nb_of_params(input_size=row.input_size,
-                                                           list_hidden_sizes=row.list_hidden_sizes,
-                                                           output_size=row.output_size)
-
-        self.df['nb_of_params'] = self.df.apply(lambda row: compute_row(row), axis=1)
+    @staticmethod
+    def _parse_padded_lists(column, min_width=1):
+        """
+            Parses a column of lists (or of their string representation), once per distinct value.
+        Returns:
+            The column of parsed lists (the missing values are kept),
+            and the lists padded with zeros in an integer array of shape (nb rows, max(max length, min_width)).
+        """
+        codes, uniques = pd.factorize(column.map(lambda value: tuple(value) if isinstance(value, list) else value))
+        parsed = [ast.literal_eval(value) if isinstance(value, str) else list(value) for value in uniques]
+
+        padded = np.zeros((len(parsed) + 1, max([min_width] + [len(values) for values in parsed])), dtype=np.int64)
+        parsed_uniques = np.empty(len(parsed) + 1, dtype=object)
+        for i, values in enumerate(parsed):
+            padded[i, :len(values)] = values
+            parsed_uniques[i] = values
+        # the last row is empty, it is the one of the missing values (code -1).
+
+        parsed_column = np.where(codes >= 0, parsed_uniques[codes], column.to_numpy(dtype=object))
+        return parsed_column, padded[codes]
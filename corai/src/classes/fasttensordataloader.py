@@ -1,3 +1,6 @@
+import queue
+import threading
+
 import torch
 
 ######### comment
@@ -11,25 +14,56 @@ class FastTensorDataLoader:
     the dataset and calls cat (slow).
     Source: https://discuss.pytorch.org/t/dataloader-much-slower-than-manual-batching/27014/6
 
+    In streaming mode (device given), the tensors stay on the host and only the batches are sent to the device.
+    This allows to train over datasets that do not fit in the memory of the device.
+    A background thread can prepare the next batches while the current one is used.
+
     References:
         https://github.com/hcarlens/pytorch-tabular/blob/master/fast_tensor_data_loader.py
     """
 
-    def __init__(self, *tensors, batch_size=32, shuffle=False):
+    def __init__(self, *tensors, batch_size=32, shuffle=False, index_shuffle=False, chunk_size=None,
+                 device=None, nb_prefetch=0, pin_memory=True):
         """
         Initialize a FastTensorDataLoader.
         :param *tensors: tensors to store. Must have the same length @ dim 0.
         :param batch_size: batch size to load.
         :param shuffle: if True, shuffle the data *in-place* whenever an
             iterator is created out of this object.
+        :param index_shuffle: if True, shuffling does not reorder the tensors. A permutation of the indices is drawn
+            and each batch is gathered from the original storage, such that only one copy of the data is held.
+            Always the case for tensor-like objects that are not tensors (MemmapTensor, WindowedTensor).
+        :param chunk_size: requires index_shuffle. If not None, the data is shuffled by contiguous chunks of
+            chunk_size rows, the order inside a chunk is kept. Accesses to memory are contiguous inside a chunk.
+        :param device: if not None, streaming mode: the tensors stay where they are (host)
+            and each batch is moved to device.
+        :param nb_prefetch: requires device. Number of batches prepared in advance by a background thread.
+            If 0, the batches are moved when requested.
+        :param pin_memory: in streaming mode towards a cuda device, the batches are gathered in pinned memory
+            such that the transfers are asynchronous.
         :returns: A FastTensorDataLoader.
         """
         assert all(t.shape[0] == tensors[0].shape[0] for t in tensors), "wrong shapes."
+        assert chunk_size is None or index_shuffle, "Shuffling by chunks requires index_shuffle."
+        assert nb_prefetch == 0 or device is not None, "Prefetching requires a device to stream to."
         self.tensors = tensors
 
         self.dataset_len = self.tensors[0].shape[0]
         self.batch_size = batch_size
         self.shuffle = shuffle
+        # tensor-like objects (data on disk) cannot be reordered in place.
+        self.index_shuffle = index_shuffle or not all(isinstance(t, torch.Tensor) for t in tensors)
+        self.chunk_size = chunk_size
+
+        self.device = torch.device(device) if device is not None else None
+        self.nb_prefetch = nb_prefetch
+        self._pin_memory = pin_memory and self.device is not None and self.device.type == 'cuda'
+        self._queue = None  # batches prepared by the background thread.
+        self._stop_prefetch = None  # event to stop the background thread of the previous epoch.
+        self._thread = None
+
+        self.indices = None  # permutation of the current epoch, used when index_shuffle.
+        self.nb_bytes_moved = 0  # bytes copied during the last epoch, by the shuffle, gathering or streaming batches.
 
         # Calculate # batches
         n_batches, remainder = divmod(self.dataset_len, self.batch_size)
@@ -38,18 +72,133 @@ class FastTensorDataLoader:
         self.n_batches = n_batches
 
     def __iter__(self):
+        self._stop_prefetching()
+        self.nb_bytes_moved = 0
+        self.indices = None
         if self.shuffle:
-            r = torch.randperm(self.dataset_len)
-            self.tensors = [t[r] for t in self.tensors]
+            if self.index_shuffle:
+                self.indices = self._permuted_indices()
+            else:
+                r = torch.randperm(self.dataset_len)
+                self.tensors = [t[r] for t in self.tensors]
+                self.nb_bytes_moved += FastTensorDataLoader._nb_bytes(self.tensors)
         self.i = 0
+        if self.nb_prefetch > 0:
+            self._start_prefetching()
         return self
 
     def __next__(self):
+        if self._queue is not None:  # the background thread is the one reading the data.
+            item = self._queue.get()
+            if item is None:
+                self._queue = None
+                raise StopIteration
+            if isinstance(item, BaseException):
+                self._queue = None
+                raise item
+            return self._wait_for_transfer(*item)
+
         if self.i >= self.dataset_len:
             raise StopIteration
-        batch = tuple(t[self.i:self.i + self.batch_size] for t in self.tensors)
-        self.i += self.batch_size
+        batch = self._next_batch()
+        if self.device is not None:
+            batch = self._wait_for_transfer(*self._to_device(batch, None))
         return batch
 
     def __len__(self):
         return self.n_batches
+
+    def _next_batch(self):
+        if self.indices is None:
+            if self.device is None:
+                batch = tuple(t[self.i:self.i + self.batch_size] for t in self.tensors)  # views, no copy.
+            else:
+                batch = tuple(self._gather(t, slice(self.i, self.i + self.batch_size)) for t in self.tensors)
+                self.nb_bytes_moved += FastTensorDataLoader._nb_bytes(batch)
+        else:
+            indices_batch = self.indices[self.i:self.i + self.batch_size]
+            batch = tuple(self._gather(t, indices_batch) for t in self.tensors)
+            self.nb_bytes_moved += FastTensorDataLoader._nb_bytes(batch)
+        self.i += self.batch_size
+        return batch
+
+    def _gather(self, tensor, index):
+        if not self._pin_memory or not isinstance(tensor, torch.Tensor):
+            batch = tensor[index]  # for tensor-like objects, reads the rows.
+            return batch.pin_memory() if self._pin_memory else batch
+        # gathered directly into pinned memory, such that the transfer to the device is asynchronous.
+        if isinstance(index, slice):
+            rows = tensor[index]  # view, the only copy is towards the buffer.
+            buffer = torch.empty(rows.shape, dtype=rows.dtype, pin_memory=True)
+            return buffer.copy_(rows)
+        buffer = torch.empty((len(index),) + tuple(tensor.shape[1:]), dtype=tensor.dtype, pin_memory=True)
+        return torch.index_select(tensor, 0, index, out=buffer)
+
+    def _to_device(self, batch, stream):
+        # returns the batch on device and the event marking the end of the transfer (None if synchronous).
+        if stream is None:
+            return tuple(t.to(self.device, non_blocking=self._pin_memory) for t in batch), None
+        with torch.cuda.stream(stream):
+            batch = tuple(t.to(self.device, non_blocking=True) for t in batch)
+            event = torch.cuda.Event()
+            event.record(stream)
+        return batch, event
+
+    def _wait_for_transfer(self, batch, event):
+        if event is not None:
+            current_stream = torch.cuda.current_stream(self.device)
+            current_stream.wait_event(event)
+            for t in batch:
+                t.record_stream(current_stream)  # the memory belongs now to the stream of the computations.
+        return batch
+
+    def _start_prefetching(self):
+        self._queue = queue.Queue(maxsize=self.nb_prefetch)
+        self._stop_prefetch = threading.Event()
+        stream = torch.cuda.Stream(self.device) if self.device.type == 'cuda' else None
+        self._thread = threading.Thread(target=self._prefetch, args=(self._queue, self._stop_prefetch, stream),
+                                        daemon=True)
+        self._thread.start()
+
+    def _stop_prefetching(self):
+        # if the previous epoch was not iterated until the end, the thread is waiting for space in the queue.
+        # It is stopped and joined before the state of the loader is reset.
+        if self._thread is not None:
+            self._stop_prefetch.set()
+            self._thread.join()
+        self._queue = None
+        self._stop_prefetch = None
+        self._thread = None
+
+    def _prefetch(self, batches_queue, stop, stream):
+        try:
+            while self.i < self.dataset_len and not stop.is_set():
+                item = self._to_device(self._next_batch(), stream)
+                FastTensorDataLoader._put_until_stopped(batches_queue, item, stop)
+            FastTensorDataLoader._put_until_stopped(batches_queue, None, stop)  # end of the epoch.
+        except BaseException as error:  # given to the main thread.
+            FastTensorDataLoader._put_until_stopped(batches_queue, error, stop)
+
+    @staticmethod
+    def _put_until_stopped(batches_queue, item, stop):
+        while not stop.is_set():
+            try:
+                batches_queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _permuted_indices(self):
+        # drawn on cpu like the in-place shuffle, then moved once per epoch where the data lies.
+        if self.chunk_size is None:
+            indices = torch.randperm(self.dataset_len)
+        else:
+            nb_chunks = -(-self.dataset_len // self.chunk_size)  # ceil division
+            starts_chunks = torch.randperm(nb_chunks) * self.chunk_size
+            indices = (starts_chunks.unsqueeze(1) + torch.arange(self.chunk_size)).flatten()
+            indices = indices[indices < self.dataset_len]  # the last chunk might be incomplete.
+        return indices.to(self.tensors[0].device)
+
+    @staticmethod
+    def _nb_bytes(tensors):
+        return sum(t.nelement() * t.element_size() for t in tensors)
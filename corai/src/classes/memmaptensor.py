@@ -0,0 +1,104 @@
+import os
+
+import numpy as np
+import torch
+
+
+class MemmapTensor(object):
+    """
+    Semantics:
+        Tensor-like view over an array stored on disk as a numpy memmap.
+        Nothing is read at construction. Indexing along the first dimension reads the requested rows from the disk
+        and returns them as a torch tensor in RAM. `take_rows` restricts the view to some rows without reading anything.
+
+        It can be given to `nn_kfold_train` / `nn_train` instead of the tensors of data.
+        Each fold then only keeps the indices of its rows, and the batches are read lazily by the loaders,
+        which allows to train upon datasets larger than the RAM. It requires `NNTrainParameters.stream_to_device`.
+
+    Examples:
+        MemmapTensor.to_npy("data_X.npy", train_X)  # once.
+        data_X = MemmapTensor.from_npy("data_X.npy")
+        net, estimator_history = nn_kfold_train(data_X, train_Y, Model_NN, param_train, nb_split=5)
+    """
+
+    def __init__(self, array, rows=None):
+        """
+        Args:
+            array (np.memmap or np.ndarray): the data, first dimension is the batch dimension.
+            rows (np.ndarray of int): rows of the array seen by the view. None means all the rows.
+        """
+        self._array = array
+        self._rows = rows
+
+    @classmethod
+    def from_npy(cls, path):
+        """ Open an npy file as a memmap. The file is not read."""
+        return cls(np.load(path, mmap_mode='r'))
+
+    @staticmethod
+    def to_npy(path, data):
+        """
+        Write data (tensor or array) to an npy file that can be opened with from_npy.
+        Create a directory if the path yields a non-existent directory.
+        """
+        directory_where_to_save = os.path.dirname(path)
+        if not os.path.exists(directory_where_to_save):
+            if directory_where_to_save != '':
+                os.makedirs(directory_where_to_save)
+        if isinstance(data, torch.Tensor):
+            data = data.cpu().numpy()
+        np.save(path, data)
+
+    @property
+    def shape(self):
+        nb_rows = self._array.shape[0] if self._rows is None else len(self._rows)
+        return torch.Size((nb_rows,) + tuple(self._array.shape[1:]))
+
+    @property
+    def dtype(self):
+        return torch.from_numpy(np.empty(0, dtype=self._array.dtype)).dtype
+
+    @property
+    def device(self):
+        return torch.device('cpu')
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, index):
+        """ Read the rows from the disk, returns a tensor."""
+        rows = self._rows_of(index)
+        if isinstance(rows, np.ndarray) and rows.ndim == 1:
+            # the disk is read in increasing order, and the rows are put back in the requested order.
+            order = np.argsort(rows, kind='stable')
+            data = np.empty((len(rows),) + tuple(self._array.shape[1:]), dtype=self._array.dtype)
+            data[order] = self._array[rows[order]]
+        else:
+            data = np.array(self._array[rows])  # copy in RAM of the memmap slice.
+        return torch.from_numpy(data)
+
+    def take_rows(self, index):
+        """ Returns a MemmapTensor restricted to the rows given by index. Nothing is read."""
+        rows = self._rows_of(index)
+        if not isinstance(rows, np.ndarray):  # slice or int, converted to explicit rows.
+            rows = np.arange(self._array.shape[0])[rows]
+        return MemmapTensor(self._array, np.atleast_1d(rows))
+
+    def to(self, device):
+        """ Read all the rows and send them to device."""
+        return self[:].to(device)
+
+    def __array__(self, dtype=None):
+        # used by sklearn for the targets of stratified kfold. Reads all the rows.
+        data = self[:].numpy()
+        return data if dtype is None else data.astype(dtype)
+
+    def _rows_of(self, index):
+        # translates an index of the view into an index of the array.
+        if isinstance(index, torch.Tensor):
+            index = index.cpu().numpy()
+        elif isinstance(index, list):
+            index = np.asarray(index)
+        if self._rows is None:
+            return index
+        return self._rows[index]
@@ -13,9 +13,14 @@ class Metric(object):
         L4metric = Metric('L4',L4loss)
         metrics = (L4metric,)
 
+        The same metric, computed upon the predictions shared with the other metrics and the validation loss:
+        def L4loss_pred(prediction, yy):
+            return torch.norm(prediction - yy, 4)
+        L4metric = Metric('L4', L4loss_pred, on_prediction=True)
+
     """
 
-    def __init__(self, name, function):
+    def __init__(self, name, function, on_prediction=False):
         """
         Constructor.
         Args:
@@ -23,13 +28,24 @@ class Metric(object):
             function: a callable taking 3 parameters: net, xx and yy. It returns a float.
             Be careful about how the data is computed,
             as net is on device, xx is on device, and yy is also on device.
+            on_prediction (bool): if true, function takes 2 parameters: the prediction of the net over xx
+                (`net.nn_predict(xx)`) and yy. During training, the prediction is then computed once per batch
+                and shared by all such metrics and the validation loss.
         """
         self.name = name
         self._function = function
+        self.on_prediction = on_prediction
 
     def __call__(self, net, xx, yy):
+        if self.on_prediction:
+            return self._function(net.nn_predict(xx), yy)
         return self._function(net, xx, yy)
 
+    def from_prediction(self, prediction, yy):
+        """ Evaluate a metric with on_prediction == True upon an already computed prediction."""
+        assert self.on_prediction, "The metric does not consume predictions."
+        return self._function(prediction, yy)
+
     @property
     def name(self):
         return self._name
@@ -51,3 +67,14 @@ class Metric(object):
             self.__function = new__function
         else:
             raise Error_type_setter(f'Argument is not an {str(Callable)}.')
+
+    @property
+    def on_prediction(self):
+        return self._on_prediction
+
+    @on_prediction.setter
+    def on_prediction(self, new_on_prediction):
+        if isinstance(new_on_prediction, bool):
+            self._on_prediction = new_on_prediction
+        else:
+            raise Error_type_setter(f'Argument is not an {str(bool)}.')
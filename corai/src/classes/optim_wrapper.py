@@ -38,5 +38,16 @@ class Optim_wrapper(object):
         if self._has_scheduler():
             self.scheduler_instance.step()
 
+    def state_dict(self):
+        """ State of the optimiser and of the scheduler, used for checkpoints."""
+        return {'optimiser': self.optimiser_instance.state_dict(),
+                'scheduler': self.scheduler_instance.state_dict() if self.scheduler_instance is not None else None}
+
+    def load_state_dict(self, state_dict):
+        """ Restores the state given by state_dict. The optimiser (and scheduler) should be initialised."""
+        self.optimiser_instance.load_state_dict(state_dict['optimiser'])
+        if self.scheduler_instance is not None and state_dict['scheduler'] is not None:
+            self.scheduler_instance.load_state_dict(state_dict['scheduler'])
+
     def _has_scheduler(self):
         return self.Scheduler is not None and self.scheduler_parameters is not None
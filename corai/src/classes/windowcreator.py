@@ -1,9 +1,10 @@
 from enum import Enum, auto
 
 import torch
-from torch import Tensor
 from tqdm import tqdm
 
+from corai.src.classes.windowedtensor import WindowedTensor
+
 
 class WindowCreator(object):
     """
@@ -87,21 +88,32 @@ class WindowCreator(object):
         # Parameters of the slices
         self.complete_window_data = self.lookback_window + self.end_pred_window
 
-    def create_input_sequences(self, input_data: torch.tensor, output_data: torch.tensor = None):
+    def create_input_sequences(self, input_data: torch.tensor, output_data: torch.tensor = None, copy: bool = True):
         """
         Semantics:
             create the dataset for training. Give time-series as u[t], v[t], without any time difference. If there is, add padding to reflect it.
             They should be of matching size, and the function will deduce which values correspond to which, by the windows given at initialisation.
 
+            The windows are strided views over the data (Tensor.unfold), there is no loop over the windows.
+            For the type MOVING_INCLUDING_PADDED_SEQUENCES, the first windows, that contain fewer than lookback_window
+            data points, are padded with zeros at the beginning. For the type INCREASING, the windows start at the
+            beginning of the time-series and grow by one point at a time. They are all padded at the beginning to the
+            longest window, of length L - end_pred_window.
+
         Args:
             input_data  (pytorch tensor (batch N, length L, D_in nb dimensions) if batch first): all time-series from batch must have the same length,
                 because otherwise they would not fit inside a tensor.
             output_data (pytorch tensor (batch N, length L, D_out nb dimensions)): can be none, then no output_data returned.
+            copy: if False, the windows are returned as views upon the data, without copy (zero-copy mode).
+                Since the windows overlap, the views use the memory of the data once, instead of lookback_window times.
+                The views cannot merge the batch dimension of the time-series with the one of the windows,
+                their shape is [batch N, nb windows, sequence, dimension]. Do not write into them.
 
         Returns:
             Two tensors with the data split in this shape:
                 [batch size, sequence, dimension]
-            only data_x if no output_data passed.
+            (data_X is [sequence, batch size, dimension] if not batch_first),
+            None instead of data_Y if no output_data passed.
 
         References :
             from https://stackabuse.com/time-series-prediction-using-lstm-with-pytorch-in-python/?fbclid=IwAR17NoARUlBsBLzanKmyuvmCXfU6Rxc69T9BZpowXfSUSYQNEFzl2pfDhSo
@@ -112,43 +124,95 @@ class WindowCreator(object):
         if output_data is not None:
             assert dtype == output_data.dtype, "Data Input/Output should have the same dtype."
 
-        nb_batch = input_data.shape[0]  # N as in documentation.
         L = input_data.shape[1]  # L as in documentation.
-
-        # We will get length time series minus the window size plus one number of points.
-        nb_data = L - self.complete_window_data + 1
-
         self._assert_cdt_create_sequences(L, input_data, output_data)
+        lookback_window, nb_padding, nb_data, start_out = self._windows_parameters(L)
 
         # Assuming our data is two time series stacked (u1,u2,u3;v1,v2,v3), with shape (2,3,D_in), then for all time series,
         # we construct the different time series that will be used for training.
         # For example, using a lookback_window of 1, nb_data = 2 and:
         #   (u1,u2,u3;v1,v2,v3) -> (u1,u2;v1,v2), (u2,u3;v2,v3).
         # We flatten the resulting tensor along the batching dimension.
-        data_X = torch.zeros(nb_batch, nb_data, self.lookback_window, self.input_dim, dtype=dtype)
+        data_X = WindowCreator._windows(input_data, nb_padding, 0, lookback_window, nb_data)
+        data_Y = None
         if output_data is not None:
-            data_Y: Tensor = torch.zeros(nb_batch, nb_data, self.lookforward_window, self.output_dim, dtype=dtype)
+            # For v1, v2, v3, v4, v5, v6. lookback = 2, lookforward = 2, end_pred_window = 3, then:
+            # v1, v2, -> v4, v5,
+            # v2, v3, -> v5, v6.
+            data_Y = WindowCreator._windows(output_data, 0, start_out, self.lookforward_window, nb_data)
+
+        if not copy:
+            if not self.batch_first:
+                data_X = data_X.permute(2, 0, 1, 3)  # Resulting view has dimension (sequence, N, nb windows, dim).
+            return data_X, data_Y
 
-        for i in tqdm(range(nb_data), disable=self.silent):
-            data_X[:, i, :, :] = input_data[:, i:i + self.lookback_window, :]
+        # the only copy: each view is written once in a contiguous tensor.
+        data_X = torch.flatten(data_X.clone(memory_format=torch.contiguous_format), start_dim=0, end_dim=1)
+        if not self.batch_first:
+            data_X = data_X.transpose(0, 1)  # Resulting tensor has dimension (sequence, batch, dim input).
+        if output_data is not None:
+            data_Y = torch.flatten(data_Y.clone(memory_format=torch.contiguous_format), start_dim=0, end_dim=1)
+        return data_X, data_Y
 
-            if output_data is not None:
-                # For v1, v2, v3, v4, v5, v6. lookback = 2, lookforward = 2, end_pred_window = 3, then:
-                # v1, v2, -> v4, v5,
-                # v2, v3, -> v5, v6.
-                slice_out = slice(i + self.lookback_window + self.end_pred_window - self.lookforward_window,
-                                  i + self.lookback_window + self.end_pred_window)
-                data_Y[:, i, :, :] = output_data[:, slice_out, :]  # add dimension of nb_data
+    def create_lazy_input_sequences(self, input_data: torch.tensor, output_data: torch.tensor = None):
+        """
+        Semantics:
+            Same windows as create_input_sequences, but nothing is materialised: the returned WindowedTensor hold
+            the time-series (N, L, D) and a window is computed when it is indexed. They can be given to
+            FastTensorDataLoader, nn_train and nn_kfold_train instead of the tensors of windows,
+            each batch of windows is then gathered from the time-series by the loader.
 
-        data_X = torch.flatten(data_X, start_dim=0, end_dim=1)
+        Args:
+            input_data  (pytorch tensor (batch N, length L, D_in nb dimensions)): the time-series.
+            output_data (pytorch tensor (batch N, length L, D_out nb dimensions)): can be none.
 
-        if not self.batch_first:
-            data_X = data_X.transpose(0, 1)  # Resulting tensor has dimension (sequence, batch, dim input).
+        Returns:
+            Two WindowedTensor of shapes [batch size, sequence, dimension],
+            None instead of the second one if no output_data passed.
+        """
+        assert self.batch_first, "The loaders batch along the first dimension: lazy windows require batch_first."
         if output_data is not None:
-            data_Y = torch.flatten(data_Y, start_dim=0, end_dim=1)
-            return data_X, data_Y
+            assert input_data.dtype == output_data.dtype, "Data Input/Output should have the same dtype."
+        L = input_data.shape[1]
+        self._assert_cdt_create_sequences(L, input_data, output_data)
+        lookback_window, nb_padding, nb_data, start_out = self._windows_parameters(L)
 
-        return data_X, None
+        data_X = WindowedTensor(WindowCreator._pad(input_data, nb_padding), lookback_window, nb_data)
+        data_Y = None
+        if output_data is not None:
+            data_Y = WindowedTensor(output_data, self.lookforward_window, nb_data, start=start_out)
+        return data_X, data_Y
+
+    def _windows_parameters(self, sequence_len):
+        # returns the length of the input windows, the number of zeros added at the beginning of the time-series
+        # for the windows with fewer data points, the number of windows per time-series and the start of the targets.
+        # the increasing windows are padded to the longest one.
+        if self.type_window == WindowCreator.AllowedType.INCREASING:
+            lookback_window = sequence_len - self.end_pred_window
+        else:
+            lookback_window = self.lookback_window
+        nb_padding = 0 if self.type_window == WindowCreator.AllowedType.MOVING else lookback_window - 1
+        # We will get length time series minus the window size plus one number of points.
+        nb_data = sequence_len + nb_padding - lookback_window - self.end_pred_window + 1
+        # The targets are never in the padding, the windows end after the first point.
+        start_out = lookback_window + self.end_pred_window - self.lookforward_window - nb_padding
+        return lookback_window, nb_padding, nb_data, start_out
+
+    @staticmethod
+    def _pad(data, nb_padding):
+        if nb_padding:
+            data = torch.cat((data.new_zeros(data.shape[0], nb_padding, data.shape[2]), data), dim=1)
+        return data
+
+    @staticmethod
+    def _windows(data, nb_padding, start, window, nb_windows):
+        # view of shape (N, nb_windows, window, D) upon data (padded with nb_padding zeros at the beginning).
+        # The i-th window starts at start + i.
+        data = WindowCreator._pad(data, nb_padding)
+        if window == 0:
+            return data.new_zeros(data.shape[0], nb_windows, 0, data.shape[2])
+        # unfold puts the window dimension last: (N, nb_windows, D, window).
+        return data[:, start:].unfold(1, window, 1)[:, :nb_windows].transpose(2, 3)
 
     def _assert_cdt_create_sequences(self, sequence_len, input_data, output_data=None):
         assert self.lookback_window < sequence_len, \
@@ -166,7 +230,7 @@ class WindowCreator(object):
                 f"Time-series output dimension not corresponding to the window's: {output_data.shape[2]}, {self.output_dim}."
 
     # WIP IS THIS CORRECT, requires nn_predict mhm
-    def prediction_over_training_data(self, net, data, increase_data_for_pred, device):
+    def prediction_over_training_data(self, net, data, increase_data_for_pred, device, increase_on_device=False):
         """
         Semantics:
             predict the output by taking the input data and iterating over data by the window.
@@ -180,6 +244,7 @@ class WindowCreator(object):
             data: tensor with shape (N batch, L length time series, Dim Input)
             increase_data_for_pred (callable):  Using a class for this allows to store some parameters.
             device (pytorch device): where the net lies with data.
+            increase_on_device (bool): see prediction_recurrent.
 
         Returns:
 
@@ -192,7 +257,7 @@ class WindowCreator(object):
         assert self.lookback_window <= data.shape[1], "For prediction, needs at least a window of data for prediction"
 
         nb_of_cycle_pred = (data.shape[1] - self.lookback_window) // self.lookforward_window
-        prediction = torch.zeros(1, self.lookforward_window * nb_of_cycle_pred, self.input_dim)
+        prediction = torch.zeros(data.shape[0], self.lookforward_window * nb_of_cycle_pred, self.input_dim)
         for i in range(nb_of_cycle_pred):
             indices_input = slice(i * self.lookforward_window,
                                   i * self.lookforward_window + self.lookback_window)
@@ -203,27 +268,34 @@ class WindowCreator(object):
             # predicting the next values, size (1,-1,self.input_dim) reflects (batch_size, length pred, self.input_dim)
             new_values = net.nn_predict(data[:, indices_input, :])
             # add values to the prediction:
-            new_values = self._adding_input_to_output(increase_data_for_pred, new_values, device)
+            new_values = self._adding_input_to_output(increase_data_for_pred, new_values, device, increase_on_device)
 
             prediction[:, indices_pred, :] = new_values
         return prediction
 
-    # WIP IS THIS CORRECT
-    def prediction_recurrent(self, net, data_start, nb_of_cycle_pred, increase_data_for_pred=None, device='cpu'):
+    def prediction_recurrent(self, net, data_start, nb_of_cycle_pred, increase_data_for_pred=None, device='cpu',
+                             increase_on_device=False):
         """
         Semantics:
             Prediction by iteratively using the previous prediction as inputs for the following ones.
             In order to add the data that has not been forecasted (for example you predict 2D -> 1D,
             the output is missing 1D for the future predictions), we use an adaptor. It is the parameter increase_data_for_pred.
+
+            All the time-series of the batch are predicted together, one call to the net per cycle.
+            The trajectory is allocated once on device and the windows given to the net are views upon it,
+            hence the cost of a cycle does not depend on the horizon.
         Args:
             net (Savable_net): model with the method nn_predict.
             data_start: starting data, to initialise the recurrent process. tensor with shape (N batch, L length time series, Dim Input)
-            nb_of_cycle_pred:
+            nb_of_cycle_pred: number of predictions of lookforward_window steps.
             increase_data_for_pred (callable):  Using a class for this allows to store some parameters.
             device (pytorch device): where the net lies with data_start.
+            increase_on_device (bool): if True, increase_data_for_pred is given the prediction as a tensor on device,
+                of shape (N batch, lookforward_window, Dim Output), and returns a tensor on device
+                (N batch, lookforward_window, Dim Input). Otherwise, it is given a numpy array (previous behaviour).
 
         Returns:
-
+            tensor (N batch, lookforward_window * nb_of_cycle_pred, Dim Input) on device, the predicted time-series.
         """
         # a container has the lookback window (at least) of data.
         # Then iteratively, it predicts the future.
@@ -233,27 +305,28 @@ class WindowCreator(object):
         assert self.lookback_window == data_start.shape[1], \
             "For prediction, needs a window of data for prediction. Given {}.".format(data_start.shape[1])
 
-        input_prediction = data_start.clone()
-        prediction = torch.zeros(1, self.lookforward_window * nb_of_cycle_pred, self.output_dim)
+        trajectory = torch.empty(data_start.shape[0], self.lookback_window + self.lookforward_window * nb_of_cycle_pred,
+                                 data_start.shape[2], dtype=data_start.dtype, device=device)
+        trajectory[:, :self.lookback_window] = data_start
 
-        for i in tqdm(range(nb_of_cycle_pred)):
+        for i in tqdm(range(nb_of_cycle_pred), disable=self.silent):
             indices_in = slice(i * self.lookforward_window,
                                i * self.lookforward_window + self.lookback_window)
             #  : we start at the lookforward_window * i and need lookback_window elements.
-            indices_pred = slice(i * self.lookforward_window,
-                                 (i + 1) * self.lookforward_window)
-
-            # predicting the next values, size (1,-1,self.input_dim) reflects (batch_size, length pred, self.input_dim)
-            new_values = net.nn_predict(input_prediction[:, indices_in, :])
-            prediction[:, indices_pred, :] = new_values
+            indices_pred = slice(i * self.lookforward_window + self.lookback_window,
+                                 (i + 1) * self.lookforward_window + self.lookback_window)
 
-            new_values = self._adding_input_to_output(increase_data_for_pred, new_values, device)
-            input_prediction = torch.cat((input_prediction, new_values), dim=1)
-        return input_prediction[:, self.lookback_window:]  # remove the starting time series
+            # predicting the next values, size (N,-1,self.input_dim) reflects (batch_size, length pred, self.input_dim)
+            new_values = net.nn_predict(trajectory[:, indices_in, :])  # : the window is a view, no copy.
+            trajectory[:, indices_pred, :] = self._adding_input_to_output(increase_data_for_pred, new_values, device,
+                                                                          increase_on_device)
+        return trajectory[:, self.lookback_window:]  # remove the starting time series
 
     # WIP IS THIS CORRECT
-    def _adding_input_to_output(self, increase_data_for_pred, new_values, device):
+    def _adding_input_to_output(self, increase_data_for_pred, new_values, device, increase_on_device=False):
         if increase_data_for_pred is not None:
+            if increase_on_device:
+                return increase_data_for_pred(new_values)
             new_values = increase_data_for_pred(new_values.cpu().numpy()).to(device)
             # cpu to make sure, numpy to avoid implicit conversion.
         return new_values
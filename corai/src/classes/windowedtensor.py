@@ -0,0 +1,81 @@
+import numpy as np
+import torch
+
+
+class WindowedTensor(object):
+    """
+    Semantics:
+        Tensor-like view over the windows of time-series, created by WindowCreator.create_lazy_input_sequences.
+        Only the time-series (N, L, D) are stored. The windows are numbered time-series after time-series,
+        and indexing along the first dimension computes the requested windows by index arithmetic:
+        the k-th window is series[k // nb_windows, start + k % nb_windows : start + k % nb_windows + window].
+
+        It can be given to `FastTensorDataLoader`, `nn_train` or `nn_kfold_train` instead of the tensor of windows,
+        such that the memory used is the one of the time-series, instead of window times it.
+        `take_rows` restricts the view to some windows without computing them.
+    """
+
+    def __init__(self, series, window, nb_windows, start=0, rows=None):
+        """
+        Args:
+            series (tensor (N, L, D)): the time-series.
+            window (int): length of the windows.
+            nb_windows (int): number of windows per time-series.
+            start (int): time of the beginning of the first window of each time-series.
+            rows (tensor of int): windows seen by the view. None means all the windows.
+        """
+        self._series = series
+        self._window = window
+        self._nb_windows = nb_windows
+        self._start = start
+        self._rows = rows
+
+    @property
+    def shape(self):
+        nb_rows = self._series.shape[0] * self._nb_windows if self._rows is None else len(self._rows)
+        return torch.Size((nb_rows, self._window, self._series.shape[2]))
+
+    @property
+    def dtype(self):
+        return self._series.dtype
+
+    @property
+    def device(self):
+        return self._series.device
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, index):
+        """ Computes the windows, returns a tensor of shape (nb rows, window, D)."""
+        rows = self._rows_of(index)
+        nb_series, time_windows = rows // self._nb_windows, self._start + rows % self._nb_windows
+        times = time_windows.unsqueeze(-1) + torch.arange(self._window, device=self.device)
+        return self._series[nb_series.unsqueeze(-1), times]  # : one gather for the whole batch.
+
+    def take_rows(self, index):
+        """ Returns a WindowedTensor restricted to the windows given by index. Nothing is computed."""
+        return WindowedTensor(self._series, self._window, self._nb_windows, self._start,
+                              torch.atleast_1d(self._rows_of(index)))
+
+    def to(self, device):
+        """ Moves the time-series to device, the windows are then computed on device."""
+        rows = self._rows.to(device) if self._rows is not None else None
+        return WindowedTensor(self._series.to(device), self._window, self._nb_windows, self._start, rows)
+
+    def __array__(self, dtype=None):
+        # used by sklearn for the targets of stratified kfold. Computes all the windows.
+        data = self[:].cpu().numpy()
+        return data if dtype is None else data.astype(dtype)
+
+    def _rows_of(self, index):
+        # translates an index of the view into indices of windows, as a tensor on the device of the series.
+        if isinstance(index, (list, np.ndarray)):
+            index = torch.as_tensor(index)
+        if isinstance(index, torch.Tensor):
+            index = index.to(self.device)
+        if self._rows is None:
+            if isinstance(index, slice):  # : batches of an unshuffled loader, only the rows of the batch are created.
+                return torch.arange(*index.indices(len(self)), device=self.device)
+            return torch.arange(len(self), device=self.device)[index]
+        return self._rows[index]
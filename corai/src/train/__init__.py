@@ -2,4 +2,7 @@ from .fit import nn_fit
 from .kfold_training import nn_kfold_train, initialise_estimator, train_kfold_a_fold_after_split
 from .nntrainparameters import NNTrainParameters
 from .train import nn_train
-from .history import translate_history_to_dataframe, history_create
\ No newline at end of file
+from .history import translate_history_to_dataframe, history_create
+from .stacked_training import nn_kfold_train_stacked, train_stacked_after_split
+from .sweep import run_sweep
+from .successive_halving import nn_successive_halving
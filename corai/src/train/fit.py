@@ -1,3 +1,4 @@
+import torch
 from matplotlib import pyplot as plt
 from corai_util.tools import function_iterable
 from tqdm import tqdm
@@ -22,7 +23,7 @@ def nn_fit(net, X_train_on_device, Y_train_on_device,
            params_training, history,
            early_stoppers=(Early_stopper_vanilla(),),
            X_val_on_device=None, Y_val_on_device=None,
-           *, silent=False):
+           *, checkpointer=None, silent=False):
     """
     Args:
         net (Savable_net): model.
@@ -34,8 +35,12 @@ def nn_fit(net, X_train_on_device, Y_train_on_device,
             Preferably immutable to insure no changes.
         X_val_on_device:
         Y_val_on_device:
+        checkpointer: Checkpointer or None. If given, the state of the training is saved every checkpointer.period
+            epochs, and the training restarts after the last saved epoch.
         silent: verbose.
 
+        When params_training.stream_to_device, the data is given on the host and the loaders stream the batches.
+
     Returns: epoch of the best net and updates the history
 
     Post-condition :
@@ -50,18 +55,32 @@ def nn_fit(net, X_train_on_device, Y_train_on_device,
      train_loader_on_device, validat_loader_on_device) = _prepare_data_for_fit(X_train_on_device, X_val_on_device,
                                                                                Y_train_on_device, Y_val_on_device, net,
                                                                                params_training)
-
-    epoch = 0
-    for epoch in tqdm(range(params_training.epochs), disable=silent):  # disable unable the print.
+    # training metrics can be computed upon a fixed subsample of the training data.
+    metric_train_loader_on_device, nb_metric_train = _prepare_metric_train_loader(X_train_on_device,
+                                                                                  Y_train_on_device,
+                                                                                  train_loader_on_device,
+                                                                                  params_training)
+
+    first_epoch = 0
+    if checkpointer is not None:
+        first_epoch = checkpointer.resume_epoch(net, params_training.optim_wrapper, early_stoppers, history)
+
+    epoch = max(first_epoch - 1, 0)
+    if not silent and params_training.loss_from_closure:
+        print("Training loss taken from the closure, {} forward passes saved per epoch.".format(
+            len(train_loader_on_device)))
+    closure_loss = None  #: last value computed by the closure, overwritten at each evaluation.
+    for epoch in tqdm(range(first_epoch, params_training.epochs), disable=silent):  # disable unable the print.
         ###################
         # train the model #
         ###################
-        train_loss = 0  #: aggregate variable
+        train_loss = _init_loss_accumulator(net.device)  #: aggregate variable, stays on device.
         for i, (batch_X, batch_y) in enumerate(train_loader_on_device, 0):
             # closure needed for some algorithm.
             def closure():
                 # The closure should clear the gradients, compute the loss, and return it.
                 # https://pytorch.org/docs/stable/optim.html
+                nonlocal closure_loss
 
                 # set gradients to zero
                 params_training.optim_wrapper.zero_grad()  # https://stackoverflow.com/questions/48001598/why-do-we-need-to-call-zero-grad-in-pytorch
@@ -69,38 +88,53 @@ def nn_fit(net, X_train_on_device, Y_train_on_device,
                 # Do forward and backward pass
                 loss = criterion(net(batch_X), batch_y)  #: compute the loss : difference of result and expectation
                 loss.backward()  # : compute the gradients
+                closure_loss = loss.detach()  # : LBFGS evaluates the closure many times, we keep the last one.
                 return loss
 
             # Optimisation step
             params_training.optim_wrapper(closure=closure)  # : update the weights
 
-            # you need to call again criterion, as we cannot store the criterion result:
-            train_loss += criterion(net(batch_X), batch_y).item()
+            if params_training.loss_from_closure:
+                # loss before the step, no need for a second forward pass.
+                train_loss += closure_loss
+            else:
+                # you need to call again criterion, as we cannot store the criterion result:
+                with torch.no_grad():
+                    train_loss += criterion(net(batch_X), batch_y)
             #: weight the loss accordingly. That is the reason why using average is flawed.
+            # no .item() here: it would synchronise the device at every batch.
 
         # adjust the learning rate if a scheduler is used, must be called after optimiser.step was called
         params_training.optim_wrapper.update_learning_rate()
 
         # Normalize and save the loss over the current epoch:
-        history['training']['loss'][epoch] = train_loss / total_number_data[0]
-        _update_history(net, params_training.metrics, criterion, epoch, is_validat_included, total_number_data,
-                        train_loader_on_device, validat_loader_on_device, history)
-
-        ######################
-        #   Early Stopping   #
-        ######################
-        # check if any improvement and update early.has_improved_last_epoch.
-        if _do_early_stop(net, early_stoppers, history, epoch, silent):
-            # does not break first epoch_iter because
-            # _early_stopped = False,
-            # has_improved_last_epoch = True
-            break # stop epoch
-
-        # Check if NN has not improved with respect to the early stoppers.
-        # If has not, we do not improve the best_weights of the NN
-        if all(early_stopper.has_improved_last_epoch for early_stopper in early_stoppers):
-            net.update_best_weights(epoch)
-        ##################### early stop end
+        history['training']['loss'][epoch] = train_loss.item() / total_number_data[0]  # : one sync per epoch.
+
+        # the other epochs keep nan in the history for the metrics and validation loss.
+        if _is_evaluated_epoch(epoch, params_training):
+            _update_history(net, params_training.metrics, criterion, epoch, is_validat_included,
+                            (nb_metric_train, total_number_data[1]),
+                            metric_train_loader_on_device, validat_loader_on_device, history)
+
+            ######################
+            #   Early Stopping   #
+            ######################
+            # Early stoppers only consult the evaluated epochs.
+            # check if any improvement and update early.has_improved_last_epoch.
+            if _do_early_stop(net, early_stoppers, history, epoch, silent):
+                # does not break first epoch_iter because
+                # _early_stopped = False,
+                # has_improved_last_epoch = True
+                break # stop epoch
+
+            # Check if NN has not improved with respect to the early stoppers.
+            # If has not, we do not improve the best_weights of the NN
+            if all(early_stopper.has_improved_last_epoch for early_stopper in early_stoppers):
+                net.update_best_weights(epoch)
+            ##################### early stop end
+
+        if checkpointer is not None:
+            checkpointer.save_epoch(epoch, net, params_training.optim_wrapper, early_stoppers, history)
 
         if PLOT_WHILE_TRAIN:
             if epoch % FREQ_NEW_IMAGE == 0:
@@ -129,15 +163,18 @@ def _prepare_data_for_fit(X_train_on_device, X_val_on_device, Y_train_on_device,
         # create data validat_loader : load validation data in batches
         validat_loader_on_device = FastTensorDataLoader(X_val_on_device, Y_val_on_device,
                                                         batch_size=params_training.batch_size,
-                                                        shuffle=False)  # SHUFFLE IS COSTLY!
+                                                        shuffle=False,  # SHUFFLE IS COSTLY!
+                                                        **params_training.streaming_loader_parameters())
     else:
         total_number_data = Y_train_on_device.shape[0], 0  # : constants for normalisation
         function_iterable.raise_if_not_all_None(list_params_validat)
         validat_loader_on_device = None  # in order to avoid referenced before assigment
     # create data train_loader_on_device : load training data in batches
     train_loader_on_device = FastTensorDataLoader(X_train_on_device, Y_train_on_device,
-                                                  batch_size=params_training.batch_size, shuffle=True)
-    # : SHUFFLE IS COSTLY! it is the only shuffle really useful
+                                                  batch_size=params_training.batch_size, shuffle=True,
+                                                  **params_training.streaming_loader_parameters(),
+                                                  **params_training.train_loader_parameters)
+    # : SHUFFLE IS COSTLY! it is the only shuffle really useful. index_shuffle avoids the copy.
 
     # pick loss function and optimizer
     criterion = params_training.criterion
@@ -145,15 +182,40 @@ def _prepare_data_for_fit(X_train_on_device, X_val_on_device, Y_train_on_device,
     return criterion, is_validat_included, total_number_data, train_loader_on_device, validat_loader_on_device
 
 
+def _is_evaluated_epoch(epoch, params_training):
+    # the last epoch is always evaluated, such that the returned epoch has all its values in the history.
+    return epoch % params_training.metric_eval_period == 0 or epoch == params_training.epochs - 1
+
+
+def _prepare_metric_train_loader(X_train_on_device, Y_train_on_device, train_loader_on_device, params_training):
+    nb_train = Y_train_on_device.shape[0]
+    subsample_size = params_training.metric_subsample_size
+    if subsample_size is None or subsample_size >= nb_train:
+        return train_loader_on_device, nb_train
+
+    # the subsample is drawn once, such that the metrics are comparable from one epoch to the other.
+    indices = torch.randperm(nb_train, device=X_train_on_device.device)[:subsample_size]
+    metric_train_loader_on_device = FastTensorDataLoader(X_train_on_device[indices], Y_train_on_device[indices],
+                                                         batch_size=params_training.batch_size, shuffle=False,
+                                                         **params_training.streaming_loader_parameters())
+    return metric_train_loader_on_device, subsample_size
+
+
 def _update_history(net, metrics, criterion, epoch, is_valid_included, total_number_data, train_loader_on_device,
                     validat_loader_on_device, history):
     # update the history by adding the computed metrics.
-    # one cannot compute the prediction only once. Because of encapsulation,
+    # one cannot compute the prediction only once for every metric. Because of encapsulation,
     # it is not obvious whether the data needs to be on device or cpu.
+    # Metrics with on_prediction == True share one prediction per batch (fused pass), the others use the net.
+    fused_metrics = [metric for metric in metrics if metric.on_prediction]
+    other_metrics = [metric for metric in metrics if not metric.on_prediction]
     ######################
     # Training Metrics   #
     ######################
-    for metric in metrics:
+    if fused_metrics:  # the training loss is already computed during the optimisation.
+        _update_history_fused_pass(net, None, fused_metrics, epoch, total_number_data[0], history,
+                                   train_loader_on_device, 'training')
+    for metric in other_metrics:
         _update_history_for_metric(metric, net, epoch, total_number_data, history, train_loader_on_device, 'training')
 
     ######################
@@ -161,12 +223,14 @@ def _update_history(net, metrics, criterion, epoch, is_valid_included, total_num
     ######################
     # the advantage of computing it in this way is that we can load data while
     if is_valid_included:
-        _update_validation_loss(net, criterion, epoch, total_number_data, history, validat_loader_on_device)
+        # validation loss and fused metrics, one walk over the validation data.
+        _update_history_fused_pass(net, criterion, fused_metrics, epoch, total_number_data[1], history,
+                                   validat_loader_on_device, 'validation')
 
         #######################
         # Validation Metrics  #
         #######################
-        for metric in metrics:
+        for metric in other_metrics:
             _update_history_for_metric(metric, net, epoch, total_number_data, history, validat_loader_on_device,
                                        'validation')
 
@@ -182,11 +246,28 @@ def _update_history_for_metric(metric, net, epoch, total_number_data, history, d
 
 
 @decorator_train_disable_no_grad  # make sure we don't back propagate any loss over this data
-def _update_validation_loss(net, criterion, epoch, total_number_data, history, validat_loader_on_device):
-    history['validation']['loss'][epoch] = 0  # :aggregate variable
-    for batch_X, batch_y in validat_loader_on_device:
-        history['validation']['loss'][epoch] += criterion(net(batch_X), batch_y).item()
-    history['validation']['loss'][epoch] /= total_number_data[1]
+def _update_history_fused_pass(net, criterion, metrics, epoch, nb_data, history, data_loader, type):
+    # one forward pass per batch, shared by the loss (if criterion is not None) and the metrics on prediction.
+    loss = _init_loss_accumulator(net.device)  # :aggregate variables, stay on device when possible.
+    metric_values = [0] * len(metrics)
+    for batch_X, batch_y in data_loader:
+        out = net(batch_X)
+        if criterion is not None:
+            loss += criterion(out, batch_y)
+        if metrics:
+            prediction = net.prediction(out)
+            for i, metric in enumerate(metrics):
+                metric_values[i] += metric.from_prediction(prediction, batch_y)
+
+    if criterion is not None:
+        history[type]['loss'][epoch] = loss.item() / nb_data
+    for metric, value in zip(metrics, metric_values):
+        history[type][metric.name][epoch] = float(value) / nb_data
+
+
+def _init_loss_accumulator(device):
+    # accumulating in double precision gives the same numbers as summing the python floats from .item().
+    return torch.zeros((), dtype=torch.float64, device=device)
 
 
 def _return_the_stop(net, current_epoch, early_stoppers):
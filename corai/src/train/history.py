@@ -5,6 +5,9 @@ from corai.src.classes.estimator.history.estim_history import Estim_history
 
 def history_create(nb_epochs_total, metrics, is_validation_included):
     # initialise the training history for loss and any other metric included
+    # nan means no value: either the epoch was not reached (early stopping),
+    # or the metrics were not evaluated at this epoch (see NNTrainParameters.metric_eval_period).
+    # The training loss is computed at every epoch reached.
     history = {'training': {}}
     history['training']['loss'] = np.full(nb_epochs_total, np.nan)
     for metric in metrics:
@@ -33,14 +36,22 @@ def translate_history_to_dataframe(history, fold_number, validation):
 
     Returns:
         The translated history
+
+    Note:
+        The epochs not reached (trailing nan of the training loss) are sliced out.
+        The nan of the epochs reached but not evaluated are kept, such that all the columns have the same length.
     """
     # TODO 26/07/2021 nie_k:  a good idea would be to slice the data wrt criterea, like only 1/25 of the epochs saved.
     translated_history = {}
 
+    # the training loss is computed at every epoch reached, the epochs after the last value were not reached.
+    reached_epochs = np.flatnonzero(~np.isnan(history['training']['loss']))
+    nb_epochs = int(reached_epochs[-1]) + 1 if len(reached_epochs) else 0
+
     # collect training information
     for key, value in history['training'].items():
         new_key = Estim_history.generate_column_name(key)
-        new_value = value[~np.isnan(value)]  # we slice out the value that are nan.
+        new_value = value[:nb_epochs]  # we slice out the epochs that were not reached.
         translated_history[new_key] = new_value.tolist()
 
     assert ('validation' in history) == validation, "Validation required / not required and " \
@@ -49,11 +60,10 @@ def translate_history_to_dataframe(history, fold_number, validation):
     if 'validation' in history:
         for key, value in history['validation'].items():
             new_key = Estim_history.generate_column_name(key, validation=True)
-            new_value = value[~np.isnan(value)]
+            new_value = value[:nb_epochs]
             translated_history[new_key] = new_value.tolist()
 
     # add the epoch number to the translated history
-    nb_epochs = len(translated_history['loss_training'])
     translated_history['epoch'] = [*range(nb_epochs)]
 
     # add the fold number to the history
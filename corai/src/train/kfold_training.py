@@ -8,19 +8,22 @@ from corai.src.classes.estimator.history.estim_history import Estim_history
 from corai.src.classes.training_stopper.early_stopper_vanilla import Early_stopper_vanilla
 from corai.src.train.history import translate_history_to_dataframe
 from corai.src.train.train import nn_train
+from corai.src.util_train import set_seeds, _fork_pool, _get_worker_task
 
 
 def nn_kfold_train(data_train_X, data_train_Y, Model_NN, param_train,
                    early_stoppers=(Early_stopper_vanilla(),),
                    nb_split=5, shuffle_kfold=True, percent_val_for_1_fold=20,
                    hyper_param={}.copy(),
-                   only_best_fold_history=False, silent=False):
+                   only_best_fold_history=False, nb_workers=1, nb_threads_per_worker=None, checkpointer=None,
+                   silent=False):
     """
         Prepares the indices for kfold and calls multiplefold train.
 
     Args:
-        data_train_X (tensor): Input data.
-        data_train_Y (tensor): Target value.
+        data_train_X (tensor, MemmapTensor or WindowedTensor): Input data. A MemmapTensor is read lazily from the disk,
+            it requires param_train.stream_to_device. The windows of a WindowedTensor are computed batch per batch.
+        data_train_Y (tensor, MemmapTensor or WindowedTensor): Target value.
         Model_NN (Class Savable_net): Parametrised architecture.
             Requirements: call constructor over it to create a net.
         param_train (NNTrainParameters): The parameters used for training.
@@ -32,6 +35,13 @@ def nn_kfold_train(data_train_X, data_train_Y, Model_NN, param_train,
             Requirements: [0,100[
         hyper_param (dict): All the training parameters to be saved in the estimator.
         only_best_fold_history (bool): Flag to specify if only the history of the best fold should be saved.
+        nb_workers (int): Number of folds trained concurrently, each in its own process. 1 means sequential training.
+            Requirements: training on cpu, the processes are forked (not available on Windows, see _fork_pool).
+        nb_threads_per_worker (int): Number of threads used by torch in each worker.
+            If None, the cores are shared equally between the workers.
+        checkpointer (Checkpointer): If not None, the training is checkpointed in the file of the checkpointer,
+            and resumed from it if it exists. The indices of the folds are then the ones of the checkpoint.
+            Requirements: nb_workers == 1.
         silent (bool): Verbose.
 
     Returns:
@@ -40,9 +50,20 @@ def nn_kfold_train(data_train_X, data_train_Y, Model_NN, param_train,
     Post-condition :
         early_stoppers not changed.
     """
-    # place where logs of trainings with respect to the metrics are stored.
-    indices, compute_validation = _nn_kfold_indices_creation_random(data_train_X, data_train_Y,
-                                                                    percent_val_for_1_fold, nb_split, shuffle_kfold)
+    assert checkpointer is None or nb_workers == 1, "Checkpoints are only available for the sequential training."
+    if checkpointer is not None and checkpointer.has_checkpoint():
+        # the indices are the ones of the interrupted training.
+        indices, compute_validation = checkpointer.indices, checkpointer.compute_validation
+        if not silent:
+            print(f"Resuming the training from {checkpointer.path}: "
+                  f"{len(checkpointer.completed_folds)} folds completed.")
+    else:
+        indices, compute_validation = _nn_kfold_indices_creation_random(data_train_X, data_train_Y,
+                                                                        percent_val_for_1_fold, nb_split,
+                                                                        shuffle_kfold)
+        if checkpointer is not None:
+            indices = list(indices)  # : the generator of sklearn is consumed once.
+            checkpointer.start(indices, compute_validation)
     # Check if the correct type of early stoppers are passed
     if not compute_validation:
         for stop in early_stoppers:
@@ -52,7 +73,8 @@ def nn_kfold_train(data_train_X, data_train_Y, Model_NN, param_train,
     estimator_history = initialise_estimator(compute_validation, param_train, hyper_param)
 
     return _nn_multiplefold_train(data_train_X, data_train_Y, early_stoppers, Model_NN, nb_split, param_train, indices,
-                                  silent, estimator_history, only_best_fold_history)
+                                  silent, estimator_history, only_best_fold_history,
+                                  nb_workers, nb_threads_per_worker, checkpointer)
 
 
 def initialise_estimator(compute_validation, param_train, train_param_dict={}):
@@ -81,7 +103,8 @@ def initialise_estimator(compute_validation, param_train, train_param_dict={}):
 def _nn_multiplefold_train(data_train_X, data_train_Y,
                            early_stoppers, Model_NN, nb_split,
                            param_train, indices, silent,
-                           estimator_history, only_best_fold_history=False):
+                           estimator_history, only_best_fold_history=False,
+                           nb_workers=1, nb_threads_per_worker=None, checkpointer=None):
     """
         Perform training over all the folds.
     Args:
@@ -96,10 +119,20 @@ def _nn_multiplefold_train(data_train_X, data_train_Y,
         silent (bool): Verbose. Prints the nb of the best fold from 1 to K.
         estimator_history (Estim_history): An estimator object which stores the history of a training.
         only_best_fold_history (bool): Flag to specify if only the history of the best fold should be saved.
+        nb_workers (int): Number of folds trained concurrently. See nn_kfold_train.
+        nb_threads_per_worker (int): Number of threads used by torch in each worker. See nn_kfold_train.
+        checkpointer (Checkpointer): The folds already completed in the checkpoint are not retrained.
 
     Returns:
         The best_net, and the estimator_history
     """
+    if nb_workers > 1:
+        best_net = _nn_multiplefold_train_parallel(data_train_X, data_train_Y, early_stoppers, Model_NN, nb_split,
+                                                   param_train, indices, silent, estimator_history,
+                                                   nb_workers, nb_threads_per_worker)
+        if only_best_fold_history:
+            estimator_history.slice_best_fold()
+        return best_net, estimator_history
 
     # for storing the network:
     value_metric_for_best_NN = - np.Inf  # : we set -\infty which can only be improved.
@@ -107,8 +140,19 @@ def _nn_multiplefold_train(data_train_X, data_train_Y,
     # : and minus loss, and a loss is always closer to zero than - infinity.
     best_net = None
 
+    # the folds completed in the checkpoint are recorded again without training.
+    completed_folds = checkpointer.completed_folds if checkpointer is not None else []
+    for i, (kfold_history, kfold_best_epoch, end_train_fold_time) in enumerate(completed_folds):
+        (best_net, value_metric_for_best_NN) = _record_fold(None, kfold_history, kfold_best_epoch,
+                                                            end_train_fold_time, i, estimator_history,
+                                                            value_metric_for_best_NN, best_net, silent=True)
+    if completed_folds:
+        best_net = checkpointer.load_best_net(Model_NN, param_train.device)
+
     # : random_state is the seed of StratifiedKFold.
     for i, (index_training, index_validation) in enumerate(indices):
+        if i < len(completed_folds):
+            continue
         if not silent:
             time.sleep(0.0001)  # for printing order
             print(f"{i + 1}-th Fold out of {nb_split} Folds.")
@@ -120,7 +164,7 @@ def _nn_multiplefold_train(data_train_X, data_train_Y,
                                                                               index_validation, Model_NN, param_train,
                                                                               estimator_history, early_stoppers,
                                                                               value_metric_for_best_NN,
-                                                                              best_net, i, silent)
+                                                                              best_net, i, silent, checkpointer)
 
     if not silent:
         print("Finished the K-Fold Training, the best NN is the number {}".format(estimator_history.best_fold + 1))
@@ -134,7 +178,7 @@ def _nn_multiplefold_train(data_train_X, data_train_Y,
 def train_kfold_a_fold_after_split(data_train_X, data_train_Y, index_training, index_validation, Model_NN, param_train,
                                    estimator_history, early_stoppers=(Early_stopper_vanilla(),),
                                    value_metric_for_best_NN=-np.Inf, best_net=None, i=0,
-                                   silent=False):
+                                   silent=False, checkpointer=None):
     """
         Train one fold.
     Note:
@@ -154,6 +198,7 @@ def train_kfold_a_fold_after_split(data_train_X, data_train_Y, index_training, i
         i (int): Number of fold.
             Requirements: 0 <= i < nb_of_split
         silent (bool): Verbose.
+        checkpointer (Checkpointer): If not None, the fold is checkpointed and resumed from the checkpoint.
 
     Returns:
         best_net, value_metric_for_best_net
@@ -165,6 +210,22 @@ def train_kfold_a_fold_after_split(data_train_X, data_train_Y, index_training, i
         best_net is modified for the new net.
         i is not modified.
     """
+    net, kfold_history, kfold_best_epoch, end_train_fold_time = _train_a_fold(data_train_X, data_train_Y,
+                                                                              index_training, index_validation,
+                                                                              Model_NN, param_train, early_stoppers,
+                                                                              silent, checkpointer)
+    (best_net, value_metric_for_best_NN) = _record_fold(net, kfold_history, kfold_best_epoch, end_train_fold_time, i,
+                                                        estimator_history, value_metric_for_best_NN, best_net,
+                                                        silent)
+    if checkpointer is not None:
+        checkpointer.complete_fold(kfold_history, kfold_best_epoch, end_train_fold_time, best_net,
+                                   is_best=estimator_history.best_fold == i)
+    return best_net, value_metric_for_best_NN
+
+
+def _train_a_fold(data_train_X, data_train_Y, index_training, index_validation, Model_NN, param_train,
+                  early_stoppers, silent, checkpointer=None):
+    """ Returns the trained net, its history, its best epoch and the time of training."""
     net = Model_NN().to(param_train.device)
 
     # reset the early stoppers for the following fold
@@ -176,8 +237,15 @@ def train_kfold_a_fold_after_split(data_train_X, data_train_Y, index_training, i
                                                params_training=param_train, indic_train_X=index_training,
                                                indic_train_Y=index_training, early_stoppers=early_stoppers,
                                                indic_val_X=index_validation, indic_val_Y=index_validation,
+                                               checkpointer=checkpointer,
                                                silent=silent)  # train network and save results
     end_train_fold_time = time.time() - start_train_fold_time
+    return net, kfold_history, kfold_best_epoch, end_train_fold_time
+
+
+def _record_fold(net, kfold_history, kfold_best_epoch, end_train_fold_time, i,
+                 estimator_history, value_metric_for_best_NN, best_net, silent):
+    """ Appends the history of the fold i to estimator_history and returns best_net, value_metric_for_best_NN."""
     history = translate_history_to_dataframe(history=kfold_history, fold_number=i,
                                              validation=estimator_history.validation)
     estimator_history.append(history=history, fold_best_epoch=kfold_best_epoch, fold_time=end_train_fold_time)
@@ -216,6 +284,59 @@ def _new_best_model(best_net, i, net, value_metric_for_best_NN, estimator_histor
     return best_net, value_metric_for_best_NN
 
 
+# section ######################################################################
+#  #############################################################################
+# PARALLEL MULTIFOLD
+
+def _nn_multiplefold_train_parallel(data_train_X, data_train_Y, early_stoppers, Model_NN, nb_split, param_train,
+                                    indices, silent, estimator_history, nb_workers, nb_threads_per_worker):
+    """
+        Train the folds concurrently in forked processes, and merge the results in the order of the folds.
+        Each worker returns the history and the state_dict of its net, the best net is chosen as in the sequential case.
+        Each fold is seeded with a seed drawn from the current random state, such that the result is deterministic
+        when the seeds are set (but differs from the sequential training).
+
+    Returns:
+        The best_net.
+    """
+    assert torch.device(param_train.device).type == 'cpu', "Parallel folds are only available for training on cpu."
+    seeds_folds = torch.randint(0, 2 ** 31 - 1, (nb_split,)).tolist()
+    tasks_folds = [(i, index_training, index_validation, seeds_folds[i])
+                   for i, (index_training, index_validation) in enumerate(indices)]
+
+    # data and parameters of the folds, inherited by the workers.
+    worker_task = (data_train_X, data_train_Y, Model_NN, param_train, early_stoppers)
+    value_metric_for_best_NN = - np.Inf
+    best_net = None
+    with _fork_pool(worker_task, min(nb_workers, len(tasks_folds)), nb_threads_per_worker) as pool:
+        # imap keeps the order of the folds.
+        for i, (kfold_history, kfold_best_epoch,
+                end_train_fold_time, state_dict) in enumerate(pool.imap(_train_a_fold_in_worker, tasks_folds)):
+            if not silent:
+                print(f"{i + 1}-th Fold out of {nb_split} Folds.")
+            net = Model_NN().to(param_train.device)
+            net.load_state_dict(state_dict)
+            (best_net, value_metric_for_best_NN) = _record_fold(net, kfold_history, kfold_best_epoch,
+                                                                end_train_fold_time, i, estimator_history,
+                                                                value_metric_for_best_NN, best_net, silent)
+
+    if not silent:
+        print("Finished the K-Fold Training, the best NN is the number {}".format(estimator_history.best_fold + 1))
+    return best_net
+
+
+def _train_a_fold_in_worker(task_fold):
+    i, index_training, index_validation, seed = task_fold
+    data_train_X, data_train_Y, Model_NN, param_train, early_stoppers = _get_worker_task()
+    set_seeds(seed)
+    # the early stoppers are copies of the parent ones, they are not modified.
+    net, kfold_history, kfold_best_epoch, end_train_fold_time = _train_a_fold(data_train_X, data_train_Y,
+                                                                              index_training, index_validation,
+                                                                              Model_NN, param_train, early_stoppers,
+                                                                              silent=True)
+    return kfold_history, kfold_best_epoch, end_train_fold_time, net.state_dict()
+
+
 # section ######################################################################
 #  #############################################################################
 # INDICES
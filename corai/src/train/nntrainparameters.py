@@ -6,7 +6,9 @@ from corai.src.classes.metric.metric import Metric
 
 class NNTrainParameters:
 
-    def __init__(self, batch_size, epochs, device, criterion, optim_wrapper, metrics=()):
+    def __init__(self, batch_size, epochs, device, criterion, optim_wrapper, metrics=(), loss_from_closure=False,
+                 metric_eval_period=1, metric_subsample_size=None, train_loader_parameters=None,
+                 stream_to_device=False, nb_prefetch=2):
         """
 
         Args:
@@ -18,6 +20,19 @@ class NNTrainParameters:
                 It can also contain a scheduler for updating the learning rate
             metrics:  iterable containing objects of type Metric.
             The history is computed by computing over each batch and at the end dividing by total length of data.
+            loss_from_closure: if true, the training loss of a batch is the value returned by the closure
+                (the loss before the optimisation step) instead of a second forward pass after the step.
+                For optimisers evaluating the closure multiple times (LBFGS), the last evaluation is used.
+            metric_eval_period: the metrics and the validation loss are computed every metric_eval_period epochs
+                (and at the last epoch). The other epochs are nan in the history.
+                Early stoppers are only consulted at evaluated epochs, so their patience counts evaluations.
+            metric_subsample_size: if not None, the training metrics are computed upon a fixed random subsample
+                of the training data of this size, drawn at the beginning of the training.
+            train_loader_parameters: dict of keyword arguments given to the FastTensorDataLoader of the training data.
+                For example {'index_shuffle': True} avoids copying the training data at every epoch.
+            stream_to_device: if true, the data stays on the host and the batches are streamed to the device,
+                for data that does not fit in the memory of the device.
+            nb_prefetch: when streaming, number of batches prepared in advance by a background thread.
         """
         self.batch_size = batch_size
         self.epochs = epochs
@@ -27,6 +42,12 @@ class NNTrainParameters:
 
         # iterable containing objects of type Metric
         self.metrics = metrics
+        self.loss_from_closure = loss_from_closure
+        self.metric_eval_period = metric_eval_period
+        self.metric_subsample_size = metric_subsample_size
+        self.train_loader_parameters = train_loader_parameters
+        self.stream_to_device = stream_to_device
+        self.nb_prefetch = nb_prefetch
 
     # SETTERS GETTERS
     @property
@@ -80,3 +101,78 @@ class NNTrainParameters:
             else:
                 raise TypeError(f"Argument is not a metric.")
         self._metrics = new_metrics
+
+    @property
+    def loss_from_closure(self):
+        return self._loss_from_closure
+
+    @loss_from_closure.setter
+    def loss_from_closure(self, new_loss_from_closure):
+        if isinstance(new_loss_from_closure, bool):
+            self._loss_from_closure = new_loss_from_closure
+        else:
+            raise TypeError(f"Argument is not a bool.")
+
+    @property
+    def metric_eval_period(self):
+        return self._metric_eval_period
+
+    @metric_eval_period.setter
+    def metric_eval_period(self, new_metric_eval_period):
+        if isinstance(new_metric_eval_period, int) and new_metric_eval_period > 0:
+            self._metric_eval_period = new_metric_eval_period
+        else:
+            raise TypeError(f"Argument is not a positive int.")
+
+    @property
+    def metric_subsample_size(self):
+        return self._metric_subsample_size
+
+    @metric_subsample_size.setter
+    def metric_subsample_size(self, new_metric_subsample_size):
+        if new_metric_subsample_size is None or (isinstance(new_metric_subsample_size, int)
+                                                 and new_metric_subsample_size > 0):
+            self._metric_subsample_size = new_metric_subsample_size
+        else:
+            raise TypeError(f"Argument is not None or a positive int.")
+
+    @property
+    def train_loader_parameters(self):
+        return self._train_loader_parameters
+
+    @train_loader_parameters.setter
+    def train_loader_parameters(self, new_train_loader_parameters):
+        if new_train_loader_parameters is None:
+            self._train_loader_parameters = {}
+        elif isinstance(new_train_loader_parameters, dict):
+            self._train_loader_parameters = new_train_loader_parameters
+        else:
+            raise TypeError(f"Argument is not a dict.")
+
+    @property
+    def stream_to_device(self):
+        return self._stream_to_device
+
+    @stream_to_device.setter
+    def stream_to_device(self, new_stream_to_device):
+        if isinstance(new_stream_to_device, bool):
+            self._stream_to_device = new_stream_to_device
+        else:
+            raise TypeError(f"Argument is not a bool.")
+
+    @property
+    def nb_prefetch(self):
+        return self._nb_prefetch
+
+    @nb_prefetch.setter
+    def nb_prefetch(self, new_nb_prefetch):
+        if isinstance(new_nb_prefetch, int) and new_nb_prefetch >= 0:
+            self._nb_prefetch = new_nb_prefetch
+        else:
+            raise TypeError(f"Argument is not an unsigned int.")
+
+    def streaming_loader_parameters(self):
+        """ Keyword arguments for the FastTensorDataLoader when the data is streamed to the device."""
+        if not self.stream_to_device:
+            return {}
+        return {'device': self.device, 'nb_prefetch': self.nb_prefetch}
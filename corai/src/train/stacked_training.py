@@ -0,0 +1,253 @@
+import copy
+import time
+
+import numpy as np
+import torch
+from torch.nn.utils.rnn import pad_sequence
+from tqdm import tqdm
+
+from corai.src.classes.fasttensordataloader import FastTensorDataLoader
+from corai.src.classes.training_stopper.early_stopper_vanilla import Early_stopper_vanilla
+from corai.src.train.fit import _do_early_stop, _init_loss_accumulator, _is_evaluated_epoch, _return_the_stop, \
+    _update_history
+from corai.src.train.history import history_create
+from corai.src.train.kfold_training import _nn_kfold_indices_creation_random, _record_fold, initialise_estimator
+
+
+def nn_kfold_train_stacked(data_train_X, data_train_Y, Model_NN, param_train,
+                           early_stoppers=(Early_stopper_vanilla(),),
+                           nb_split=5, shuffle_kfold=True, percent_val_for_1_fold=20,
+                           hyper_param={}.copy(),
+                           only_best_fold_history=False, silent=False):
+    """
+        Same as nn_kfold_train, but the folds are trained together as a stacked ensemble,
+        see train_stacked_after_split. For small models, the cost of the k folds is close to the cost of one.
+        Requires torch >= 2.0 (torch.func).
+
+    Args:
+        data_train_X (tensor): Input data.
+        data_train_Y (tensor): Target value.
+        Model_NN (Class Savable_net): Parametrised architecture.
+            Requirements: call constructor over it to create a net. No buffer updated by the forward (batch norm).
+        param_train (NNTrainParameters): The parameters used for training.
+            Requirements: an optimiser acting elementwise (SGD, Adam...), not LBFGS.
+        early_stoppers (iterable of Early_stopper): Used for deciding if the training should stop early.
+            Each fold uses its own copy.
+        nb_split (int): The number of folds to split the data into.
+        shuffle_kfold (bool): Flag to specify if the data should be shuffled.
+        percent_val_for_1_fold (double): The percent of data that should be used for validation for the 1 fold case.
+            Requirements: [0,100[
+        hyper_param (dict): All the training parameters to be saved in the estimator.
+        only_best_fold_history (bool): Flag to specify if only the history of the best fold should be saved.
+        silent (bool): Verbose.
+
+    Returns:
+        best_net, estimator_history
+
+    Post-condition :
+        early_stoppers not changed.
+    """
+    indices, compute_validation = _nn_kfold_indices_creation_random(data_train_X, data_train_Y,
+                                                                    percent_val_for_1_fold, nb_split, shuffle_kfold)
+    if not compute_validation:
+        for stop in early_stoppers:
+            assert not stop.is_validation(), "Input validation stopper while no validation set given."
+
+    estimator_history = initialise_estimator(compute_validation, param_train, hyper_param)
+    best_net, _ = train_stacked_after_split(data_train_X, data_train_Y, list(indices), Model_NN, param_train,
+                                            estimator_history, early_stoppers, silent)
+
+    if not silent:
+        print("Finished the K-Fold Training, the best NN is the number {}".format(estimator_history.best_fold + 1))
+
+    if only_best_fold_history:
+        estimator_history.slice_best_fold()
+    return best_net, estimator_history
+
+
+def train_stacked_after_split(data_train_X, data_train_Y, indices, Model_NN, param_train, estimator_history,
+                              early_stoppers=(Early_stopper_vanilla(),), silent=False):
+    """
+        Train K identical nets at once, one per couple of indices. The parameters of the nets are stacked and
+        the K forward and backward passes are done as one batched call (torch.func.vmap over functional_call).
+        The optimiser acts upon the stacked parameters: for elementwise optimisers, each member has its own state.
+        Each member keeps its data indices, its early stoppers, its history and its best weights,
+        and is recorded as a fold in estimator_history. A stopped member is not recorded anymore.
+
+    Note:
+        Can be used for seed sweeps by giving K times the same indices.
+        The metrics are computed member by member, upon a copy of the data of the member.
+
+    Args:
+        data_train_X (tensor): Input data.
+        data_train_Y (tensor): Target data.
+        indices (list of tuples): Each tuple contains the indices for training and for validation of one member.
+        Model_NN (Class Savable_net): Parametrised architecture.
+        param_train (NNTrainParameters): The parameters used for training.
+        estimator_history (Estim_history): The estimator in which the results will be saved.
+        early_stoppers (iterable of Early_stopper): Used for deciding if the training should stop early.
+            Each member uses its own copy.
+        silent (bool): Verbose.
+
+    Returns:
+        best_net, value_metric_for_best_net
+
+    Post-conditions:
+        estimator_history is updated to contain the training of each member and the parameter best_fold updated.
+        early stoppers are not modified.
+    """
+    if not hasattr(torch, 'func'):
+        raise ImportError(f"Stacked training requires torch >= 2.0 (torch.func), the version installed is "
+                          f"{torch.__version__}. Use nn_kfold_train otherwise.")
+    assert not param_train.stream_to_device, "Stacked training keeps the data on the device."
+    device = param_train.device
+    nets = [Model_NN().to(device) for _ in indices]
+    early_stoppers_members = [copy.deepcopy(early_stoppers) for _ in indices]
+    for early_stoppers_member in early_stoppers_members:
+        for early_stopper in early_stoppers_member:
+            early_stopper.reset()
+
+    data_X, data_Y = data_train_X.to(device), data_train_Y.to(device)
+    indices = [(torch.as_tensor(index_training, device=device),
+                None if index_validation is None else torch.as_tensor(index_validation, device=device))
+               for index_training, index_validation in indices]
+    histories = [history_create(param_train.epochs, param_train.metrics, estimator_history.validation)
+                 for _ in indices]
+
+    start_train_time = time.time()
+    best_epochs = _stacked_fit(nets, data_X, data_Y, indices, param_train, histories, early_stoppers_members, silent)
+    time_per_member = (time.time() - start_train_time) / len(nets)  # : the time is shared by the members.
+
+    value_metric_for_best_NN = - np.Inf
+    best_net = None
+    for i, net in enumerate(nets):
+        (best_net, value_metric_for_best_NN) = _record_fold(net, histories[i], best_epochs[i], time_per_member, i,
+                                                            estimator_history, value_metric_for_best_NN, best_net,
+                                                            silent)
+    return best_net, value_metric_for_best_NN
+
+
+def _stacked_fit(nets, data_X, data_Y, indices, params_training, histories, early_stoppers_members, silent):
+    """ nn_fit for stacked members. Returns the epoch of the best net of each member and updates the histories."""
+    criterion = params_training.criterion
+    is_validat_included = indices[0][1] is not None
+    params, buffers = torch.func.stack_module_state(nets)  # : dict of tensors with a first dimension of size K.
+    base_net = copy.deepcopy(nets[0]).to('meta')  # : only the structure is used.
+
+    def forward_member(params_member, buffers_member, batch_X):
+        return torch.func.functional_call(base_net, (params_member, buffers_member), (batch_X,))
+
+    stacked_forward = torch.func.vmap(forward_member, randomness='different')  # : dropout differs per member.
+    params_training.optim_wrapper.initialise_optimiser(params.values())
+
+    nb_train = torch.tensor([len(index_training) for index_training, _ in indices], device=data_X.device)
+    nb_batches = -(-int(nb_train.max()) // params_training.batch_size)  # ceil division
+    eval_loaders = [_prepare_member_eval_loaders(data_X, data_Y, index_training, index_validation, params_training)
+                    for index_training, index_validation in indices]
+
+    is_running = [True] * len(nets)
+    best_epochs = [params_training.epochs - 1] * len(nets)
+    closure_losses = None
+    for epoch in tqdm(range(params_training.epochs), disable=silent):
+        ###################
+        # train the model #
+        ###################
+        train_loss = _init_loss_accumulator(data_X.device).repeat(len(nets))  #: one aggregate per member.
+        # the stopped members are out of the loss, their gradients are zero.
+        is_running_mask = torch.tensor(is_running, dtype=train_loss.dtype, device=data_X.device)
+        permutations = [index_training[torch.randperm(len(index_training), device=data_X.device)]
+                        for index_training, _ in indices]
+        for i in range(nb_batches):
+            indices_batch = [permutation[i * params_training.batch_size:(i + 1) * params_training.batch_size]
+                             for permutation in permutations]
+            lengths = [len(indices_member) for indices_member in indices_batch]
+            # the folds have different sizes: the batches are padded, the padded rows are not part of the losses.
+            indices_batch = pad_sequence(indices_batch, batch_first=True, padding_value=0)
+            batch_X, batch_y = data_X[indices_batch], data_Y[indices_batch]  # : one gather for all the members.
+
+            def closure():
+                nonlocal closure_losses
+                params_training.optim_wrapper.zero_grad()
+                losses = _losses_members(criterion, stacked_forward(params, buffers, batch_X), batch_y, lengths)
+                # the members do not share parameters, their gradients are independent.
+                loss = (losses * is_running_mask).sum()
+                loss.backward()
+                closure_losses = losses.detach()
+                return loss
+
+            params_training.optim_wrapper(closure=closure)
+
+            if params_training.loss_from_closure:
+                train_loss += closure_losses
+            else:
+                with torch.no_grad():
+                    train_loss += _losses_members(criterion, stacked_forward(params, buffers, batch_X), batch_y,
+                                                  lengths)
+
+        params_training.optim_wrapper.update_learning_rate()
+
+        train_loss = (train_loss / nb_train).tolist()  # : one sync per epoch.
+        for k in range(len(nets)):
+            if is_running[k]:
+                histories[k]['training']['loss'][epoch] = train_loss[k]
+
+        if _is_evaluated_epoch(epoch, params_training):
+            for k, (net, history, early_stoppers) in enumerate(zip(nets, histories, early_stoppers_members)):
+                if not is_running[k]:
+                    continue
+                _load_member(net, params, buffers, k)
+                (metric_train_loader, nb_metric_train), (validat_loader, nb_validat) = eval_loaders[k]
+                _update_history(net, params_training.metrics, criterion, epoch, is_validat_included,
+                                (nb_metric_train, nb_validat), metric_train_loader, validat_loader, history)
+
+                if _do_early_stop(net, early_stoppers, history, epoch, silent):
+                    is_running[k] = False  # : from the next epoch, the member is not in the loss anymore.
+                    best_epochs[k] = epoch
+                    continue
+                if all(early_stopper.has_improved_last_epoch for early_stopper in early_stoppers):
+                    net.update_best_weights(epoch)
+
+            if not any(is_running):
+                break
+
+    for k, (net, early_stoppers) in enumerate(zip(nets, early_stoppers_members)):
+        if is_running[k]:
+            _load_member(net, params, buffers, k)
+            best_epochs[k] = epoch
+        best_epochs[k] = _return_the_stop(net, best_epochs[k], early_stoppers)
+    return best_epochs
+
+
+def _losses_members(criterion, out, batch_y, lengths):
+    if all(length == out.shape[1] for length in lengths):  # : no padding, the criterion is batched as well.
+        return torch.func.vmap(criterion)(out, batch_y)
+    # the criterion is applied member by member, upon the rows that are not padding.
+    return torch.stack([criterion(out[k, :length], batch_y[k, :length]) if length else out.new_zeros(())
+                        for k, length in enumerate(lengths)])
+
+
+def _load_member(net, params, buffers, k):
+    # copies the weights of the k-th member in its net, used for the metrics and the best weights.
+    with torch.no_grad():
+        for name, param in net.named_parameters():
+            param.copy_(params[name][k])
+        for name, buffer in net.named_buffers():
+            buffer.copy_(buffers[name][k])
+
+
+def _prepare_member_eval_loaders(data_X, data_Y, index_training, index_validation, params_training):
+    # returns the loaders (and the number of data) for the training metrics and the validation of a member.
+    subsample_size = params_training.metric_subsample_size
+    if subsample_size is not None and subsample_size < len(index_training):
+        # the subsample is drawn once, such that the metrics are comparable from one epoch to the other.
+        index_training = index_training[torch.randperm(len(index_training),
+                                                       device=index_training.device)[:subsample_size]]
+    metric_train_loader = None
+    if params_training.metrics:
+        metric_train_loader = FastTensorDataLoader(data_X[index_training], data_Y[index_training],
+                                                   batch_size=params_training.batch_size, shuffle=False)
+    if index_validation is None:
+        return (metric_train_loader, len(index_training)), (None, 0)
+    validat_loader = FastTensorDataLoader(data_X[index_validation], data_Y[index_validation],
+                                          batch_size=params_training.batch_size, shuffle=False)
+    return (metric_train_loader, len(index_training)), (validat_loader, len(index_validation))
@@ -0,0 +1,169 @@
+import contextlib
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from corai.src.classes.checkpointer import Checkpointer
+from corai.src.classes.training_stopper.early_stopper_vanilla import Early_stopper_vanilla
+from corai.src.train.history import translate_history_to_dataframe
+from corai.src.train.kfold_training import initialise_estimator, _nn_kfold_indices_creation_random
+from corai.src.train.train import nn_train
+from corai.src.util_train import set_seeds
+
+RUNG_KEY = 'rung'  # : key of the hyper-parameters where the last rung of training of the configuration is written.
+BUDGET_KEY = 'epochs_budget'  # : key of the hyper-parameters where the number of epochs of that rung is written.
+
+
+def nn_successive_halving(data_train_X, data_train_Y, hyper_params, config_architecture,
+                          min_epochs, max_epochs, eta=3,
+                          early_stoppers=(Early_stopper_vanilla(),),
+                          percent_val=20, shuffle=True, column='loss_validation', ascending=True,
+                          path_checkpoints=None, silent=False):
+    """
+    Semantics:
+        Successive halving over the configurations of hyper_params, instead of training all of them for max_epochs.
+        At the rung r, the remaining configurations are trained until min_epochs * eta ** r epochs (at most
+        max_epochs), and the best 1 / eta of them (at least one) are promoted to the next rung, where their training
+        continues from their checkpoint: weights, optimiser and scheduler, early stoppers, history and random states.
+        When only one configuration remains, it is trained until max_epochs.
+        The number of epochs trained is about the number of rungs times len(hyper_params) * min_epochs,
+        instead of len(hyper_params) * max_epochs.
+
+        A configuration stopped by an early stopper is not trained further, but keeps competing with its values.
+        All the configurations are trained and validated over the same split of the data.
+        As for Checkpointer, the training of a promoted configuration is identical to an uninterrupted one if
+        the training loader draws each epoch from the original order
+        (train_loader_parameters = {'index_shuffle': True}) and the metrics are evaluated at every epoch, over the
+        whole training data.
+
+    Args:
+        data_train_X (tensor): Input data.
+        data_train_Y (tensor): Target value.
+        hyper_params (sequence of dict): the configurations, for example a list or a Parameter_grid. They are read by
+            index, a Parameter_grid is not expanded. If a configuration has a key 'seed', the seeds are set with it
+            before its training starts.
+        config_architecture (callable): config_architecture(params) -> (param_train, Model_NN), where
+            param_train is a NNTrainParameters (its epochs are set by the scheduler)
+            and Model_NN a parametrised architecture. Called at every rung, it should not draw random numbers
+            that change the training.
+        min_epochs (int): number of epochs of the first rung.
+        max_epochs (int): number of epochs of the configurations reaching the last rung.
+        eta (int): 1 / eta of the configurations is promoted, and the budget is multiplied by eta at each rung.
+            Requirements: eta >= 2.
+        early_stoppers (iterable of Early_stopper): Used for deciding if the training should stop early.
+        percent_val (double): The percent of data used for validation. Requirements: [0,100[
+        shuffle (bool): Flag to specify if the data should be shuffled before the split.
+        column (str): column of the estimators used for ranking the configurations, at their best epoch.
+        ascending (bool): if True, the smallest values are the best ones.
+        path_checkpoints (str): directory where the checkpoints config_i.pth, and the weights config_i_net.pth
+            at the end of the last training of each configuration, are written.
+            If None, a temporary directory is used and deleted at the end.
+            Only the net being trained is in memory, the best net is read from its weights at the end.
+        silent (bool): Verbose.
+
+    Returns:
+        best_net, estims: the net of the best configuration of the last rung,
+        and the estimators with the whole history of every configuration, in the order of hyper_params.
+        The last rung where the configuration was trained and its number of epochs are added to the hyper-parameters
+        under RUNG_KEY and BUDGET_KEY, such that Estim_hyper_param.from_list(estims, ...) shows where each
+        configuration was pruned.
+
+    Post-condition :
+        early_stoppers are reset and used by the trainings.
+    """
+    assert eta >= 2, "eta should be at least 2."
+    assert 0 < min_epochs <= max_epochs, "min_epochs should be in ]0, max_epochs]."
+    # the same split for every configuration, such that the values are comparable.
+    indices, compute_validation = _nn_kfold_indices_creation_random(data_train_X, data_train_Y, percent_val,
+                                                                    1, shuffle)
+    if not compute_validation:
+        for stop in early_stoppers:
+            assert not stop.is_validation(), "Input validation stopper while no validation set given."
+
+    estims = [None] * len(hyper_params)
+    stopped = set()  # : configurations stopped by an early stopper.
+    train_times = [0.] * len(hyper_params)
+    remaining = list(range(len(hyper_params)))
+    rung, budget = 0, min_epochs
+    with contextlib.nullcontext(path_checkpoints) if path_checkpoints is not None \
+            else tempfile.TemporaryDirectory() as directory:
+        while True:
+            if not silent:
+                print(f"Rung {rung}: {len(remaining)} configurations trained until the epoch {budget}.")
+            for i in remaining:
+                if i in stopped:
+                    continue
+                start_train_time = time.time()
+                (param_train, history, best_epoch,
+                 is_stopped) = _train_config_until(data_train_X, data_train_Y, hyper_params[i], config_architecture,
+                                                   indices, compute_validation, early_stoppers, rung, budget,
+                                                   os.path.join(directory, f"config_{i}.pth"),
+                                                   os.path.join(directory, f"config_{i}_net.pth"))
+                train_times[i] += time.time() - start_train_time
+                if is_stopped:
+                    stopped.add(i)
+                estims[i] = _estimator_of_config(history, best_epoch, train_times[i], compute_validation,
+                                                 param_train, hyper_params[i], rung, budget)
+
+            remaining = _rank(remaining, estims, column, ascending)
+            if budget >= max_epochs:
+                break
+            remaining = remaining[:max(1, len(remaining) // eta)]
+            rung += 1
+            budget = max_epochs if len(remaining) == 1 else min(budget * eta, max_epochs)
+
+        param_train, Model_NN = config_architecture(hyper_params[remaining[0]])
+        best_net = Model_NN().to(param_train.device)
+        best_net.load_net(os.path.join(directory, f"config_{remaining[0]}_net.pth"))
+
+    if not silent:
+        print(f"Finished the successive halving, the best configuration is the number {remaining[0]}.")
+    return best_net, estims
+
+
+def _train_config_until(data_train_X, data_train_Y, params, config_architecture, indices, compute_validation,
+                        early_stoppers, rung, budget, path_checkpoint, path_net):
+    """ Trains the configuration until the epoch budget, from its checkpoint after the first rung.
+    The weights at the end of the training are saved in path_net.
+    Returns the parameters of training, the history, the best epoch and whether an early stopper stopped
+    the training."""
+    param_train, Model_NN = config_architecture(params)
+    param_train.epochs = budget
+    # the state is saved at the last epoch of the rung, from where the next rung resumes.
+    checkpointer = Checkpointer(path_checkpoint, period=budget)
+    if rung == 0:
+        if 'seed' in params:
+            set_seeds(params['seed'])
+        for early_stopper in early_stoppers:
+            early_stopper.reset()
+        checkpointer.start(indices, compute_validation)
+
+    net = Model_NN().to(param_train.device)
+    index_training, index_validation = indices[0]
+    history, best_epoch = nn_train(net, data_X=data_train_X, data_Y=data_train_Y, params_training=param_train,
+                                   indic_train_X=index_training, indic_train_Y=index_training,
+                                   early_stoppers=early_stoppers,
+                                   indic_val_X=index_validation, indic_val_Y=index_validation,
+                                   checkpointer=checkpointer, silent=True)
+    net.save_net(path_net)
+    is_stopped = any(early_stopper.is_stopped() for early_stopper in early_stoppers)
+    return param_train, history, best_epoch, is_stopped
+
+
+def _estimator_of_config(history, best_epoch, train_time, compute_validation, param_train, params, rung, budget):
+    # the history contains all the epochs since the first rung.
+    estimator_history = initialise_estimator(compute_validation, param_train,
+                                             {**params, RUNG_KEY: rung, BUDGET_KEY: budget})
+    estimator_history.append(history=translate_history_to_dataframe(history, 0, compute_validation),
+                             fold_best_epoch=best_epoch, fold_time=train_time)
+    estimator_history.best_fold = 0
+    return estimator_history
+
+
+def _rank(configs, estims, column, ascending):
+    # best first, the configurations without value (nan) last.
+    values = np.array([estims[i].get_best_value_for(column) for i in configs], dtype=float)
+    order = np.argsort(values if ascending else -values, kind='stable')
+    return [configs[k] for k in order]
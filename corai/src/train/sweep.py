@@ -0,0 +1,123 @@
+import os
+import resource
+import time
+
+from tqdm import tqdm
+
+from corai.src.classes.estimator.history.estim_history import Estim_history
+from corai.src.util_train import _fork_pool, _get_worker_task
+
+WALL_TIME_KEY = 'wall_time'  # : key of the hyper-parameters where the time of the configuration is written.
+PEAK_MEMORY_KEY = 'peak_memory_MB'  # : key of the hyper-parameters where the peak memory is written.
+
+
+def run_sweep(hyper_params, train_config, linker_estims, linker_models=None,
+              nb_workers=1, nb_threads_per_worker=None, compress=False, silent=False):
+    """
+    Semantics:
+        Trains every configuration of hyper_params and saves the results as estim_i.json and model_i.pth,
+        where i is the position of the configuration in hyper_params.
+
+        The configurations whose files already exist are not trained again, their estimator is read from the disk.
+        The files are written atomically (temporary file which replaces the final one), the estimator last,
+        such that an existing estimator means a completed configuration. A sweep that was interrupted
+        (crash, kill...) is resumed by calling the function again with the same arguments.
+
+        The wall time (s) and the peak resident memory (MB) of the training of each configuration are added to the
+        hyper-parameters of its estimator under WALL_TIME_KEY and PEAK_MEMORY_KEY, such that they appear
+        as columns of Estim_hyper_param. On Linux, the peak of memory is reset before each configuration.
+        Otherwise, it is the peak of the process since its start.
+
+    Args:
+        hyper_params (iterable of dict): the configurations, for example a Parameter_grid.
+        train_config (callable): train_config(params) -> (estimator_history, net). Trains the configuration.
+            net is a Savable_net, or None if there is no model to save. Seeds should be set by train_config,
+            such that a configuration gives the same result whichever worker trains it.
+        linker_estims (callable): list of names -> path of the estimators, see factory_fct_linked_path.
+        linker_models (callable): list of names -> path of the models. If None, the models are not saved.
+            Requirements: None if train_config returns no net.
+        nb_workers (int): Number of configurations trained concurrently, each in its own process.
+            1 means sequential training.
+            Requirements: training on cpu, the processes are forked (not available on Windows, see _fork_pool).
+        nb_threads_per_worker (int): Number of threads used by torch in each worker.
+            If None, the cores are shared equally between the workers.
+        compress (bool): whether the estimators are compressed.
+        silent (bool): Verbose.
+
+    Returns:
+        The list of the estimators, in the order of hyper_params.
+    """
+    tasks = list(enumerate(hyper_params))
+    estims = [None] * len(tasks)
+    tasks_to_train = []
+    for i, params in tasks:
+        if _is_completed(i, linker_estims, linker_models):
+            estims[i] = Estim_history.from_json(linker_estims([f"estim_{i}.json"]), compressed=compress)
+        else:
+            tasks_to_train.append((i, params))
+    if not silent:
+        print(f"{len(tasks) - len(tasks_to_train)} configurations already trained, "
+              f"{len(tasks_to_train)} configurations to train.")
+
+    # train_config is usually defined locally, it is inherited by the workers.
+    sweep_task = (train_config, linker_estims, linker_models, compress)
+    if nb_workers == 1 or len(tasks_to_train) <= 1:
+        for i, params in tqdm(tasks_to_train, disable=silent):
+            estims[i] = _train_config((i, params), sweep_task)
+    else:
+        with _fork_pool(sweep_task, min(nb_workers, len(tasks_to_train)), nb_threads_per_worker) as pool:
+            # imap keeps the order of the configurations.
+            trained = pool.imap(_train_config_in_worker, tasks_to_train)
+            for (i, _), estimator_history in zip(tasks_to_train, tqdm(trained, total=len(tasks_to_train),
+                                                                      disable=silent)):
+                estims[i] = estimator_history
+    return estims
+
+
+# section ######################################################################
+#  #############################################################################
+# WORKERS
+
+def _train_config_in_worker(task):
+    return _train_config(task, _get_worker_task())
+
+
+def _train_config(task, sweep_task):
+    i, params = task
+    train_config, linker_estims, linker_models, compress = sweep_task
+    _reset_peak_memory()
+    start_time = time.time()
+    estimator_history, net = train_config(params)
+    wall_time = time.time() - start_time
+    estimator_history.hyper_params = {**estimator_history.hyper_params,
+                                      WALL_TIME_KEY: wall_time, PEAK_MEMORY_KEY: _peak_memory()}
+
+    # the model first, the estimator marks the configuration as completed.
+    if net is not None and linker_models is not None:
+        path_model = linker_models([f"model_{i}.pth"])
+        net.save_net(path_model + '.tmp')
+        os.replace(path_model + '.tmp', path_model)  # : atomic.
+    path_estim = linker_estims([f"estim_{i}.json"])
+    estimator_history.to_json(path_estim + '.tmp', compress=compress)
+    os.replace(path_estim + '.tmp', path_estim)  # : atomic.
+    return estimator_history
+
+
+def _is_completed(i, linker_estims, linker_models):
+    # the estimator is written last, the model is checked in case it was deleted.
+    return (os.path.exists(linker_estims([f"estim_{i}.json"]))
+            and (linker_models is None or os.path.exists(linker_models([f"model_{i}.pth"]))))
+
+
+def _reset_peak_memory():
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')  # : resets the peak resident memory of the process, Linux only.
+    except OSError:
+        pass
+
+
+def _peak_memory():
+    # in MB. ru_maxrss is in kB on Linux, in bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if os.uname().sysname == 'Darwin' else peak / 2 ** 10
@@ -1,4 +1,6 @@
+from corai.src.classes.memmaptensor import MemmapTensor
 from corai.src.classes.training_stopper.early_stopper_vanilla import Early_stopper_vanilla
+from corai.src.classes.windowedtensor import WindowedTensor
 from corai.src.train.fit import nn_fit
 from corai.src.train.history import history_create
 from corai_util.tools import function_iterable
@@ -6,14 +8,14 @@ from corai_util.tools import function_iterable
 
 def nn_train(net, data_X, data_Y, params_training, indic_train_X, indic_train_Y,
              early_stoppers=(Early_stopper_vanilla(),),
-             indic_val_X=None, indic_val_Y=None, *, silent=False):
+             indic_val_X=None, indic_val_Y=None, *, checkpointer=None, silent=False):
     """
     Semantics : Given the net, we train it upon data.
     For optimisation reasons, we pass the indices.
     Args:
         net (Savable_net):
-        data_X (tensor):
-        data_Y (tensor):
+        data_X (tensor, MemmapTensor or WindowedTensor):
+        data_Y (tensor, MemmapTensor or WindowedTensor):
         params_training (NNTrainParameters): parameters used for training
         indic_train_X: indices of values from data_X to be used for training
         indic_train_Y: indices of values from data_Y to be used for training
@@ -21,6 +23,7 @@ def nn_train(net, data_X, data_Y, params_training, indic_train_X, indic_train_Y,
                         Preferably immutable to insure no changes.
         indic_val_X: indices of values from data_X to be used for validation, None if validation is not performed
         indic_val_Y: indices of values from data_Y to be used for validation, None if validation is not performed
+        checkpointer (Checkpointer): if not None, the training is checkpointed, and resumed from the last checkpoint.
         silent (bool): verbose.
 
     Returns: history of training and all other metrics, in a dictionary.
@@ -41,10 +44,11 @@ def nn_train(net, data_X, data_Y, params_training, indic_train_X, indic_train_Y,
     """
 
     # Prepare Training set
-    device = params_training.device
+    # when streaming, the data stays on the host and the loaders of nn_fit send the batches to the device.
+    device = params_training.device if not params_training.stream_to_device else None
     epoch = params_training.epochs
-    X_train_on_device = data_X[indic_train_X].to(device)
-    Y_train_on_device = data_Y[indic_train_Y].to(device)
+    X_train_on_device = _select_rows(data_X, indic_train_X, device)
+    Y_train_on_device = _select_rows(data_Y, indic_train_Y, device)
 
     # condition if we use validation set:
     list_params_validation = [indic_val_X, indic_val_Y]
@@ -59,11 +63,12 @@ def nn_train(net, data_X, data_Y, params_training, indic_train_X, indic_train_Y,
 
     if is_val_included:
         epoch_best_net = nn_fit(net, X_train_on_device, Y_train_on_device, params_training, history, early_stoppers,
-                                X_val_on_device=X_val_on_device, Y_val_on_device=Y_val_on_device, silent=silent)
+                                X_val_on_device=X_val_on_device, Y_val_on_device=Y_val_on_device,
+                                checkpointer=checkpointer, silent=silent)
 
     else:  # if no validation set
         epoch_best_net = nn_fit(net, X_train_on_device, Y_train_on_device, params_training, history, early_stoppers,
-                                silent=silent)
+                                checkpointer=checkpointer, silent=silent)
 
     return history, epoch_best_net
 
@@ -72,11 +77,23 @@ def _prep_data_history(data_X, data_Y, device, epoch, indic_validation_X, indic_
                        is_validation_included, params_training):
     # Prepare Validation set if there is any:
     if is_validation_included:
-        X_val_on_device = data_X[indic_validation_X].to(device)
-        Y_val_on_device = data_Y[indic_validation_Y].to(device)
+        X_val_on_device = _select_rows(data_X, indic_validation_X, device)
+        Y_val_on_device = _select_rows(data_Y, indic_validation_Y, device)
     else:
         X_val_on_device = 0
         Y_val_on_device = 0
 
     history = history_create(epoch, params_training.metrics, is_validation_included)
     return X_val_on_device, Y_val_on_device, history
+
+
+def _select_rows(data, indices, device):
+    # device is None when the data is streamed by the loaders.
+    if isinstance(data, MemmapTensor):
+        assert device is None, "Memory-mapped data is read lazily by the loaders, it requires stream_to_device."
+        return data.take_rows(indices)  # nothing is read from the disk.
+    if isinstance(data, WindowedTensor):
+        data = data.take_rows(indices)  # the windows are computed by the loaders.
+    else:
+        data = data[indices]
+    return data.to(device) if device is not None else data
@@ -1,4 +1,7 @@
+import contextlib
 import functools
+import multiprocessing
+import os
 
 import numpy as np
 import torch
@@ -78,6 +81,48 @@ def set_seeds(seed):
     np.random.seed(seed)
 
 
+# task shared by the workers of _fork_pool, set before they are forked such that they inherit it without pickling.
+# The classes created by factories and the functions defined locally (metrics, closures) could not be pickled.
+_worker_task = None
+
+
+@contextlib.contextmanager
+def _fork_pool(task, nb_workers, nb_threads_per_worker=None):
+    """
+    Semantics:
+        Pool of nb_workers processes, in which task is returned by _get_worker_task().
+        Each worker limits the number of threads of torch to nb_threads_per_worker.
+
+        Only works with the fork start method: the workers inherit the memory of the parent, task included.
+        It is the default on Linux. On macOS and Windows the default is spawn, where the workers start a new
+        interpreter and the task would never be inherited: fork is then used explicitly on macOS,
+        and Windows is not supported.
+    Args:
+        task: the data given to the workers.
+        nb_workers (int): the number of processes.
+        nb_threads_per_worker (int): Number of threads used by torch in each worker.
+            If None, the cores are shared equally between the workers.
+
+    Returns:
+        The pool, as a context manager.
+    """
+    global _worker_task
+    assert 'fork' in multiprocessing.get_all_start_methods(), "The workers require processes started by fork."
+    if nb_threads_per_worker is None:
+        nb_threads_per_worker = max(1, os.cpu_count() // nb_workers)
+    _worker_task = task
+    try:
+        with multiprocessing.get_context('fork').Pool(nb_workers, initializer=torch.set_num_threads,
+                                                      initargs=(nb_threads_per_worker,)) as pool:
+            yield pool
+    finally:
+        _worker_task = None
+
+
+def _get_worker_task():
+    return _worker_task
+
+
 def create_model_by_index(index, path2json, path2net,
                           config_architecture, mapping_names2functions,
                           flag_factory=False, **kwargs):
@@ -86,6 +131,9 @@ def create_model_by_index(index, path2json, path2net,
     Args:
         index(int): The index of the parameters used for training in the json file.
         path2json(str): The path to the json file containing the training parameters (as list of dicts).
+            For large sweeps, prefer a json-lines file (list_of_dicts_to_jsonl) or the options of a grid
+            (Parameter_grid.to_json): the parameters are then read directly. The parameters read are cached,
+            see retrieve_parameters_by_index_from_json.
         path2net(str): The path to the saved model, where the trained parameters are stored.
         config_architecture(callable): A callable returning the class (or the instance, depending on flag_factory)
             that will be used to initialise the model. It is able to create the model
@@ -4,9 +4,13 @@ from corai_error import Error_not_allowed_input
 from corai_estimator import Estimator
 from corai_util.tools.src.function_file import remove_files_from_dir
 
+from corai.src.classes.architecture.fully_connected import Fully_connected_NN
 from corai.src.classes.estimator.history.estim_history import Estim_history
 import numpy as np
 import os
+import pandas as pd
+import time
+from types import SimpleNamespace
 
 from corai.src.classes.estimator.hyper_parameters.estim_hyper_param import Estim_hyper_param
 from corai.src.train.history import translate_history_to_dataframe
@@ -65,6 +69,17 @@ class Test_estim_history(TestCase):
 
         assert translated_history == flattened_history
 
+    def test_translate_keeps_nan_of_not_evaluated_epochs(self):
+        history = {'training': {'loss': np.array([0., 1., 2., 3., np.nan, np.nan]),
+                                'L1': np.array([10., np.nan, 12., 13., np.nan, np.nan])},
+                   'validation': {'loss': np.array([30., np.nan, 32., 33., np.nan, np.nan])}}
+        translated_history = translate_history_to_dataframe(history, 0, True)
+
+        assert translated_history['epoch'] == [0, 1, 2, 3]
+        assert translated_history['loss_training'] == [0., 1., 2., 3.]
+        np.testing.assert_array_equal(translated_history['L1_training'], [10., np.nan, 12., 13.])
+        np.testing.assert_array_equal(translated_history['loss_validation'], [30., np.nan, 32., 33.])
+
     def test_append_history_from_folds_to_estim(self):
         estimator = Estim_history(metric_names=metric_names, validation=True)
 
@@ -78,6 +93,83 @@ class Test_estim_history(TestCase):
 
         assert df.shape == (20, 8)
 
+    def test_append_many_folds_equals_concatenation(self):
+        estimator = Estim_history(metric_names=metric_names, validation=True)
+        histories = [translate_history_to_dataframe(train_history, fold, True) for fold in range(50)]
+        for history in histories:
+            estimator.append(history, fold_best_epoch=2, fold_time=3)
+
+        expected = pd.concat([pd.DataFrame(history) for history in histories], ignore_index=True)
+        pd.testing.assert_frame_equal(estimator.df[expected.columns], expected, check_dtype=False)
+        assert estimator.nb_folds == 50 and estimator.nb_epochs == 10
+        assert estimator.get_values_fold_epoch_col(31, 4, 'L1_validation') == 44
+        np.testing.assert_array_equal(estimator.get_values_fold_col(7, 'loss_training'), range(10))
+
+        estimator.best_fold = 7
+        estimator.slice_best_fold()
+        assert estimator.df.shape == (10, 8)
+        assert list(estimator.df['fold'].unique()) == [7]
+        assert list(estimator.df.index) == list(range(70, 80))  # : the labels of the rows are kept.
+
+    def test_append_after_modifying_df(self):
+        estimator = Estim_history(metric_names=metric_names, validation=True)
+        estimator.append(translate_history_to_dataframe(train_history, 0, True), fold_best_epoch=2, fold_time=3)
+        df = estimator.df
+        df['loss_training'] = 0.
+        estimator.append(translate_history_to_dataframe(train_history, 1, True), fold_best_epoch=2, fold_time=3)
+
+        assert estimator.get_values_fold_epoch_col(0, 5, 'loss_training') == 0.
+        assert estimator.get_values_fold_epoch_col(1, 5, 'loss_training') == 5
+        assert estimator.df.shape == (20, 8)
+
+    def test_index_follows_appends_and_new_df(self):
+        estimator = Estim_history(metric_names=metric_names, validation=True)
+        estimator.append(translate_history_to_dataframe(train_history, 0, True), fold_best_epoch=2, fold_time=3)
+        assert estimator.get_values_fold_epoch_col(0, 9, 'L2_training') == 29
+        with self.assertRaises(IndexError):
+            estimator.get_values_fold_epoch_col(1, 0, 'L2_training')
+
+        estimator.append(translate_history_to_dataframe(train_history, 1, True), fold_best_epoch=2, fold_time=3)
+        assert estimator.get_values_fold_epoch_col(1, 0, 'L2_training') == 20
+
+        estimator.df = estimator.df.iloc[::-1]  # : new dataframe, the rows are not at the same place anymore.
+        assert estimator.get_values_fold_epoch_col(1, 0, 'L2_training') == 20
+        np.testing.assert_array_equal(estimator.get_values_fold_col(0, 'epoch'), range(9, -1, -1))
+
+    def test_index_of_epochs_follows_appends_to_a_fold(self):
+        estimator = Estim_history(metric_names=metric_names, validation=True)
+        estimator.append(translate_history_to_dataframe(train_history, 0, True), fold_best_epoch=2, fold_time=3)
+        assert estimator.get_values_fold_epoch_col(0, 9, 'L2_training') == 29  # : the epochs of fold 0 are indexed.
+
+        later_epochs = {key: [value[-1]] for key, value in flattened_history.items()}
+        later_epochs.update({'epoch': [10], 'fold': [0]})
+        estimator.append(later_epochs, fold_best_epoch=10, fold_time=3)
+        assert estimator.get_values_fold_epoch_col(0, 10, 'L2_training') == 29
+        assert estimator.get_values_fold_epoch_col(0, 9, 'L2_training') == 29
+
+    def test_reading_df_keeps_the_store(self):
+        estimator = Estim_history(metric_names=metric_names, validation=True)
+        assert np.isnan(estimator.nb_folds) and np.isnan(estimator.nb_epochs)
+        estimator.append(translate_history_to_dataframe(train_history, 0, True), fold_best_epoch=2, fold_time=3)
+        df = estimator.df
+        store = estimator._columns()
+        assert estimator.df is df and 'fold' in estimator.df and len(estimator.df.columns) == 8
+        assert estimator._columns() is store  # : not rebuilt by the reads.
+
+        estimator.df.loc[9, 'L2_training'] = -1  # : value modified in place, seen by the getters.
+        assert estimator.get_values_fold_epoch_col(0, 9, 'L2_training') == -1
+        assert estimator._columns() is store
+        estimator.df['new'] = 0  # : new column in place, the store is rebuilt.
+        assert estimator.get_values_fold_epoch_col(0, 9, 'new') == 0
+        estimator.order(['epoch'], ascending=False, inplace=True)
+        assert estimator.get_values_col('epoch')[0] == 9
+
+    def test_append_period_kept_data(self):
+        estimator = Estim_history(metric_names=metric_names, validation=True)
+        estimator.append(translate_history_to_dataframe(train_history, 0, True), fold_best_epoch=3, fold_time=3,
+                         period_kept_data=4)
+
+        assert list(estimator.df['epoch']) == [0, 4, 8, 3]
 
     def test_to_json(self):
         file_name = "test.json"
@@ -92,15 +184,99 @@ class Test_estim_history(TestCase):
         estimator.append(history, 3, 2)
 
         estimator.to_json(path)
+        with open(path, 'r') as file:
+            content = file.read()
 
         print(estimator)
 
         new_estim = Estim_history.from_json(path)
+        with open(path, 'r') as file:
+            assert file.read() == content  # reading does not modify the file.
+        assert new_estim.list_best_epoch == [2, 3]
+        np.testing.assert_array_equal(new_estim.df.values, estimator.df.values)
+        # uncompressed files are read as well.
+        estimator.to_json(path, compress=False)
+        np.testing.assert_array_equal(Estim_history.from_json(path).df.values, estimator.df.values)
 
         print(new_estim)
         remove_files_from_dir(folder_path=FOLDER_PATH, file_start="", file_extension="")
 
 
+    def test_to_binary_and_from_binary(self):
+        # npz does not require pyarrow.
+        hyper_params = {'lr': 0.7, 'list_hidden_sizes': [16, 32], 'name': 'run'}
+        estimator = Estim_history(metric_names=metric_names, validation=True, hyper_params=hyper_params)
+        estimator.append(translate_history_to_dataframe(train_history, 0, True), fold_best_epoch=2, fold_time=3)
+        estimator.append(translate_history_to_dataframe(train_history, 1, True), fold_best_epoch=4, fold_time=5)
+        estimator.best_fold = 1
+
+        for i in range(2):
+            estimator.to_binary(os.path.join(FOLDER_PATH, f"estim_{i}.npz"))
+        new_estim = Estim_history.from_binary(os.path.join(FOLDER_PATH, "estim_0.npz"))
+        pd.testing.assert_frame_equal(estimator.df, new_estim.df)
+        assert new_estim.list_best_epoch == [2, 4] and new_estim.best_fold == 1
+        assert new_estim.list_train_times == [3, 5] and new_estim.validation
+        assert new_estim.hyper_params == hyper_params and new_estim.metric_names == metric_names
+        assert Estim_history.from_binary_attributes(os.path.join(FOLDER_PATH, "estim_1.npz")) == estimator._attrs()
+
+        estimator_param = Estim_hyper_param.from_folder(FOLDER_PATH, metric_names=["loss_validation"], binary=True)
+        assert list(estimator_param.df['loss_validation']) == [34, 34]
+        remove_files_from_dir(folder_path=FOLDER_PATH, file_start="", file_extension="")
+
+    def test_folder_loading_in_parallel(self):
+        for i in range(12):
+            estimator = Estim_history(metric_names=metric_names, validation=True, hyper_params={'run': i})
+            estimator.append(translate_history_to_dataframe(train_history, 0, True), fold_best_epoch=i % 10,
+                             fold_time=3)
+            estimator.best_fold = 0
+            estimator.to_json(os.path.join(FOLDER_PATH, f"estim_{i}.json"))
+
+        sequential = Estim_history.folder_json2list_estim(FOLDER_PATH)
+        parallel = Estim_history.folder_json2list_estim(FOLDER_PATH, nb_workers=3)
+        assert [estimator.hyper_params['run'] for estimator in parallel] == list(range(12))  # : order of the files.
+        for estimator, estimator_parallel in zip(sequential, parallel):
+            pd.testing.assert_frame_equal(estimator.df, estimator_parallel.df)
+
+        estimator_param = Estim_hyper_param.from_folder(FOLDER_PATH, metric_names=["loss_training"], nb_workers=3)
+        assert list(estimator_param.df['loss_training']) == [i % 10 for i in range(12)]
+        remove_files_from_dir(folder_path=FOLDER_PATH, file_start="", file_extension="")
+
+    def test_hyper_param_from_list_and_number_params(self):
+        estimators = []
+        for i, hidden_sizes in enumerate(['[16, 16]', '[32]', '[4, 5, 6]']):
+            estimator = Estim_history(metric_names=metric_names, validation=True,
+                                      hyper_params={'architecture': 'fcnn', 'list_hidden_sizes': hidden_sizes,
+                                                    'input_size': 3})
+            if i == 1:
+                estimator.hyper_params['lr'] = 0.1  # : only given for one of the estimators.
+            estimator.append(translate_history_to_dataframe(train_history, 0, True), fold_best_epoch=i, fold_time=3)
+            estimator.best_fold = 0
+            estimators.append(estimator)
+
+        estimator_param = Estim_hyper_param.from_list(iter(estimators), metric_names=["loss_validation"])
+        assert list(estimator_param.df['loss_validation']) == [30, 31, 32]
+        np.testing.assert_array_equal(estimator_param.df['lr'], [np.nan, 0.1, np.nan])
+
+        estimator_param.compute_number_params_for_fcnn()
+        for hidden_sizes, nb_of_params in zip(estimator_param.df['list_hidden_sizes'], estimator_param.df['nb_of_params']):
+            assert nb_of_params == Fully_connected_NN.compute_nb_of_params(3, hidden_sizes, 1,
+                                                                           [True] * (len(hidden_sizes) + 1))
+
+    def test_hyper_param_from_list_time_is_linear(self):
+        # only the hyper-parameters are read with no metric, a simple namespace stands for the estimators.
+        def time_from_list(nb_estimators):
+            estimators = [SimpleNamespace(hyper_params={f'param_{j}': i for j in range(20)})
+                          for i in range(nb_estimators)]
+            times = []
+            for _ in range(3):
+                start = time.perf_counter()
+                Estim_hyper_param.from_list(estimators, metric_names=[])
+                times.append(time.perf_counter() - start)
+            return min(times)
+
+        # linear: 4 times more estimators take about 4 times longer, quadratic would take 16 times longer.
+        assert time_from_list(20000) < 8 * time_from_list(5000)
+
     def test_cannot_save_empty_estimator(self):
         file_name = "test.json"
 
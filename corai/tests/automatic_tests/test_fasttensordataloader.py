@@ -0,0 +1,64 @@
+from unittest import TestCase
+
+import torch
+
+from corai.src.classes.fasttensordataloader import FastTensorDataLoader
+
+
+class Test_fasttensordataloader(TestCase):
+    def setUp(self) -> None:
+        torch.manual_seed(42)
+        self.X = torch.arange(103, dtype=torch.float32).reshape(-1, 1)
+        self.Y = torch.arange(103)
+
+    def test_no_shuffle_gives_views_in_order(self):
+        loader = FastTensorDataLoader(self.X, self.Y, batch_size=10, shuffle=False)
+        batches_X = [batch_X for batch_X, _ in loader]
+
+        assert len(batches_X) == len(loader) == 11
+        assert torch.equal(torch.cat(batches_X), self.X)
+        assert loader.nb_bytes_moved == 0
+
+    def test_index_shuffle_does_not_reorder_the_tensors(self):
+        loader = FastTensorDataLoader(self.X, self.Y, batch_size=10, shuffle=True, index_shuffle=True)
+        for _ in range(2):  # two epochs
+            batches = list(loader)
+            batches_X = torch.cat([batch_X for batch_X, _ in batches])
+            batches_Y = torch.cat([batch_Y for _, batch_Y in batches])
+
+            assert torch.equal(batches_X.squeeze(1).long(), batches_Y)  # pairs are kept together.
+            assert torch.equal(batches_Y.sort()[0], self.Y)  # each element is seen once.
+            assert loader.tensors[0] is self.X  # original storage kept.
+            assert loader.nb_bytes_moved == 103 * (4 + 8)
+
+    def test_chunk_shuffle_keeps_contiguous_chunks(self):
+        loader = FastTensorDataLoader(self.X, self.Y, batch_size=10, shuffle=True, index_shuffle=True,
+                                      chunk_size=5)
+        batches_Y = torch.cat([batch_Y for _, batch_Y in loader])
+
+        assert torch.equal(batches_Y.sort()[0], self.Y)
+        inside_chunk = batches_Y[1:] % 5 != 0
+        # each chunk is read in order: inside a chunk, an element follows its predecessor.
+        assert torch.equal(batches_Y[1:][inside_chunk], batches_Y[:-1][inside_chunk] + 1)
+
+    def test_shuffle_in_place_reports_the_copy(self):
+        loader = FastTensorDataLoader(self.X, self.Y, batch_size=10, shuffle=True)
+        list(loader)
+
+        assert loader.nb_bytes_moved == 103 * (4 + 8)
+
+    def test_streaming_with_prefetch_gives_all_batches(self):
+        loader = FastTensorDataLoader(self.X, self.Y, batch_size=10, shuffle=True, index_shuffle=True,
+                                      device='cpu', nb_prefetch=3)
+        for _ in range(2):  # two epochs
+            batches_Y = torch.cat([batch_Y for _, batch_Y in loader])
+            assert torch.equal(batches_Y.sort()[0], self.Y)
+
+    def test_streaming_epoch_interrupted(self):
+        loader = FastTensorDataLoader(self.X, self.Y, batch_size=10, shuffle=False, device='cpu', nb_prefetch=1)
+        for i, _ in enumerate(loader):
+            if i == 2:
+                break  # the background thread waits, it is stopped at the next epoch.
+
+        batches_X = torch.cat([batch_X for batch_X, _ in loader])
+        assert torch.equal(batches_X, self.X)
@@ -14,4 +14,27 @@ class Test_fcnn(TestCase):
                                         param_activation_functions=[torch.tanh, torch.tanh])()
 
 
-        assert nn.nb_of_params == 12960
\ No newline at end of file
+        assert nn.nb_of_params == 12960
+
+    def test_update_best_weights_in_place(self):
+        net = factory_parametrised_FC_NN(param_input_size=4,
+                                         param_list_hidden_sizes=[16, 16],
+                                         param_output_size=2,
+                                         param_list_biases=[True, True, True],
+                                         param_activation_functions=[torch.tanh, torch.tanh])()
+        net.update_best_weights(0)
+        buffers = {name: tensor.data_ptr() for name, tensor in net.best_weights.items()}
+        with torch.no_grad():
+            for param in net.parameters():
+                param.add_(1.)
+        net.update_best_weights(3)
+
+        assert net.best_epoch == 3
+        assert {name: tensor.data_ptr() for name, tensor in net.best_weights.items()} == buffers  # no allocation.
+        for name, tensor in net.state_dict().items():
+            assert torch.equal(net.best_weights[name], tensor)
+            assert net.best_weights[name].data_ptr() != tensor.data_ptr()  # a copy, not the weights.
+
+        net.best_weights_on_host = True
+        net.update_best_weights(4)
+        assert all(tensor.device == torch.device('cpu') for tensor in net.best_weights.values())
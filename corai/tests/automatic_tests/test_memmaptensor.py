@@ -0,0 +1,49 @@
+import os
+import tempfile
+from unittest import TestCase
+
+import torch
+
+from corai.src.classes.fasttensordataloader import FastTensorDataLoader
+from corai.src.classes.memmaptensor import MemmapTensor
+
+
+class Test_memmaptensor(TestCase):
+    def setUp(self) -> None:
+        torch.manual_seed(42)
+        self.directory = tempfile.TemporaryDirectory()
+        self.X = torch.arange(206, dtype=torch.float32).reshape(-1, 2)
+        self.path = os.path.join(self.directory.name, "X.npy")
+        MemmapTensor.to_npy(self.path, self.X)
+        self.data_X = MemmapTensor.from_npy(self.path)
+
+    def tearDown(self) -> None:
+        del self.data_X
+        self.directory.cleanup()
+
+    def test_indexing_reads_rows_in_requested_order(self):
+        indices = torch.tensor([7, 3, 50, 3])
+
+        assert self.data_X.shape == self.X.shape
+        assert self.data_X.dtype == torch.float32
+        assert torch.equal(self.data_X[indices], self.X[indices])
+        assert torch.equal(self.data_X[10:20], self.X[10:20])
+
+    def test_take_rows_composes(self):
+        indices_fold = torch.randperm(103)[:60]
+        fold_X = self.data_X.take_rows(indices_fold)
+
+        assert fold_X.shape == (60, 2)
+        assert torch.equal(fold_X[5:15], self.X[indices_fold][5:15])
+        assert torch.equal(fold_X.take_rows(torch.tensor([0, 2]))[:], self.X[indices_fold[[0, 2]]])
+
+    def test_loader_gathers_batches_from_the_disk(self):
+        Y = torch.arange(103)
+        loader = FastTensorDataLoader(self.data_X, Y, batch_size=10, shuffle=True, device='cpu', nb_prefetch=2)
+        batches = list(loader)
+        batches_X = torch.cat([batch_X for batch_X, _ in batches])
+        batches_Y = torch.cat([batch_Y for _, batch_Y in batches])
+
+        assert loader.index_shuffle  # the memmap is not reordered.
+        assert torch.equal(batches_X, self.X[batches_Y])
+        assert torch.equal(batches_Y.sort()[0], Y)
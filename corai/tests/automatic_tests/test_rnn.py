@@ -0,0 +1,69 @@
+from unittest import TestCase
+
+import torch
+from torch import nn
+
+from corai.src.classes.architecture.rnn.one_hidden_recurrent import One_hidden_recurrent
+from corai.src.classes.architecture.rnn.rnn import factory_parametrised_RNN
+from corai.src.classes.architecture.rnn.two_hidden_recurrent import Two_hidden_recurrent
+
+
+class Test_rnn(TestCase):
+    def setUp(self) -> None:
+        torch.manual_seed(42)
+        self.time_series = torch.randn(4, 12, 3)
+
+    def incremental_equals_full_forward(self, rnn_class, hidden_module, nb_output_consider, num_layers):
+        rnn = factory_parametrised_RNN(input_dim=3, output_dim=1, num_layers=num_layers,
+                                       nb_output_consider=nb_output_consider, hidden_size=8,
+                                       rnn_class=rnn_class)().eval()
+        hidden_module = hidden_module(num_layers, 1, 8)
+        with torch.no_grad():
+            expected = rnn(hidden_module(self.time_series))
+
+            state = (hidden_module.get_hidden_states((1, 4, 1)), None)
+            # first a chunk of several timesteps, then the timesteps one by one.
+            out, state = rnn.forward_incremental(self.time_series[:, :5], state)
+            for t in range(5, self.time_series.shape[1]):
+                out, state = rnn.forward_incremental(self.time_series[:, t:t + 1], state)
+        self.assertTrue(torch.allclose(expected, out, atol=1E-6))
+
+    def test_forward_incremental_gru(self):
+        self.incremental_equals_full_forward(nn.GRU, One_hidden_recurrent, nb_output_consider=3, num_layers=2)
+
+    def test_forward_incremental_lstm(self):
+        self.incremental_equals_full_forward(nn.LSTM, Two_hidden_recurrent, nb_output_consider=1, num_layers=1)
+
+    def incremental_windowed_equals_window_forward(self, rnn_class, hidden_module, nb_output_consider, num_layers):
+        lookback_window = 4
+        rnn = factory_parametrised_RNN(input_dim=3, output_dim=1, num_layers=num_layers,
+                                       nb_output_consider=nb_output_consider, hidden_size=8,
+                                       rnn_class=rnn_class)().eval()
+        hidden_module = hidden_module(num_layers, 1, 8)
+        with torch.no_grad():
+            state = (hidden_module.get_hidden_states((1, 4, 1)), None)
+            out, state = rnn.forward_incremental(self.time_series[:, :2], state, lookback_window)
+            self.assertTrue(torch.allclose(rnn(hidden_module(self.time_series[:, :2])), out, atol=1E-6))
+            for t in range(2, self.time_series.shape[1]):
+                out, state = rnn.forward_incremental(self.time_series[:, t:t + 1], state, lookback_window)
+                window = self.time_series[:, max(0, t + 1 - lookback_window):t + 1]
+                # the same output as the window-based inference, from h0 over the last lookback_window timesteps.
+                self.assertTrue(torch.allclose(rnn(hidden_module(window)), out, atol=1E-6))
+
+            # without window, the hidden state is carried over the whole stream: not the window-based output.
+            out, _ = rnn.forward_incremental(self.time_series, (hidden_module.get_hidden_states((1, 4, 1)), None))
+            self.assertFalse(torch.allclose(rnn(hidden_module(self.time_series[:, -lookback_window:])), out))
+
+    def test_forward_incremental_windowed_gru(self):
+        self.incremental_windowed_equals_window_forward(nn.GRU, One_hidden_recurrent, nb_output_consider=3,
+                                                        num_layers=2)
+
+    def test_forward_incremental_windowed_lstm(self):
+        self.incremental_windowed_equals_window_forward(nn.LSTM, Two_hidden_recurrent, nb_output_consider=1,
+                                                        num_layers=1)
+
+    def test_forward_incremental_bidirectional_refused(self):
+        rnn = factory_parametrised_RNN(input_dim=3, bidirectional=True, hidden_size=8, rnn_class=nn.GRU)()
+        hidden_module = One_hidden_recurrent(1, 2, 8)
+        with self.assertRaises(AssertionError):
+            rnn.forward_incremental(self.time_series, (hidden_module.get_hidden_states((1, 4, 1)), None))
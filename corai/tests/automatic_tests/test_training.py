@@ -1,3 +1,5 @@
+import os
+import tempfile
 from unittest import TestCase
 
 import numpy as np
@@ -10,13 +12,20 @@ from torch import nn
 
 from config import ROOT_DIR
 from corai.src.classes.architecture.fully_connected import factory_parametrised_FC_NN
+from corai.src.classes.checkpointer import Checkpointer
+from corai.src.classes.memmaptensor import MemmapTensor
 from corai.src.classes.metric.metric import Metric
 from corai.src.classes.optim_wrapper import Optim_wrapper
 from corai.src.classes.training_stopper.early_stopper_training import Early_stopper_training
 from corai.src.classes.training_stopper.early_stopper_validation import Early_stopper_validation
-from corai.src.train.kfold_training import nn_kfold_train
+from corai.src.train.kfold_training import initialise_estimator, nn_kfold_train
 from corai.src.train.nntrainparameters import NNTrainParameters
+from corai.src.train.stacked_training import nn_kfold_train_stacked, train_stacked_after_split
+from corai.src.train.successive_halving import nn_successive_halving, RUNG_KEY, BUDGET_KEY
+from corai.src.train.sweep import run_sweep, WALL_TIME_KEY, PEAK_MEMORY_KEY
+from corai.src.train.train import nn_train
 from corai.src.util_train import set_seeds, pytorch_device_setting
+from corai_util.tools.src.function_dict import Parameter_grid
 from corai_util.tools.src.function_writer import factory_fct_linked_path
 
 
@@ -182,6 +191,276 @@ class Test_regression(TestCase):
         # : fetch the best value and assert if accuracy > threshold.
         assert best_loss < 0.001
 
+    def test_training_kfold_parallel(self):
+        self.param_training.epochs = 50
+        estimators_history = []
+        for _ in range(2):
+            set_seeds(42)
+            (net, estimator_history) = nn_kfold_train(self.train_X, self.train_Y, self.Class_Parametrized_NN,
+                                                      param_train=self.param_training,
+                                                      early_stoppers=self.early_stoppers, nb_split=3,
+                                                      shuffle_kfold=True, nb_workers=3, nb_threads_per_worker=1,
+                                                      silent=True)
+            estimators_history.append(estimator_history)
+
+        # deterministic, folds merged in order.
+        pd.testing.assert_frame_equal(estimators_history[0].df, estimators_history[1].df)
+        assert list(estimators_history[0].df['fold'].unique()) == [0, 1, 2]
+        best_fold = estimators_history[0].best_fold
+        loss_best_fold = estimators_history[0].get_values_fold_epoch_col(
+            best_fold, estimators_history[0].list_best_epoch[best_fold], 'loss_training')
+        assert loss_best_fold == min(estimators_history[0].get_values_fold_epoch_col(
+            i, estimators_history[0].list_best_epoch[i], 'loss_training') for i in range(3))
+
+    def test_training_kfold_stacked(self):
+        self.param_training.epochs = 300
+        (net, estimator_history) = nn_kfold_train_stacked(self.train_X, self.train_Y, self.Class_Parametrized_NN,
+                                                          param_train=self.param_training,
+                                                          early_stoppers=self.early_stoppers, nb_split=3,
+                                                          shuffle_kfold=True, silent=True)
+
+        assert list(estimator_history.df['fold'].unique()) == [0, 1, 2]
+        assert not np.isnan(estimator_history.get_values_col('L4_validation')).any()
+        best_loss = estimator_history.get_best_value_for('loss_validation')
+        assert best_loss < 0.01
+
+    def test_stacked_history_loss_equals_loss_over_whole_data(self):
+        # with a zero learning rate, each member has the loss of its own net over its own data.
+        param_training = NNTrainParameters(batch_size=128, epochs=2, device=self.param_training.device,
+                                           criterion=self.param_training.criterion,
+                                           optim_wrapper=Optim_wrapper(torch.optim.SGD, {"lr": 0.}))
+        indices = [(torch.arange(1500), torch.arange(1500, 1800)), (torch.arange(300, 1800), torch.arange(300))]
+        estimator_history = initialise_estimator(True, param_training)
+        best_net, _ = train_stacked_after_split(self.train_X, self.train_Y, indices, self.Class_Parametrized_NN,
+                                                param_training, estimator_history, silent=True)
+
+        # the returned net is the one of the best fold, its weights did not move.
+        indic_train = indices[estimator_history.best_fold][0]
+        with torch.no_grad():
+            loss_train = self.param_training.criterion(best_net(self.train_X[indic_train]),
+                                                       self.train_Y[indic_train]).item() / 1500
+        np.testing.assert_allclose(estimator_history.get_values_fold_col(estimator_history.best_fold,
+                                                                         'loss_training'), loss_train, rtol=1E-5)
+
+    def test_training_loss_from_closure(self):
+        self.param_training.loss_from_closure = True
+        (net, estimator_history) = nn_kfold_train(self.train_X, self.train_Y, self.Class_Parametrized_NN,
+                                                  param_train=self.param_training,
+                                                  early_stoppers=self.early_stoppers, nb_split=1, shuffle_kfold=True,
+                                                  percent_val_for_1_fold=20, silent=True)
+
+        best_loss = estimator_history.get_best_value_for('loss_validation')
+        # : fetch the best value and assert if accuracy > threshold.
+        assert best_loss < 0.01
+
+    def test_training_loss_from_closure_lbfgs(self):
+        # LBFGS evaluates the closure several times per step, the last evaluation is the one recorded.
+        param_training = NNTrainParameters(batch_size=1800, epochs=20, device=self.param_training.device,
+                                           criterion=self.param_training.criterion,
+                                           optim_wrapper=Optim_wrapper(torch.optim.LBFGS, {"lr": 0.1}),
+                                           metrics=self.param_training.metrics, loss_from_closure=True)
+        (net, estimator_history) = nn_kfold_train(self.train_X, self.train_Y, self.Class_Parametrized_NN,
+                                                  param_train=param_training,
+                                                  early_stoppers=(Early_stopper_training(patience=20, silent=True,
+                                                                                         delta=-1E-6),),
+                                                  nb_split=1, shuffle_kfold=True,
+                                                  percent_val_for_1_fold=0, silent=True)
+
+        losses = estimator_history.get_values_col('loss_training')
+        assert np.all(np.isfinite(losses))
+        assert losses[-1] < losses[0]
+
+    def test_history_loss_equals_loss_over_whole_data(self):
+        # with a zero learning rate, the weights do not move and the loss of the epoch is the loss over the data.
+        param_training = NNTrainParameters(batch_size=128, epochs=2, device=self.param_training.device,
+                                           criterion=self.param_training.criterion,
+                                           optim_wrapper=Optim_wrapper(torch.optim.SGD, {"lr": 0.}))
+        net = self.Class_Parametrized_NN()
+        indic_train, indic_val = torch.arange(1500), torch.arange(1500, 1800)
+        history, _ = nn_train(net, self.train_X, self.train_Y, param_training, indic_train, indic_train,
+                              indic_val_X=indic_val, indic_val_Y=indic_val, silent=True)
+
+        with torch.no_grad():
+            loss_train = self.param_training.criterion(net(self.train_X[indic_train]),
+                                                       self.train_Y[indic_train]).item() / 1500
+            loss_val = self.param_training.criterion(net(self.train_X[indic_val]),
+                                                     self.train_Y[indic_val]).item() / 300
+        np.testing.assert_allclose(history['training']['loss'], loss_train, rtol=1E-5)
+        np.testing.assert_allclose(history['validation']['loss'], loss_val, rtol=1E-5)
+
+    def test_fused_metrics_equal_metrics_over_net(self):
+        def L4loss_pred(prediction, yy):
+            return torch.norm(prediction - yy, 4)
+
+        metrics = (self.param_training.metrics[0], Metric('L4_fused', L4loss_pred, on_prediction=True))
+        # one batch: the L4 norm depends on how the shuffled training data is batched.
+        param_training = NNTrainParameters(batch_size=2000, epochs=3, device=self.param_training.device,
+                                           criterion=self.param_training.criterion,
+                                           optim_wrapper=Optim_wrapper(torch.optim.Adam, {"lr": 0.001}),
+                                           metrics=metrics)
+        indic_train, indic_val = torch.arange(1500), torch.arange(1500, 1800)
+        history, _ = nn_train(self.Class_Parametrized_NN(), self.train_X, self.train_Y, param_training,
+                              indic_train, indic_train, indic_val_X=indic_val, indic_val_Y=indic_val, silent=True)
+
+        for type in ['training', 'validation']:
+            np.testing.assert_allclose(history[type]['L4_fused'], history[type]['L4'], rtol=1E-5)
+
+    def test_training_metric_eval_period_and_subsample(self):
+        self.param_training.metric_eval_period = 5
+        self.param_training.metric_subsample_size = 300
+        (net, estimator_history) = nn_kfold_train(self.train_X, self.train_Y, self.Class_Parametrized_NN,
+                                                  param_train=self.param_training,
+                                                  early_stoppers=self.early_stoppers, nb_split=1, shuffle_kfold=True,
+                                                  percent_val_for_1_fold=20, silent=True)
+
+        epochs = estimator_history.get_values_col('epoch')
+        l4_training = estimator_history.get_values_col('L4_training')
+        evaluated = (epochs % 5 == 0) | (epochs == epochs.max())
+        assert not np.isnan(estimator_history.get_values_col('loss_training')).any()
+        assert not np.isnan(l4_training[evaluated]).any()
+        assert np.isnan(l4_training[~evaluated]).all()
+        assert estimator_history.list_best_epoch[0] in epochs[evaluated]
+
+        best_loss = estimator_history.get_best_value_for('loss_validation')
+        assert best_loss < 0.01
+
+    def test_training_streaming(self):
+        self.param_training.stream_to_device = True
+        self.param_training.nb_prefetch = 2
+        self.param_training.train_loader_parameters = {'index_shuffle': True}
+        (net, estimator_history) = nn_kfold_train(self.train_X, self.train_Y, self.Class_Parametrized_NN,
+                                                  param_train=self.param_training,
+                                                  early_stoppers=self.early_stoppers, nb_split=1, shuffle_kfold=True,
+                                                  percent_val_for_1_fold=20, silent=True)
+
+        best_loss = estimator_history.get_best_value_for('loss_validation')
+        assert best_loss < 0.01
+
+    def test_training_memmap(self):
+        self.param_training.stream_to_device = True
+        self.param_training.epochs = 100
+        with tempfile.TemporaryDirectory() as directory:
+            MemmapTensor.to_npy(os.path.join(directory, "train_X.npy"), self.train_X)
+            MemmapTensor.to_npy(os.path.join(directory, "train_Y.npy"), self.train_Y)
+            data_X = MemmapTensor.from_npy(os.path.join(directory, "train_X.npy"))
+            data_Y = MemmapTensor.from_npy(os.path.join(directory, "train_Y.npy"))
+            (net, estimator_history) = nn_kfold_train(data_X, data_Y, self.Class_Parametrized_NN,
+                                                      param_train=self.param_training,
+                                                      early_stoppers=self.early_stoppers, nb_split=2,
+                                                      shuffle_kfold=True, percent_val_for_1_fold=20, silent=True)
+            del data_X, data_Y  # the memmaps are closed before the directory is removed.
+
+        best_loss = estimator_history.get_best_value_for('loss_validation')
+        assert best_loss < 0.05
+
+    def test_training_kfold_resumed_from_checkpoint(self):
+        self.param_training.epochs = 30
+        # : each epoch is a permutation of the original order, such that the resumed shuffles are identical.
+        self.param_training.train_loader_parameters = {'index_shuffle': True}
+        metrics = self.param_training.metrics
+
+        class Crash(Exception):
+            pass
+
+        def L4loss_crash(net, xx, yy):
+            nb_calls[0] += 1
+            if nb_calls[0] == 400:  # : in the middle of the second fold.
+                raise Crash()
+            return metrics[0](net, xx, yy)
+
+        with tempfile.TemporaryDirectory() as directory:
+            set_seeds(42)
+            (_, estimator_history) = nn_kfold_train(self.train_X, self.train_Y, self.Class_Parametrized_NN,
+                                                    param_train=self.param_training,
+                                                    early_stoppers=self.early_stoppers, nb_split=3,
+                                                    checkpointer=Checkpointer(os.path.join(directory, "full.pth")),
+                                                    silent=True)
+
+            nb_calls = [0]
+            self.param_training.metrics = (Metric('L4', L4loss_crash),)
+            path_crash = os.path.join(directory, "crash.pth")
+            set_seeds(42)
+            with self.assertRaises(Crash):
+                nn_kfold_train(self.train_X, self.train_Y, self.Class_Parametrized_NN,
+                               param_train=self.param_training, early_stoppers=self.early_stoppers, nb_split=3,
+                               checkpointer=Checkpointer(path_crash), silent=True)
+            checkpointer = Checkpointer(path_crash)
+            assert len(checkpointer.completed_folds) == 1
+
+            self.param_training.metrics = metrics
+            set_seeds(0)  # : the indices and random states come from the checkpoint.
+            (_, estimator_history_resumed) = nn_kfold_train(self.train_X, self.train_Y, self.Class_Parametrized_NN,
+                                                            param_train=self.param_training,
+                                                            early_stoppers=self.early_stoppers, nb_split=3,
+                                                            checkpointer=checkpointer, silent=True)
+
+        pd.testing.assert_frame_equal(estimator_history.df, estimator_history_resumed.df)
+        assert estimator_history.best_fold == estimator_history_resumed.best_fold
+
+    def test_sweep_parallel_and_resumed(self):
+        self.param_training.epochs = 20
+        hyper_params = [{'seed': seed, 'nb_split': 1} for seed in range(3)]
+        nb_calls = [0]
+
+        def train_config(params):
+            nb_calls[0] += 1
+            set_seeds(params['seed'])
+            return nn_kfold_train(self.train_X, self.train_Y, self.Class_Parametrized_NN,
+                                  param_train=self.param_training, early_stoppers=self.early_stoppers,
+                                  nb_split=params['nb_split'], hyper_param=params, silent=True)[::-1]
+
+        with tempfile.TemporaryDirectory() as directory:
+            linker_estims = factory_fct_linked_path(directory, "estims")
+            linker_models = factory_fct_linked_path(directory, "models")
+            estims = run_sweep(hyper_params, train_config, linker_estims, linker_models,
+                               nb_workers=3, nb_threads_per_worker=1, silent=True)
+            assert nb_calls[0] == 0  # : trained by the workers.
+            assert sorted(os.listdir(linker_models(['']))) == [f"model_{i}.pth" for i in range(3)]
+            for params, estimator_history in zip(hyper_params, estims):
+                assert estimator_history.hyper_params['seed'] == params['seed']
+                assert estimator_history.hyper_params[WALL_TIME_KEY] > 0.
+                assert estimator_history.hyper_params[PEAK_MEMORY_KEY] > 0.
+
+            # : interrupted sweep, the third configuration was not saved.
+            os.remove(linker_estims(["estim_2.json"]))
+            estims_resumed = run_sweep(hyper_params, train_config, linker_estims, linker_models, silent=True)
+            assert nb_calls[0] == 1
+            assert sorted(os.listdir(linker_estims(['']))) == [f"estim_{i}.json" for i in range(3)]
+
+        for estimator_history, estimator_history_resumed in zip(estims, estims_resumed):
+            pd.testing.assert_frame_equal(estimator_history.df, estimator_history_resumed.df, check_dtype=False)
+
+    def test_successive_halving(self):
+        self.param_training.train_loader_parameters = {'index_shuffle': True}
+        hyper_params = Parameter_grid({'lr': [0.1, 0.01, 0.001, 0.0001], 'seed': [0]})  # : read by index.
+
+        def config_architecture(params):
+            self.param_training.optim_wrapper = Optim_wrapper(torch.optim.Adam, {"lr": params['lr']})
+            return self.param_training, self.Class_Parametrized_NN
+
+        set_seeds(42)
+        (net, estims) = nn_successive_halving(self.train_X, self.train_Y, hyper_params, config_architecture,
+                                              min_epochs=5, max_epochs=20, eta=2,
+                                              early_stoppers=self.early_stoppers, silent=True)
+        # : rungs of 4 configurations for 5 epochs, 2 for 10 epochs and 1 for 20 epochs.
+        rungs = [estimator.hyper_params[RUNG_KEY] for estimator in estims]
+        assert sorted(rungs) == [0, 0, 1, 2]
+        for estimator in estims:
+            assert len(estimator.df) == estimator.hyper_params[BUDGET_KEY]  # : the whole history is kept.
+        best_estimator = estims[rungs.index(2)]
+        assert best_estimator.get_best_value_for('loss_validation') == \
+               min(estimator.get_best_value_for('loss_validation') for estimator in estims)
+
+        # : the promoted configuration resumed from its checkpoints, identical to a training without rungs.
+        best_params = {key: best_estimator.hyper_params[key] for key in ('lr', 'seed')}
+        set_seeds(42)  # : same split.
+        (net_alone, [estimator_history]) = nn_successive_halving(self.train_X, self.train_Y, [best_params],
+                                                                 config_architecture, min_epochs=20, max_epochs=20,
+                                                                 early_stoppers=self.early_stoppers, silent=True)
+        pd.testing.assert_frame_equal(estimator_history.df, best_estimator.df)
+        for name, weights in net.state_dict().items():
+            assert torch.equal(weights, net_alone.state_dict()[name])
+
     def test_training_no_val(self):
         try:
             (net, estimator_history) = nn_kfold_train(self.train_X, self.train_Y, self.Class_Parametrized_NN,
@@ -0,0 +1,148 @@
+from unittest import TestCase
+
+import numpy as np
+import torch
+from torch import nn
+
+from corai.src.classes.architecture.fully_connected import factory_parametrised_FC_NN
+from corai.src.classes.architecture.savable_net import Savable_net
+from corai.src.classes.optim_wrapper import Optim_wrapper
+from corai.src.classes.windowcreator import WindowCreator
+from corai.src.train.nntrainparameters import NNTrainParameters
+from corai.src.train.train import nn_train
+from corai.src.util_train import set_seeds
+
+
+class Test_windowcreator(TestCase):
+    def setUp(self) -> None:
+        torch.manual_seed(42)
+        self.input_data = torch.randn(3, 20, 2)
+        self.output_data = torch.randn(3, 20, 1)
+
+    @staticmethod
+    def windows_by_loop(input_data, output_data, lookback_window, lookforward_window, end_pred_window):
+        # reference: one window after the other.
+        data_X, data_Y = [], []
+        for n in range(input_data.shape[0]):
+            for i in range(input_data.shape[1] - lookback_window - end_pred_window + 1):
+                data_X.append(input_data[n, i:i + lookback_window])
+                end_out = i + lookback_window + end_pred_window
+                data_Y.append(output_data[n, end_out - lookforward_window:end_out])
+        return torch.stack(data_X), torch.stack(data_Y)
+
+    def test_moving(self):
+        window_creator = WindowCreator(input_dim=2, output_dim=1, lookback_window=4, lookforward_window=2,
+                                       end_pred_window=3)
+        data_X, data_Y = window_creator.create_input_sequences(self.input_data, self.output_data)
+        expected_X, expected_Y = self.windows_by_loop(self.input_data, self.output_data, 4, 2, 3)
+
+        assert torch.equal(data_X, expected_X)
+        assert torch.equal(data_Y, expected_Y)
+        assert data_X.is_contiguous()
+
+    def test_moving_not_batch_first(self):
+        window_creator = WindowCreator(input_dim=2, output_dim=1, lookback_window=4, lookforward_window=1,
+                                       end_pred_window=1, batch_first=False)
+        data_X, _ = window_creator.create_input_sequences(self.input_data)
+        expected_X, _ = self.windows_by_loop(self.input_data, self.output_data, 4, 1, 1)
+
+        assert torch.equal(data_X, expected_X.transpose(0, 1))
+
+    def test_zero_copy_views(self):
+        window_creator = WindowCreator(input_dim=2, output_dim=1, lookback_window=4, lookforward_window=2,
+                                       end_pred_window=3)
+        data_X, data_Y = window_creator.create_input_sequences(self.input_data, self.output_data, copy=False)
+        expected_X, expected_Y = self.windows_by_loop(self.input_data, self.output_data, 4, 2, 3)
+
+        assert data_X.shape == (3, 14, 4, 2)
+        assert data_X.data_ptr() == self.input_data.data_ptr()  # views upon the data.
+        assert torch.equal(data_X.flatten(0, 1), expected_X)
+        assert torch.equal(data_Y.flatten(0, 1), expected_Y)
+
+    def test_moving_including_padded_sequences(self):
+        window_creator = WindowCreator(input_dim=2, output_dim=1, lookback_window=4, lookforward_window=1,
+                                       end_pred_window=1,
+                                       window_type=WindowCreator.AllowedType.MOVING_INCLUDING_PADDED_SEQUENCES)
+        data_X, data_Y = window_creator.create_input_sequences(self.input_data, self.output_data)
+        padded_input = torch.cat((torch.zeros(3, 3, 2), self.input_data), dim=1)
+        padded_output = torch.cat((torch.zeros(3, 3, 1), self.output_data), dim=1)
+        expected_X, expected_Y = self.windows_by_loop(padded_input, padded_output, 4, 1, 1)
+
+        assert data_X.shape == (3 * 19, 4, 2)  # : the first window only contains the first point.
+        assert torch.equal(data_X, expected_X)
+        assert torch.equal(data_Y, expected_Y)
+
+    def test_increasing(self):
+        window_creator = WindowCreator(input_dim=2, output_dim=1, lookback_window=0, lookforward_window=1,
+                                       end_pred_window=2, window_type=WindowCreator.AllowedType.INCREASING)
+        data_X, data_Y = window_creator.create_input_sequences(self.input_data, self.output_data)
+
+        assert data_X.shape == (3 * 18, 18, 2)
+        for i in [0, 5, 17]:  # : the i-th window contains the i + 1 first points, padded at the beginning.
+            assert torch.equal(data_X[i, -(i + 1):], self.input_data[0, :i + 1])
+            assert torch.equal(data_X[i, :-(i + 1)], torch.zeros(17 - i, 2))
+            assert torch.equal(data_Y[i], self.output_data[0, i + 2:i + 3])
+
+    def test_lazy_windows_equal_windows(self):
+        for window_type, lookback_window in [(WindowCreator.AllowedType.MOVING, 4),
+                                             (WindowCreator.AllowedType.MOVING_INCLUDING_PADDED_SEQUENCES, 4),
+                                             (WindowCreator.AllowedType.INCREASING, 0)]:
+            window_creator = WindowCreator(input_dim=2, output_dim=1, lookback_window=lookback_window,
+                                           lookforward_window=2, end_pred_window=3, window_type=window_type)
+            data_X, data_Y = window_creator.create_input_sequences(self.input_data, self.output_data)
+            lazy_X, lazy_Y = window_creator.create_lazy_input_sequences(self.input_data, self.output_data)
+
+            assert lazy_X.shape == data_X.shape and lazy_Y.shape == data_Y.shape
+            assert torch.equal(lazy_X[:], data_X)
+            assert torch.equal(lazy_Y[:], data_Y)
+            indices = torch.randperm(len(data_X))[:10]
+            assert torch.equal(lazy_X.take_rows(indices)[2:5], data_X[indices][2:5])
+            assert torch.equal(lazy_X[3:-2:2], data_X[3:-2:2])
+
+    def test_lazy_windows_in_training(self):
+        window_creator = WindowCreator(input_dim=2, output_dim=1, lookback_window=1, lookforward_window=1,
+                                       end_pred_window=1)
+        param_training = NNTrainParameters(batch_size=8, epochs=3, device='cpu', criterion=nn.MSELoss(),
+                                           optim_wrapper=Optim_wrapper(torch.optim.Adam, {"lr": 0.01}),
+                                           train_loader_parameters={'index_shuffle': True})
+        Model_NN = factory_parametrised_FC_NN(param_input_size=2, param_list_hidden_sizes=[8],
+                                              param_output_size=1, param_list_biases=[True, True],
+                                              param_activation_functions=[torch.tanh])
+        indic_train, indic_val = torch.arange(40), torch.arange(40, 57)
+        histories = []
+        for data_X, data_Y in [window_creator.create_input_sequences(self.input_data, self.output_data),
+                               window_creator.create_lazy_input_sequences(self.input_data, self.output_data)]:
+            set_seeds(42)
+            history, _ = nn_train(Model_NN(), data_X, data_Y, param_training, indic_train, indic_train,
+                                  indic_val_X=indic_val, indic_val_Y=indic_val, silent=True)
+            histories.append(history)
+
+        for type in ['training', 'validation']:
+            np.testing.assert_allclose(histories[0][type]['loss'], histories[1][type]['loss'], rtol=1E-6)
+
+    def test_prediction_recurrent_batched(self):
+        class Last_values_net(Savable_net):
+            # predicts the next 2 values from the last ones of the window, first dimension only.
+            def __init__(self):
+                super().__init__(predict_fct=None)
+                self.linear = nn.Linear(1, 1)
+
+            def forward(self, x):
+                return torch.tanh(self.linear(x[:, -2:, :1]))
+
+        def add_time(prediction):  # : vectorised adaptor, 1D -> 2D.
+            return torch.cat((prediction, torch.ones_like(prediction)), dim=2)
+
+        net = Last_values_net()
+        window_creator = WindowCreator(input_dim=2, output_dim=1, lookback_window=4, lookforward_window=2,
+                                       end_pred_window=2, silent=True)
+        data_start = self.input_data[:, :4, :]
+        prediction = window_creator.prediction_recurrent(net, data_start, 5, add_time, increase_on_device=True)
+
+        assert prediction.shape == (3, 10, 2)
+        for n in range(3):  # : reference, one series after the other, growing the input by concatenation.
+            input_prediction = data_start[n:n + 1]
+            for i in range(5):
+                new_values = add_time(net.nn_predict(input_prediction[:, 2 * i:2 * i + 4]))
+                input_prediction = torch.cat((input_prediction, new_values), dim=1)
+            assert torch.allclose(prediction[n], input_prediction[0, 4:])
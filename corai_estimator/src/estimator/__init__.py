@@ -1 +1,2 @@
 from .estimator import Estimator
+from .binary_io import DEFAULT_BINARY_EXTENSION
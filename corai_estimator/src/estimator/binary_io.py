@@ -0,0 +1,130 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow
+    import pyarrow.feather
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:  # : Parquet and Feather are not available, npz is used.
+    pyarrow = None
+
+from corai_error import Error_not_allowed_input
+
+ATTRS_KEY = 'corai_attrs'  # : key of the attributes in the metadata of the file.
+COLUMNS_KEY = 'corai_columns'  # : npz only, names of the columns in order.
+JSON_COLUMNS_KEY = 'corai_json_columns'  # : npz only, names of the object columns, stored as json strings.
+BINARY_EXTENSIONS = ('.parquet', '.feather', '.npz')
+# extension used when none is imposed.
+DEFAULT_BINARY_EXTENSION = '.parquet' if pyarrow is not None else '.npz'
+
+
+def write_binary(df, path, attrs):
+    """
+    Semantics:
+        Write the dataframe in a binary columnar file, and attrs (json serializable dict) in the metadata of the file.
+        The format is given by the extension of path: Parquet or Feather (requires pyarrow), npz.
+        The index is dropped.
+        In npz, the object columns (lists, strings...) are stored as json strings, such that the file is read
+        without pickle: their values should be json serializable, and tuples are read as lists.
+    Args:
+        df (pd.DataFrame): the data.
+        path (str): path of the file, with one of the extensions BINARY_EXTENSIONS.
+        attrs (dict): attributes saved along the data.
+
+    Returns:
+        Void
+    """
+    extension = _extension(path)
+    directory_where_to_save = os.path.dirname(path)
+    if not os.path.exists(directory_where_to_save):
+        if directory_where_to_save != '':
+            os.makedirs(directory_where_to_save)
+
+    if extension == '.npz':
+        json_columns = [name for name in df.columns if df[name].dtype == object]
+        columns = {f'column_{i}': np.array(json.dumps(df[name].tolist())) if name in json_columns
+                   else df[name].to_numpy()
+                   for i, name in enumerate(df.columns)}
+        with open(path, 'wb') as file:  # : with a file, numpy does not add the extension .npz to the path.
+            np.savez(file, **columns,
+                     **{ATTRS_KEY: np.array(json.dumps(attrs)), COLUMNS_KEY: np.array(json.dumps(list(df.columns))),
+                        JSON_COLUMNS_KEY: np.array(json.dumps(json_columns))})
+        return
+
+    table = pyarrow.Table.from_pandas(df, preserve_index=False)
+    metadata = {**(table.schema.metadata or {}), ATTRS_KEY.encode(): json.dumps(attrs).encode()}
+    table = table.replace_schema_metadata(metadata)
+    if extension == '.parquet':
+        pyarrow.parquet.write_table(table, path)
+    else:
+        pyarrow.feather.write_feather(table, path)
+
+
+def read_binary(path):
+    """
+    Semantics:
+        Read a file written by write_binary. The file is not modified.
+
+    Returns:
+        The dataframe and the attributes.
+    """
+    extension = _extension(path, must_exist=True)
+    if extension == '.npz':
+        with np.load(path, allow_pickle=False) as data:  # : no pickle, loading a file cannot run code.
+            names = json.loads(data[COLUMNS_KEY].item())
+            json_columns = set(json.loads(data[JSON_COLUMNS_KEY].item())) if JSON_COLUMNS_KEY in data else set()
+            df = pd.DataFrame({name: _object_array(json.loads(data[f'column_{i}'].item())) if name in json_columns
+                               else data[f'column_{i}']
+                               for i, name in enumerate(names)}, columns=names)
+            return df, json.loads(data[ATTRS_KEY].item())
+
+    if extension == '.parquet':
+        table = pyarrow.parquet.read_table(path)
+    else:
+        table = pyarrow.feather.read_table(path)
+    return table.to_pandas(), _attrs_from_metadata(table.schema.metadata)
+
+
+def read_binary_attributes(path):
+    """
+    Semantics:
+        Read only the attributes of a file written by write_binary, the data is not read. The file is not modified.
+    """
+    extension = _extension(path, must_exist=True)
+    if extension == '.npz':
+        with np.load(path) as data:  # : the members of the archive are read when accessed.
+            return json.loads(data[ATTRS_KEY].item())
+    if extension == '.parquet':
+        return _attrs_from_metadata(pyarrow.parquet.read_schema(path).metadata)
+    with pyarrow.memory_map(path) as source:  # : Feather v2 is the Arrow IPC file format.
+        return _attrs_from_metadata(pyarrow.ipc.open_file(source).schema.metadata)
+
+
+def _object_array(values):
+    # assigned one by one, such that a list of lists is not broadcast into a 2D array.
+    array = np.empty(len(values), dtype=object)
+    for i, value in enumerate(values):
+        array[i] = value
+    return array
+
+
+def _attrs_from_metadata(metadata):
+    if metadata is None or ATTRS_KEY.encode() not in metadata:
+        return {}
+    return json.loads(metadata[ATTRS_KEY.encode()])
+
+
+def _extension(path, must_exist=False):
+    if must_exist and os.path.getsize(path) <= 0:
+        raise Error_not_allowed_input("The input binary file cannot be empty.")
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in BINARY_EXTENSIONS:
+        raise Error_not_allowed_input(f"The extension of the binary file must be one of {BINARY_EXTENSIONS}.")
+    if extension != '.npz' and pyarrow is None:
+        raise ImportError(f"pyarrow is required for the {extension} format (pip install corai[binary]), "
+                          f"otherwise use the .npz format.")
+    return extension
@@ -1,11 +1,15 @@
+import functools
 import json
+import multiprocessing
 import os
 
 import pandas as pd
+from tqdm import tqdm
 
 from corai_error import Error_type_setter, Error_not_allowed_input
+from corai_estimator.src.estimator.binary_io import read_binary, read_binary_attributes, write_binary
 from corai_util.tools.src.function_iterable import sorted_alphanumeric
-from corai_util.tools.src.function_json import zip_json, unzip_json
+from corai_util.tools.src.function_json import zip_json, unzip_json, ZIPJSON_KEY
 
 
 class Estimator(object):
@@ -68,73 +72,108 @@ class Estimator(object):
         return cls(df=pd.read_csv(path, **kwargs))  # calling the constructor of the class.
 
     @classmethod
-    def from_json(cls, path, **kwargs):
+    def from_json(cls, path, compressed=None, **kwargs):
         """
         Semantics:
-            Read json dataframe and construct the object.
-            The json must not contain any extra attributes.
+            Read json dataframe and construct the object. The extra attributes, if any, are ignored.
 
             In case one wants the constructor to add extra/meta attributes to the child estimator:
-                - override from_json with a function calling from_json_attributes and retrieve the attributes,
-                - then call super().from_json to create the estimator,
+                - override from_json with a function calling read_json, which returns the dataframe and the attributes,
+                - then call the constructor of the class with the dataframe,
                 - finally add to the estimator the attributes.
-                - at the end, the function needs to rewrite the original json back together.
-            use the parameter compressed if one wants to allow compressing / decompression.
 
         Args:
             path: The path where to retrieve the dataframe from. Extension json needed.
+            compressed: kept for compatibility, the compression is detected from the content of the file.
+            kwargs: additional key words argument for the constructor of the class.
 
         Returns:
-            Void
+            new estimator.
 
         Postcondition:
-            the json at path remains identical.
+            the json at path is not modified.
 
         Examples of overriding:
             def from_json(cls, path, compressed=True):
-                attrs = super().from_json_attributes(path, compressed)
-                estimator = super().from_json(path)
+                dataframe, attrs = Estimator.read_json(path)
+                estimator = cls(df=dataframe)
                 estimator.name = attrs['name']
-                estimator.to_json(path=path, compress=compressed)
             return estimator
         """
-        if os.path.getsize(path) <= 0:
-            raise Error_not_allowed_input("The input json file cannot be empty")
-
-        dataframe = pd.read_json(path, orient='split')
+        dataframe, _ = Estimator.read_json(path)
         return cls(df=dataframe, **kwargs)
 
     @staticmethod
-    def from_json_attributes(path: str, compress: bool):
+    def from_json_attributes(path: str, compress: bool = None):
         """
-            Retrieve extra attributes from a json dataframe and write the json back to the file.
+            Retrieve extra attributes from a json dataframe. The file is not modified.
         Args:
             path: The path to the file
-            compress: Whether compression is applied
+            compress: kept for compatibility, the compression is detected from the content of the file.
 
         Returns:
+            The attributes (dict), empty if the json does not contain any.
+        """
+        return Estimator.read_json(path)[1]
 
+    @staticmethod
+    def read_json(path):
+        """
+        Semantics:
+            Parse once a json written by to_json, and return the dataframe together with the extra attributes.
+            The file is read in one pass and never written. Compressed and uncompressed files are accepted,
+            with or without attributes.
+
+        Args:
+            path: The path to the file.
+
+        Returns:
+            dataframe, attrs (dict, empty if the json does not contain any).
         """
         if os.path.getsize(path) <= 0:
             raise Error_not_allowed_input("The input json file cannot be empty.")
 
-        with open(path, 'r') as file:  # read file
+        with open(path, 'r') as file:
             df_info = json.load(file)
-            if compress:  # decompress
-                try:
-                    df_info = unzip_json(df_info)
-                except KeyError as e:
-                    print("Original caught error: ", e)
-                    raise KeyError("Potentially, there is an issue with the compression parameter.")
-            attrs = df_info['attrs']  # retrieve the attributes (metadata)
-            del df_info['attrs']  # deletes them from the loaded json
-
-        with open(path, 'w') as file:  # writes inside the file
-            json.dump(df_info, file)  # converts python object into json.
-        return attrs
+        if ZIPJSON_KEY in df_info:  # : compressed with to_json(compress=True).
+            df_info = unzip_json(df_info)
+
+        # the layout is the one of DataFrame.to_json(orient='split', index=False), plus the attributes.
+        dataframe = pd.DataFrame(df_info['data'], columns=df_info['columns'])
+        return dataframe, df_info.get('attrs', {})
+
+    @classmethod
+    def from_binary(cls, path, **kwargs):
+        """
+        Semantics:
+            Read a binary columnar file written by to_binary and construct the object. The file is not modified.
+            Like for from_json, a child with extra attributes overrides it by calling from_binary_attributes,
+            then super().from_binary, and adds the attributes to the estimator. No rewriting of the file is needed.
+
+        Args:
+            path: The path of the file. Extension .parquet, .feather (both require pyarrow) or .npz needed.
+            kwargs: additional key words argument for the constructor of the class.
+
+        Returns:
+            new estimator.
+        """
+        dataframe, _ = read_binary(path)
+        return cls(df=dataframe, **kwargs)
+
+    @staticmethod
+    def from_binary_attributes(path: str):
+        """
+            Retrieve the extra attributes stored in the metadata of a binary file. The data is not read.
+        Args:
+            path: The path to the file.
+
+        Returns:
+            The attributes (dict).
+        """
+        return read_binary_attributes(path)
 
     @classmethod
-    def folder_json2list_estim(cls, path, compress, **kwargs):
+    def folder_json2list_estim(cls, path, compress=True, nb_workers=1, silent=True, merged=False, **kwargs):
         """
         Semantics:
             Open a folder containing only estimators(of the same type) saved to json and create a list of estimators.
@@ -143,23 +182,31 @@ class Estimator(object):
                 Estim_history.folder_json2list_estim will produce a list of Estim_history.
         Args:
             path (str): The path to the folder.
+            compress (bool): kept for compatibility, the compression is detected from the content of the files.
+            nb_workers (int): number of processes reading the files. 1 means no process is created.
+            silent (bool): if False, a progress bar is shown.
+            merged (bool): if True, a single estimator merging the dataframes is returned instead of the list
+                (see merge). Each estimator is released as soon as its dataframe is taken.
+            kwargs: additional key words argument for from_json.
 
         Returns:
-            A list of estim_history.
+            A list of estim_history, sorted like the files (sorted_alphanumeric).
         """
-        estimators = []
-
-        # collect all the estimators from the folder
-        for file in sorted_alphanumeric(os.listdir(path)):  # sort in this way to conserve the order
-            # when creating the dataframes (and be able to match index of the df with the nb of the file)
-            estimator = cls.from_json(path=os.path.join(path, file), compressed=compress, **kwargs)
-            # added the parameter compressed. What happens in the case when the parameter compressed is not expected.
-            estimators.append(estimator)
+        estimators = cls.folder_json2iter_estim(path, compress, nb_workers, silent, **kwargs)
+        return cls.merge(estimators) if merged else list(estimators)
 
-        return estimators
+    @classmethod
+    def folder_json2iter_estim(cls, path, compress=True, nb_workers=1, silent=True, **kwargs):
+        """
+        Semantics:
+            Same as folder_json2list_estim, but the estimators are yielded one after the other,
+            such that they do not need to be all held in memory.
+        """
+        loader = functools.partial(cls.from_json, compressed=compress, **kwargs)
+        return cls._folder2iter_estim(path, loader, nb_workers, silent)
 
     @classmethod
-    def folder_csv2list_estim(cls, path):
+    def folder_csv2list_estim(cls, path, nb_workers=1, silent=True, merged=False, **kwargs):
         """
         Semantics:
             Open a folder containing ONLY CSV estimators(of the same type) saved to csv and create a list of estimators.
@@ -168,18 +215,63 @@ class Estimator(object):
                 Estim_history.folder_json2list_estim will produce a list of Estim_history.
         Args:
             path (str): The path to the folder.
+            nb_workers (int): number of processes reading the files. 1 means no process is created.
+            silent (bool): if False, a progress bar is shown.
+            merged (bool): if True, a single estimator merging the dataframes is returned instead of the list.
+            kwargs: additional key words argument for from_csv.
 
         Returns:
-            A list of estim_history.
+            A list of estim_history, sorted like the files (sorted_alphanumeric).
         """
-        estimators = []
+        estimators = cls._folder2iter_estim(path, functools.partial(cls.from_csv, **kwargs), nb_workers, silent)
+        return cls.merge(estimators) if merged else list(estimators)
 
-        # collect all the estimators from the folder
-        for file in os.listdir(path):
-            estimator = cls.from_csv(path=os.path.join(path, file))
-            estimators.append(estimator)
+    @classmethod
+    def folder_binary2list_estim(cls, path, nb_workers=1, silent=True, merged=False, **kwargs):
+        """
+        Semantics:
+            Open a folder containing only estimators (of the same type) saved with to_binary
+            and create a list of estimators. The estimators will be of the type the function is called on.
+        Args:
+            path (str): The path to the folder.
+            nb_workers (int): number of processes reading the files. 1 means no process is created.
+            silent (bool): if False, a progress bar is shown.
+            merged (bool): if True, a single estimator merging the dataframes is returned instead of the list.
+            kwargs: additional key words argument for from_binary.
 
-        return estimators
+        Returns:
+            A list of estimators, sorted like the files (sorted_alphanumeric).
+        """
+        estimators = cls.folder_binary2iter_estim(path, nb_workers, silent, **kwargs)
+        return cls.merge(estimators) if merged else list(estimators)
+
+    @classmethod
+    def folder_binary2iter_estim(cls, path, nb_workers=1, silent=True, **kwargs):
+        """
+        Semantics:
+            Same as folder_binary2list_estim, but the estimators are yielded one after the other.
+        """
+        return cls._folder2iter_estim(path, functools.partial(cls.from_binary, **kwargs), nb_workers, silent)
+
+    @staticmethod
+    def _folder2iter_estim(path, loader, nb_workers, silent):
+        # yields loader(file) for the files of the folder, in the order of sorted_alphanumeric
+        # (such that the index of the estimator matches the number of the file).
+        # With several workers, the files are read by a pool of processes and the results are yielded in order.
+        files = [os.path.join(path, file) for file in sorted_alphanumeric(os.listdir(path))]
+        with tqdm(total=len(files), disable=silent) as progress:
+            if nb_workers == 1 or len(files) <= 1:
+                for file in files:
+                    yield loader(file)
+                    progress.update()
+                return
+
+            nb_workers = min(nb_workers, len(files))
+            chunksize = max(1, len(files) // (4 * nb_workers))  # : small files are sent by chunks to the workers.
+            with multiprocessing.Pool(nb_workers) as pool:
+                for estimator in pool.imap(loader, files, chunksize):
+                    yield estimator
+                    progress.update()
 
     @classmethod
     def merge(cls, list_estim):
@@ -187,7 +279,8 @@ class Estimator(object):
         Semantics:
             Build and estimator from a list of estimators.
         Args:
-            list_estim(list of estimators): List of estimators to combine.
+            list_estim(iterable of estimators): Estimators to combine. Can be a generator,
+                only the dataframes are kept.
 
         Returns:
             An estimator containing the combined dataframes from the list of estimators.
@@ -205,9 +298,12 @@ class Estimator(object):
         """
         Semantics:
             adaptor for the method append from DF at the estimator level.
+            DataFrame.append is removed from pandas 2, the rows are concatenated with pd.concat.
 
         Args:
-            appending_df: the df to append to the self object.
+            appending_df: the df (or dict of columns, or series or dict of scalars for one row)
+                to append to the self object.
+            kwargs: additional key words argument for pd.concat, like sort.
 
         Returns:
             self.
@@ -219,7 +315,14 @@ class Estimator(object):
 
         References: https://www.geeksforgeeks.org/python-pandas-dataframe-append/
         """
-        self.df = self.df.append(appending_df, *args, **kwargs)
+        if isinstance(appending_df, pd.Series):
+            appending_df = appending_df.to_frame().T.infer_objects()  # : the transposition gives object columns.
+        elif isinstance(appending_df, dict) and all(pd.api.types.is_scalar(value) for value in appending_df.values()):
+            appending_df = pd.DataFrame([appending_df])  # : one row.
+        elif not isinstance(appending_df, pd.DataFrame):
+            appending_df = pd.DataFrame(appending_df)
+        kwargs.pop('ignore_index', None)  # : the index is reset below.
+        self.df = pd.concat([self.df, appending_df], ignore_index=True, **kwargs)
         self.df.reset_index(drop=True, inplace=True)  # Ensure uniqueness of the indices
         return self
 
@@ -279,7 +382,9 @@ class Estimator(object):
             apply_function_upon_data
         """
         assert len(new_column_names) == len(separators), "New_column_names and separators must have same dimension."
-        self.df[new_column_names] = self.apply_function_upon_data(separators, fct, **kwargs)
+        df = self.df
+        df[new_column_names] = self.apply_function_upon_data(separators, fct, **kwargs)
+        self.df = df  # : assigned, such that subclasses caching data derived from df see the new values.
         return
 
     def merge_columns(self, column_names):
@@ -294,7 +399,9 @@ class Estimator(object):
             Void
         """
         new_column_name = "-".join(column_names)
-        self.df[new_column_name] = [z for z in zip(*[self.df[column].values for column in column_names])]
+        df = self.df
+        df[new_column_name] = [z for z in zip(*[df[column].values for column in column_names])]
+        self.df = df  # : assigned, such that subclasses caching data derived from df see the new values.
 
 
     def order(self, column_names, ascending=True, inplace=False):
@@ -308,7 +415,10 @@ class Estimator(object):
         Returns:
             If in place is False, returns the sorted dataframe, otherwise the internal dataframe is updated.
         """
-        return self.df.sort_values(by=column_names, ascending=ascending, inplace=inplace)
+        if inplace:  # : assigned, such that subclasses caching data derived from df see the new order.
+            self.df = self.df.sort_values(by=column_names, ascending=ascending)
+            return None
+        return self.df.sort_values(by=column_names, ascending=ascending)
 
     def get_best_by(self, metrics, count=10, ascending=True, inplace_sort=False, crop=False):
         """
@@ -462,6 +572,24 @@ class Estimator(object):
         with open(path, 'w') as file:
             json.dump(parsed, file)
 
+    def to_binary(self, path, attrs=None):
+        """
+            Save an estimator to a binary columnar file: Parquet or Feather (both require pyarrow), or npz.
+            The format is given by the extension of the path, `DEFAULT_BINARY_EXTENSION` is the best available one.
+            The extra attributes are saved in the metadata of the file, they can be read without reading the data.
+
+            To save an estimator with extra attributes, override it like to_json.
+        Args:
+            path: The path where to store the estimator, with extension.
+            attrs: The extra attributes to save. Must be json serializable. None means no attribute.
+
+        Returns:
+            Void
+        """
+        if self.df.empty:
+            raise Error_not_allowed_input("Cannot save an empty dataframe.")
+        write_binary(self.df, path, {} if attrs is None else attrs)
+
     # section ######################################################################
     #  #############################################################################
     #  get/set
@@ -1,9 +1,11 @@
+import os
 import unittest
 from unittest import TestCase
 from corai_estimator import Estimator
 
 import numpy as np
 import pandas as pd
+import pytest
 
 
 class Test_Estimator(TestCase):
@@ -19,7 +21,19 @@ class Test_Estimator(TestCase):
         pass
 
     def test_append(self):
-        pass
+        self.estimator.append(pd.DataFrame({'Size': [700], 'People': [2], 'number_rooms': [1]}))
+        assert len(self.estimator.df) == 6 and list(self.estimator.df.index) == list(range(6))
+
+    def test_append_dict_of_scalars_is_one_row(self):
+        estimator = Estimator(df=pd.DataFrame({'a': [1, 2], 'b': ['x', 'y']}))
+        estimator.append({'a': 3, 'b': 'z'}, ignore_index=True)
+        pd.testing.assert_frame_equal(estimator.df, pd.DataFrame({'a': [1, 2, 3], 'b': ['x', 'y', 'z']}))
+
+    def test_append_series_keeps_types(self):
+        estimator = Estimator(df=pd.DataFrame({'a': [1, 2], 'b': ['x', 'y']}))
+        estimator.append(pd.Series({'a': 3, 'b': 'z'}))
+        pd.testing.assert_frame_equal(estimator.df, pd.DataFrame({'a': [1, 2, 3], 'b': ['x', 'y', 'z']}))
+        assert estimator.df['a'].dtype == np.int64
 
     def test_apply_function_upon_data(self):
         # TODO LOOK INTO
@@ -59,6 +73,49 @@ class Test_Estimator(TestCase):
         assert self.estimator.df.equals(self.estimator2.df) # equality in terms of values
 
 
+    def test_to_binary_and_from_binary(self):
+        self._check_binary_round_trip(self.estimator, '.npz')
+
+    def test_to_binary_and_from_binary_object_column(self):
+        # object columns are stored as json in npz, read without pickle.
+        estimator = Estimator(df=self.estimator.df.assign(rooms=[[1], [1, 2], [], [3, 4, 5], ['a']],
+                                                          name=['a', 'b', 'c', 'd', 'e']))
+        self._check_binary_round_trip(estimator, '.npz')
+        estimator.to_binary("test.npz")
+        with np.load("test.npz", allow_pickle=False) as data:
+            [data[key] for key in data.files]  # : raises if a column needs pickle.
+        os.remove("test.npz")
+
+    def test_to_binary_and_from_binary_pyarrow(self):
+        pytest.importorskip('pyarrow')
+        for extension in ['.parquet', '.feather']:
+            with self.subTest(extension=extension):
+                self._check_binary_round_trip(self.estimator, extension)
+
+    @staticmethod
+    def _check_binary_round_trip(estimator, extension):
+        path = "test" + extension
+        estimator.to_binary(path, attrs={'name': 'houses'})
+        with open(path, 'rb') as file:
+            content = file.read()
+
+        estimator2 = Estimator.from_binary(path)
+        assert estimator.df.equals(estimator2.df)  # types are kept.
+        assert Estimator.from_binary_attributes(path) == {'name': 'houses'}
+        with open(path, 'rb') as file:
+            assert file.read() == content  # reading does not modify the file.
+        os.remove(path)
+
+    def test_folder_csv2list_estim_merged(self):
+        folder = "test_folder_csv"
+        for i in range(5):
+            self.estimator.to_csv(os.path.join(folder, f"estim_{i}.csv"))
+        estimator = Estimator.folder_csv2list_estim(folder, nb_workers=2, merged=True, dtype='int32')
+        assert estimator.df.equals(pd.concat([self.estimator.df] * 5, ignore_index=True))
+        for i in range(5):
+            os.remove(os.path.join(folder, f"estim_{i}.csv"))
+        os.rmdir(folder)
+
     def test_groupby_df(self):
         pass
 
@@ -1,6 +1,14 @@
+import array
+import copy
+import functools
 import json
+import operator
+import os
 
 from corai_util.tools.src.function_iterable import is_iterable
+from corai_util.tools.src.function_writer import INDEX_EXTENSION
+
+GRID_KEY = 'parameter_grid'  # : key of the options in a json written by Parameter_grid.to_json.
 
 
 def up(my_dict, new_dict):
@@ -33,25 +41,82 @@ def parameter_product(parameter_options):
 
     Returns:
         A list of dictionaries. Each dictionary will contain a unique combination of the parameters.
+        For large grids, use Parameter_grid which computes the combinations lazily.
     """
+    return list(Parameter_grid(parameter_options))
 
-    result = []
-    p_names = list(parameter_options)
-
-    def product(p_names, options_dict, i=0):
-        """backtracking."""
-
-        if i == len(p_names):
-            copy = dict(options_dict)
-            result.append(copy)
-            return
 
-        for option in parameter_options[p_names[i]]:
-            options_dict[p_names[i]] = option
-            product(p_names, options_dict, i + 1)
+class Parameter_grid(object):
+    """
+    Semantics:
+        Lazy product between lists of parameters, in the order of parameter_product (the last parameter varies
+        the fastest). Nothing is materialised: the combination at an index is computed in O(nb of parameters)
+        by decoding the index in the mixed radix given by the number of options of each parameter.
+
+        A grid is a sequence: len, indexing (also negative), iteration. `shard(i, n)` gives the i-th of n
+        contiguous parts of the grid, such that n workers can each take their part without materialising the grid.
+        `items` yields the couples (index in the whole grid, combination), used to name the results.
+
+    Examples:
+        grid = Parameter_grid({'lr': [0.1, 0.01], 'dropout': [0., 0.2, 0.5]})
+        grid[4]  # {'lr': 0.01, 'dropout': 0.2}
+        for index, params in grid.shard(worker_id, nb_workers).items():
+            train(params, name=f"estim_{index}")
+    """
 
-    product(p_names, {})
-    return result
+    def __init__(self, parameter_options, indices=None):
+        """
+        Args:
+            parameter_options (dict<str,list>): a dictionary composed of possible parameters.
+            indices (range): the indices of the whole grid seen by this grid. None means all of them.
+        """
+        self.parameter_options = parameter_options
+        self._names = list(parameter_options)
+        self._sizes = [len(parameter_options[name]) for name in self._names]
+        self.indices = range(functools.reduce(operator.mul, self._sizes, 1)) if indices is None else indices
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return Parameter_grid(self.parameter_options, self.indices[index])
+        return self._decode(self.indices[index])  # : range checks the bounds and handles negative indices.
+
+    def __iter__(self):
+        for global_index in self.indices:
+            yield self._decode(global_index)
+
+    def items(self):
+        """ Yields the couples (index in the whole grid, combination)."""
+        for global_index in self.indices:
+            yield global_index, self._decode(global_index)
+
+    def shard(self, i, n):
+        """ The i-th of n contiguous parts of the grid, of sizes differing by at most one. i in [0, n[."""
+        assert 0 <= i < n, "The shard should be in [0, n[."
+        return self[i * len(self) // n:(i + 1) * len(self) // n]
+
+    def to_json(self, file_name):
+        """
+            Writes the options of the grid to a json file, the size of the file does not depend on the size of the grid.
+            retrieve_parameters_by_index_from_json decodes an index from it.
+            Create a directory if the path yields a non-existent directory.
+        """
+        directory_where_to_save = os.path.dirname(file_name)
+        if not os.path.exists(directory_where_to_save):
+            if directory_where_to_save != '':
+                os.makedirs(directory_where_to_save)
+        with open(file_name, 'w') as file:
+            json.dump({GRID_KEY: self.parameter_options}, file)
+
+    def _decode(self, global_index):
+        # mixed radix: the digit of the last parameter is the least significant one.
+        combination = {}
+        for name, size in zip(reversed(self._names), reversed(self._sizes)):
+            global_index, digit = divmod(global_index, size)
+            combination[name] = self.parameter_options[name][digit]
+        return {name: combination[name] for name in self._names}  # : in the order of the options.
 
 
 def replace_function_names_to_functions(parameters_at_index, mapping, silent=True):
@@ -96,17 +161,97 @@ def retrieve_parameters_by_index_from_json(index, file_path):
 
     Args:
         index: index of the dictionary to be returned,
-        file_path: the path to the json file where the information should be read from.
+        file_path: the path to the json file where the information should be read from. Either:
+            a json-lines file with its index (list_of_dicts_to_jsonl), the line is read directly,
+            the options of a grid (Parameter_grid.to_json), from which the dictionary is computed directly,
+            a list of dictionaries (list_of_dicts_to_json), read until the index without loading the whole list.
 
     Returns:
         dictionary at index from json file.
+
+    Note:
+        The last dictionaries read are cached (LRU_CACHE_SIZE), as long as the file is not modified.
+        A copy is returned, it can be modified.
     """
-    with open(file_path, 'r') as file:
-        parameters = json.load(file)
+    stat = os.stat(file_path)  # : the cache is invalidated when the file is rewritten.
+    return copy.deepcopy(_retrieve_parameters_by_index(index, file_path, stat.st_mtime_ns, stat.st_size))
+
+
+LRU_CACHE_SIZE = 1024
 
-    assert 0 <= index < len(parameters), "Parameter index is outside the bounds (number of settings)."
 
-    return parameters[index]
+@functools.lru_cache(maxsize=LRU_CACHE_SIZE)
+def _retrieve_parameters_by_index(index, file_path, modification_time, size):
+    # modification_time and size are only part of the key of the cache.
+    if os.path.splitext(file_path)[1] == '.jsonl':
+        return _retrieve_parameters_by_index_from_jsonl(index, file_path)
+
+    with open(file_path, 'r') as file:
+        first_character = ' '
+        while first_character.isspace():  # : leading whitespaces.
+            first_character = file.read(1)
+        file.seek(0)
+
+        if first_character == '{':
+            grid = Parameter_grid(json.load(file)[GRID_KEY])
+            assert 0 <= index < len(grid), "Parameter index is outside the bounds (number of settings)."
+            return grid[index]
+
+        assert 0 <= index, "Parameter index is outside the bounds (number of settings)."
+        for i, parameters in enumerate(_iter_json_list(file)):
+            if i == index:
+                return parameters
+    raise AssertionError("Parameter index is outside the bounds (number of settings).")
+
+
+def _retrieve_parameters_by_index_from_jsonl(index, file_path):
+    # the offset of the line is read from the index of the file, without the index the lines are read until index.
+    path_index = file_path + INDEX_EXTENSION
+    assert 0 <= index, "Parameter index is outside the bounds (number of settings)."
+    with open(file_path, 'rb') as file:
+        if os.path.exists(path_index):
+            offset = array.array('Q')
+            with open(path_index, 'rb') as file_index:
+                file_index.seek(index * offset.itemsize)
+                try:
+                    offset.fromfile(file_index, 1)
+                except EOFError:
+                    raise AssertionError("Parameter index is outside the bounds (number of settings).")
+            file.seek(offset[0])
+            return json.loads(file.readline())
+
+        for i, line in enumerate(file):
+            if i == index:
+                return json.loads(line)
+    raise AssertionError("Parameter index is outside the bounds (number of settings).")
+
+
+def _iter_json_list(file, chunk_size=1 << 16):
+    # yields the elements of the json list in file one after the other, the file is read by chunks.
+    decoder = json.JSONDecoder()
+    buffer = file.read(chunk_size).lstrip()
+    assert buffer.startswith('['), "The json does not contain a list."
+    position = 1
+    is_end_of_file = False
+    while True:
+        # skip the separators before the next element.
+        while position < len(buffer) and buffer[position] in ' \t\n\r,':
+            position += 1
+        if position < len(buffer) and buffer[position] == ']':
+            return
+        try:
+            element, end = decoder.raw_decode(buffer, position)
+            # an element ending with the buffer might be truncated (numbers), unless the file is read entirely.
+            if end < len(buffer) or is_end_of_file:
+                yield element
+                buffer, position = buffer[end:], 0
+                continue
+        except json.JSONDecodeError:
+            if is_end_of_file:
+                raise
+        new_chunk = file.read(chunk_size)
+        is_end_of_file = not new_chunk
+        buffer, position = buffer[position:] + new_chunk, 0
 
 
 def filter(names, keys, filter_rules):
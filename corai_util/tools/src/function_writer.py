@@ -1,8 +1,11 @@
+import array
 import json
 import os
 
 from corai_util.tools.src.function_json import zip_json, unzip_json
 
+INDEX_EXTENSION = '.index'  # : extension added to a json-lines file for its index of offsets.
+
 
 def list_of_dicts_to_txt(parameter_options, column_size=15, file_name="config.txt"):
     """
@@ -46,8 +49,10 @@ def list_of_dicts_to_json(list_of_dicts, file_name="config.json", compress=False
     """
         Writes the list_of_dicts to a json file.
         Create a directory if the path yields a non-existent directory.
+        Without compression, the dictionaries are written one after the other, such that an iterable
+        computing them lazily (like Parameter_grid) is never materialised.
     Args:
-        list_of_dicts(list<dict>): to be written to the file
+        list_of_dicts(iterable<dict>): to be written to the file
         file_name (str): The path to where the config file should be written with extension.
         compress: Boolean to specify if compression should be applied before writing to the file.
 
@@ -55,15 +60,50 @@ def list_of_dicts_to_json(list_of_dicts, file_name="config.json", compress=False
         None
     """
 
+    directory_where_to_save = os.path.dirname(file_name)
+    if not os.path.exists(directory_where_to_save):
+        if directory_where_to_save != '':
+            os.makedirs(directory_where_to_save)
+
     if compress:
-        list_of_dicts = zip_json(list_of_dicts)
+        with open(file_name, 'w') as file:
+            json.dump(zip_json(list(list_of_dicts)), file)
+        return
+
+    with open(file_name, 'w') as file:
+        file.write('[')
+        for i, a_dict in enumerate(list_of_dicts):
+            if i:
+                file.write(', ')
+            json.dump(a_dict, file)
+        file.write(']')
+
 
+def list_of_dicts_to_jsonl(list_of_dicts, file_name="config.jsonl"):
+    """
+        Writes the list_of_dicts to a json-lines file (one dict per line), with an index of the position in bytes of
+        each line in the file file_name + INDEX_EXTENSION. With the index, retrieve_parameters_by_index_from_json
+        reads a dict by seeking directly to its line, whatever the size of the file.
+        Create a directory if the path yields a non-existent directory.
+    Args:
+        list_of_dicts(iterable<dict>): to be written to the file, can be computed lazily (like Parameter_grid).
+        file_name (str): The path to where the config file should be written, extension .jsonl.
+
+    Returns:
+        None
+    """
     directory_where_to_save = os.path.dirname(file_name)
     if not os.path.exists(directory_where_to_save):
         if directory_where_to_save != '':
             os.makedirs(directory_where_to_save)
-    with open(file_name, 'w') as file:
-        json.dump(list_of_dicts, file)
+
+    offsets = array.array('Q')  # : unsigned 64 bits.
+    with open(file_name, 'wb') as file:
+        for a_dict in list_of_dicts:
+            offsets.append(file.tell())
+            file.write(json.dumps(a_dict).encode('utf-8') + b'\n')
+    with open(file_name + INDEX_EXTENSION, 'wb') as file:
+        offsets.tofile(file)
 
 
 def json2python(path, compress=False):
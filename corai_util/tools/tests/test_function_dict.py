@@ -1,11 +1,11 @@
 import os
-from collections import Callable
+from collections.abc import Callable
 from unittest import TestCase
 
 from config import ROOT_DIR
 from corai_util.tools.src.function_dict import parameter_product, replace_function_names_to_functions, \
-    retrieve_parameters_by_index_from_json
-from corai_util.tools.src.function_writer import list_of_dicts_to_json
+    retrieve_parameters_by_index_from_json, Parameter_grid, _iter_json_list
+from corai_util.tools.src.function_writer import list_of_dicts_to_json, list_of_dicts_to_jsonl, INDEX_EXTENSION
 
 PATH = os.path.join(ROOT_DIR, 'corai_util', 'tools', 'tests', 'generated_test_files')
 
@@ -58,6 +58,48 @@ class Test_function_dict(TestCase):
 
         assert result == test_output
 
+    def test_parameter_grid_random_access_and_shards(self):
+        options = {'a': [1, 2, 3], 'b': ['x', 'y'], 'c': [0.1, 0.2, 0.3, 0.4]}
+        product = parameter_product(options)
+        grid = Parameter_grid(options)
+
+        assert len(grid) == 24 and list(grid) == product
+        assert grid[13] == product[13] and grid[-1] == product[-1]
+        assert [params for shard in range(5) for params in grid.shard(shard, 5)] == product
+        assert [index for shard in range(5) for index, _ in grid.shard(shard, 5).items()] == list(range(24))
+
+    def test_retrieve_parameters_by_index_from_grid_and_streamed_list(self):
+        options = {'a': list(range(50)), 'b': [[1, 2], [3]], 'c': ['some text', 'more text']}
+        path_grid = os.path.join(PATH, "test_grid.json")
+        path_list = os.path.join(PATH, "test_list.json")
+        Parameter_grid(options).to_json(path_grid)
+        list_of_dicts_to_json(Parameter_grid(options), path_list)
+
+        product = parameter_product(options)
+        for index in [0, 77, 199]:
+            assert retrieve_parameters_by_index_from_json(index, path_grid) == product[index]
+            assert retrieve_parameters_by_index_from_json(index, path_list) == product[index]
+        with open(path_list, 'r') as file:  # : chunks much smaller than the elements.
+            assert list(_iter_json_list(file, chunk_size=7)) == product
+        os.remove(path_grid)
+        os.remove(path_list)
+
+    def test_retrieve_parameters_by_index_from_indexed_jsonl(self):
+        options = {'a': list(range(100)), 'b': [[1, 2], [3]], 'c': ['some text', 'été']}
+        path = os.path.join(PATH, "test_list.jsonl")
+        list_of_dicts_to_jsonl(Parameter_grid(options), path)
+
+        product = parameter_product(options)
+        for index in [0, 5, 399, 5]:
+            assert retrieve_parameters_by_index_from_json(index, path) == product[index]
+        retrieve_parameters_by_index_from_json(7, path)['b'].append(4)  # : the cached parameters are not modified.
+        assert retrieve_parameters_by_index_from_json(7, path) == product[7]
+        self.assertRaises(AssertionError, retrieve_parameters_by_index_from_json, 400, path)
+
+        os.remove(path + INDEX_EXTENSION)  # : without index, the lines are read until the index.
+        assert retrieve_parameters_by_index_from_json(398, path) == product[398]
+        os.remove(path)
+
     def test_replace_function_names_to_functions_doesnt_modify_unnecessary_params(self):
         replace_function_names_to_functions(function_test_dict, function_map)
 
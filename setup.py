@@ -32,6 +32,7 @@ setuptools.setup(
         'Pillow>=8.2.0',
         'scipy>=1.7.0'
     ],
+    extras_require={'binary': ['pyarrow>=4.0.0']},
     package_dir={"corai_error": "corai_error",
                  "corai_estimator": "corai_estimator",
                  "corai_metaclass": "corai_metaclass",